@@ -12,5 +12,9 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'capstone_backend.settings')
+# Serve the I/O-bound endpoints from financekit.async_views under ASGI
+os.environ.setdefault('ASYNC_VIEWS', '1')
+# Picks the ASGI-safe DB_POOL default (see settings)
+os.environ.setdefault('SERVER_INTERFACE', 'asgi')
 
 application = get_asgi_application()
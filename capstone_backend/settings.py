@@ -1,4 +1,5 @@
 from pathlib import Path
+import importlib.util
 import os
 from dotenv import load_dotenv
 
@@ -38,6 +39,9 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "financekit.middleware.RequestIDMiddleware",
+    "financekit.profiling.ProfilingMiddleware",  # removes itself unless PROFILING_ENABLED
+    "financekit.querylog.QueryLogMiddleware",
+    "financekit.db_router.ReplicaRoutingMiddleware",
 ]
 
 ROOT_URLCONF = "capstone_backend.urls"
@@ -63,7 +67,8 @@ DB_ENGINE = os.getenv("DB_ENGINE", "postgresql" if IS_PROD else "sqlite").lower(
 if DB_ENGINE == "sqlite":
     DATABASES = {
         "default": {
-            "ENGINE": "django.db.backends.sqlite3",
+            # Stock sqlite3 backend + connect/age instrumentation (financekit.dbpool)
+            "ENGINE": "financekit.db_backends.sqlite3",
             # Default to local file for dev; allow override to a writable path on Azure (e.g. /home/site/db.sqlite3)
             "NAME": os.getenv("SQLITE_PATH", os.path.join(BASE_DIR, "db.sqlite3")),
         }
@@ -71,7 +76,8 @@ if DB_ENGINE == "sqlite":
 else:
     DATABASES = {
         "default": {
-            "ENGINE": "django.db.backends.postgresql",
+            # Stock postgresql backend + connect/checkout instrumentation (financekit.dbpool)
+            "ENGINE": "financekit.db_backends.postgresql",
             "NAME": os.getenv("DB_NAME","capstone"),
             "USER": os.getenv("DB_USER","capstone"),
             "PASSWORD": os.getenv("DB_PASSWORD","capstone"),
@@ -82,6 +88,61 @@ else:
         }
     }
 
+# Connection reuse (DB_POOL):
+# - "persistent": keep one connection per worker thread for DB_CONN_MAX_AGE seconds,
+#   health-checked before reuse (default under WSGI; avoids a TCP+TLS handshake per request)
+# - "pool": psycopg3 ConnectionPool (needs `pip install "psycopg[binary,pool]"`; default
+#   under ASGI when installed, where per-thread persistent connections are not reused
+#   reliably and pile up across sync_to_async threads)
+# - "off": new connection per request (ASGI default without psycopg_pool)
+# SERVER_INTERFACE is set to "asgi" by capstone_backend.asgi
+SERVER_INTERFACE = os.getenv("SERVER_INTERFACE", "wsgi").lower()
+_HAS_PSYCOPG_POOL = DB_ENGINE != "sqlite" and importlib.util.find_spec("psycopg_pool") is not None
+if DB_ENGINE == "sqlite":
+    _DB_POOL_DEFAULT = "off"
+elif SERVER_INTERFACE == "asgi":
+    _DB_POOL_DEFAULT = "pool" if _HAS_PSYCOPG_POOL else "off"
+else:
+    _DB_POOL_DEFAULT = "persistent"
+DB_POOL_MODE = (os.getenv("DB_POOL") or _DB_POOL_DEFAULT).lower()
+if DB_POOL_MODE == "pool" and not _HAS_PSYCOPG_POOL:
+    DB_POOL_MODE = "off" if SERVER_INTERFACE == "asgi" else "persistent"
+    print(f"[startup] DB_POOL=pool needs Postgres + psycopg_pool; using DB_POOL={DB_POOL_MODE}")
+if DB_POOL_MODE == "pool":
+    DATABASES["default"]["CONN_MAX_AGE"] = 0  # Django requires 0 with a pool
+    DATABASES["default"]["OPTIONS"]["pool"] = {
+        "min_size": int(os.getenv("DB_POOL_MIN_SIZE", "2")),
+        "max_size": int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+        "timeout": float(os.getenv("DB_POOL_TIMEOUT", "10")),          # max wait for a checkout
+        "max_lifetime": float(os.getenv("DB_POOL_MAX_LIFETIME", "1800")),
+        "max_idle": float(os.getenv("DB_POOL_MAX_IDLE", "300")),
+    }
+elif DB_POOL_MODE == "persistent":
+    DATABASES["default"]["CONN_MAX_AGE"] = int(os.getenv("DB_CONN_MAX_AGE", "60"))
+    DATABASES["default"]["CONN_HEALTH_CHECKS"] = True
+else:
+    DATABASES["default"]["CONN_MAX_AGE"] = 0
+
+# Read replicas (Postgres only): DB_REPLICA_HOSTS=host1,host2[:port] adds aliases
+# "replica1", ... with the primary's credentials. Safe-method requests to the list,
+# detail, analytics and health endpoints read from a replica (financekit.db_router)
+DATABASE_REPLICAS = []
+if DB_ENGINE != "sqlite":
+    for _i, _host in enumerate(h.strip() for h in os.getenv("DB_REPLICA_HOSTS", "").split(",") if h.strip()):
+        _alias = f"replica{_i + 1}"
+        _h, _, _p = _host.partition(":")
+        DATABASES[_alias] = {**DATABASES["default"], "HOST": _h, "PORT": _p or DATABASES["default"]["PORT"],
+                             "OPTIONS": dict(DATABASES["default"]["OPTIONS"])}
+        DATABASES[_alias]["TEST"] = {"MIRROR": "default"}
+        DATABASE_REPLICAS.append(_alias)
+DATABASE_ROUTERS = ["financekit.db_router.ReplicaRouter"]
+# After a write, that user's reads stay on the primary for this many seconds
+REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "5"))
+# Replicas lagging more than this (or unreachable) are skipped; lag is re-checked
+# at most every REPLICA_LAG_CHECK_INTERVAL seconds per process
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+REPLICA_LAG_CHECK_INTERVAL = float(os.getenv("REPLICA_LAG_CHECK_INTERVAL", "2"))
+
 # Startup diagnostic (prints once) to confirm DB selection & paths
 try:
     _db = DATABASES.get("default", {})
@@ -125,17 +186,28 @@ REST_FRAMEWORK = {
         "rest_framework.permissions.IsAuthenticated",
     ],
     "EXCEPTION_HANDLER": "financekit.exceptions.exception_handler",
+    # JSON rendering is timed as the `serialize` tracing span
+    "DEFAULT_RENDERER_CLASSES": [
+        "financekit.tracing.TracedJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": int(os.getenv("PAGE_SIZE", "20")),
+    # Token buckets in Redis (one Lua call per check), local fallback without Redis
     "DEFAULT_THROTTLE_CLASSES": [
-        "rest_framework.throttling.UserRateThrottle",
+        "financekit.throttling.TokenBucketThrottle",
     ],
-    # Baseline; per-view can override via throttle_classes
+    # Baseline; per-view can override via throttle_classes.
+    # "<scope>" is per user (per IP when anonymous); "<scope>:device" / "<scope>:ip" add
+    # per-device and per-IP buckets (unset or empty = not applied)
     "DEFAULT_THROTTLE_RATES": {
         "user": os.getenv("THROTTLE_RATE_USER", "100/min"),
-        # Named scopes for clarity if we add custom classes later
         "ingest": os.getenv("THROTTLE_RATE_INGEST", "10/min"),
+        "ingest:ip": os.getenv("THROTTLE_RATE_INGEST_IP", "60/min"),
         "decrypt": os.getenv("THROTTLE_RATE_DECRYPT", "20/min"),
+        "decrypt:device": os.getenv("THROTTLE_RATE_DECRYPT_DEVICE", "20/min"),
+        "decrypt:ip": os.getenv("THROTTLE_RATE_DECRYPT_IP", "120/min"),
+        "export": os.getenv("THROTTLE_RATE_EXPORT", "6/min"),
     },
 }
 
@@ -156,5 +228,150 @@ SERVER_RSA_PUB_PATH  = os.getenv("SERVER_RSA_PUB_PATH")
 # Redis URL (optional for JTI single-use check)
 REDIS_URL = os.getenv("REDIS_URL")
 
+# Cache: with Redis, a per-process LRU (L1) in front of pooled Redis (L2), kept
+# coherent via pub/sub invalidation (financekit.cache_backend); LocMem otherwise
+CACHE_URL = os.getenv("CACHE_URL", REDIS_URL or "")
+if CACHE_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "financekit.cache_backend.TieredCache",
+            "LOCATION": CACHE_URL,
+            "TIMEOUT": int(os.getenv("CACHE_DEFAULT_TIMEOUT", "300")),
+            "KEY_PREFIX": os.getenv("CACHE_KEY_PREFIX", "fk"),
+            "OPTIONS": {
+                "L1_MAX_ENTRIES": int(os.getenv("CACHE_L1_MAX_ENTRIES", "2000")),
+                "L1_TTL": float(os.getenv("CACHE_L1_TTL", "5")),
+                "max_connections": int(os.getenv("CACHE_MAX_CONNECTIONS", "50")),
+                "socket_timeout": float(os.getenv("CACHE_SOCKET_TIMEOUT", "0.5")),
+                "socket_connect_timeout": float(os.getenv("CACHE_SOCKET_TIMEOUT", "0.5")),
+                "health_check_interval": 30,
+            },
+        }
+    }
+else:
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
 # Dev endpoints toggle
 ALLOW_DEV_ENDPOINTS = bool(int(os.getenv("ALLOW_DEV_ENDPOINTS", "1" if DEBUG else "0")))
+
+# Per-user versioned response cache for list/analytics reads (seconds)
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "300"))
+# Also cache with a per-process (LocMem) cache: only safe with a single worker process,
+# otherwise other workers keep serving stale payloads after a write
+RESPONSE_CACHE_LOCAL = bool(int(os.getenv("RESPONSE_CACHE_LOCAL", "0")))
+# Max seconds a concurrent miss waits for another worker's in-flight result
+RESPONSE_CACHE_LOCK_WAIT = float(os.getenv("RESPONSE_CACHE_LOCK_WAIT", "5"))
+
+# Delta sync change log: retention (days) before compaction, and how long new
+# entries settle before being served (guards against out-of-order commits)
+SYNC_LOG_RETENTION_DAYS = int(os.getenv("SYNC_LOG_RETENTION_DAYS", "30"))
+SYNC_SETTLE_SECONDS = float(os.getenv("SYNC_SETTLE_SECONDS", "1"))
+
+# Audit sink: "sync" writes each event inline; "memory"/"redis" queue events and
+# bulk-insert on size/time thresholds (bounded queue, drops are counted)
+AUDIT_SINK = os.getenv("AUDIT_SINK", "memory" if IS_PROD else "sync").lower()
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "200"))
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "2"))
+AUDIT_MAX_QUEUE = int(os.getenv("AUDIT_MAX_QUEUE", "10000"))
+
+# Audit storage: monthly partitions (Postgres) / rolled archive tables (SQLite);
+# partitions older than this many months are dropped by `manage.py audit_partitions`
+AUDIT_RETENTION_MONTHS = int(os.getenv("AUDIT_RETENTION_MONTHS", "12"))
+AUDIT_PARTITIONS_AHEAD = int(os.getenv("AUDIT_PARTITIONS_AHEAD", "2"))
+
+# Token-bucket burst capacity per rate key (defaults to the rate's request count)
+THROTTLE_BURSTS = {
+    k: int(v) for k, v in (
+        ("user", os.getenv("THROTTLE_BURST_USER")),
+        ("ingest", os.getenv("THROTTLE_BURST_INGEST")),
+        ("decrypt", os.getenv("THROTTLE_BURST_DECRYPT")),
+        ("export", os.getenv("THROTTLE_BURST_EXPORT")),
+    ) if v
+}
+
+# Native async views for decrypt/ingest/receipts/analytics (set by capstone_backend.asgi);
+# CPU-bound work (OCR, crypto) runs on a bounded per-process thread pool
+ASYNC_VIEWS = bool(int(os.getenv("ASYNC_VIEWS", "0")))
+ASYNC_CPU_WORKERS = int(os.getenv("ASYNC_CPU_WORKERS", str(min(4, os.cpu_count() or 1))))
+ASYNC_CPU_MAX_PENDING = int(os.getenv("ASYNC_CPU_MAX_PENDING", "16"))
+
+# Hash partitions for receipts/items (by user_id) created by `manage.py receipt_partitions`
+# on Postgres (fixed once converted)
+RECEIPT_HASH_PARTITIONS = int(os.getenv("RECEIPT_HASH_PARTITIONS", "16"))
+
+# External blob store for large receipt ciphertexts (financekit.blobstore):
+# "" keeps them inline, "local" = sharded files under BLOB_LOCAL_ROOT,
+# "s3" = S3-compatible bucket (needs boto3; BLOB_S3_ENDPOINT_URL for MinIO etc.)
+BLOB_BACKEND = os.getenv("BLOB_BACKEND", "").lower()
+BLOB_LOCAL_ROOT = os.getenv("BLOB_LOCAL_ROOT", os.path.join(BASE_DIR, "blobs"))
+BLOB_S3_BUCKET = os.getenv("BLOB_S3_BUCKET", "")
+BLOB_S3_PREFIX = os.getenv("BLOB_S3_PREFIX", "receipts/")
+BLOB_S3_ENDPOINT_URL = os.getenv("BLOB_S3_ENDPOINT_URL") or None
+# Ciphertexts up to this size stay in the row; larger ones go to the store
+# (at ingest, and for existing rows via `manage.py migrate_blobs`)
+BLOB_INLINE_MAX_BYTES = int(os.getenv("BLOB_INLINE_MAX_BYTES", "16384"))
+
+# Keep the original upload, stream-encrypted under the user's DEK (financekit.image_archive);
+# needs BLOB_BACKEND. Segment size bounds memory for encrypting/decrypting images
+RECEIPT_IMAGE_ARCHIVE = bool(int(os.getenv("RECEIPT_IMAGE_ARCHIVE", "0")))
+IMAGE_SEGMENT_SIZE = int(os.getenv("IMAGE_SEGMENT_SIZE", str(64 * 1024)))
+
+# Prometheus metrics (financekit.metrics, served at /metrics). With several workers
+# set METRICS_DIR to a directory cleared at server start: each process writes its
+# own mmap'd file there and a scrape of any worker merges them all
+METRICS_DIR = os.getenv("METRICS_DIR") or os.getenv("PROMETHEUS_MULTIPROC_DIR") or ""
+# Scrapes must send `Authorization: Bearer <METRICS_TOKEN>`; while it is unset only
+# logged-in staff sessions can read /metrics (never anonymous)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# Request tracing (financekit.tracing): per-stage `Server-Timing` response header,
+# and with TRACE_LOG_FILE set, one OTLP/JSON line per sampled request in that file
+SERVER_TIMING = bool(int(os.getenv("SERVER_TIMING", "1")))
+TRACE_LOG_FILE = os.getenv("TRACE_LOG_FILE", "")
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "financekit")
+
+# Request profiling (financekit.profiling): PROFILE_SAMPLE_RATE of requests, plus staff
+# requests sending PROFILE_HEADER, are profiled ("sampling" stack sampler -> collapsed
+# stacks, or "cprofile" -> pstats) into PROFILE_DIR; staff read them at /api/v1/profiles
+PROFILING_ENABLED = bool(int(os.getenv("PROFILING_ENABLED", "0")))
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_HEADER = os.getenv("PROFILE_HEADER", "X-Profile")
+PROFILE_MODE = os.getenv("PROFILE_MODE", "sampling")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(BASE_DIR, "profiles"))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))
+
+# Per-request SQL accounting (financekit.querylog): slow-query log with a sampled
+# EXPLAIN, and N+1 warnings when one query shape repeats NPLUSONE_THRESHOLD+ times
+QUERYLOG_ENABLED = bool(int(os.getenv("QUERYLOG_ENABLED", "1")))
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+SLOW_QUERY_EXPLAIN_RATE = float(os.getenv("SLOW_QUERY_EXPLAIN_RATE", "0.1"))
+NPLUSONE_THRESHOLD = int(os.getenv("NPLUSONE_THRESHOLD", "5"))
+
+# OCR_ENGINE=fake replaces only the Tesseract call with synthetic receipt text (plus
+# OCR_FAKE_DELAY_MS of sleep), for load tests that measure everything else
+OCR_ENGINE = os.getenv("OCR_ENGINE", "tesseract").lower()
+OCR_FAKE_DELAY_MS = float(os.getenv("OCR_FAKE_DELAY_MS", "0"))
+
+# Admission control for the OCR stage of ingest (financekit.admission): at most
+# OCR_MAX_INFLIGHT per process and OCR_MAX_INFLIGHT_HOST per host (Redis semaphore,
+# needs REDIS_URL; 0 = off); up to OCR_QUEUE_MAX requests per process wait
+# OCR_QUEUE_TIMEOUT_MS for a slot, the rest get 503 with Retry-After: OCR_RETRY_AFTER
+OCR_MAX_INFLIGHT = int(os.getenv("OCR_MAX_INFLIGHT", "2"))
+OCR_MAX_INFLIGHT_HOST = int(os.getenv("OCR_MAX_INFLIGHT_HOST", str(max(1, (os.cpu_count() or 2) - 1))))
+OCR_QUEUE_MAX = int(os.getenv("OCR_QUEUE_MAX", "4"))
+OCR_QUEUE_TIMEOUT_MS = float(os.getenv("OCR_QUEUE_TIMEOUT_MS", "2000"))
+OCR_RETRY_AFTER = int(os.getenv("OCR_RETRY_AFTER", "5"))
+ADMISSION_LEASE_SECONDS = int(os.getenv("ADMISSION_LEASE_SECONDS", "120"))
+
+# OCR time budgets (financekit.ocr_engine.run; 0 = unlimited). Tesseract is killed at
+# OCR_TESSERACT_BUDGET_MS and retried once at half size within OCR_FALLBACK_BUDGET_MS
+# ("ocr_status": "partial"); past that ingest answers 503 "ocr_deferred" with
+# Retry-After instead of holding the worker (the grant is released, so the retry may
+# reuse it). Images over OCR_MAX_PIXELS are decoded at reduced size
+OCR_PREPROCESS_BUDGET_MS = float(os.getenv("OCR_PREPROCESS_BUDGET_MS", "5000"))
+OCR_TESSERACT_BUDGET_MS = float(os.getenv("OCR_TESSERACT_BUDGET_MS", "15000"))
+OCR_FALLBACK_BUDGET_MS = float(os.getenv("OCR_FALLBACK_BUDGET_MS", "5000"))
+OCR_NORMALIZE_BUDGET_MS = float(os.getenv("OCR_NORMALIZE_BUDGET_MS", "1000"))
+OCR_MAX_PIXELS = int(os.getenv("OCR_MAX_PIXELS", str(24_000_000)))
@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.http import HttpResponse
 from django.urls import path, include
-from financekit.views import ReceiptListView, ReceiptDetailView
+from financekit.views import ReceiptListView, ReceiptDetailView, metrics_view
 
 urlpatterns = [
     path("admin/", admin.site.urls),
@@ -9,4 +9,5 @@ urlpatterns = [
     path("api/v1/receipts", ReceiptListView.as_view()),
     path("api/v1/receipts/<int:pk>", ReceiptDetailView.as_view()),
     path("health", lambda r: HttpResponse("ok")),
+    path("metrics", metrics_view),
 ]
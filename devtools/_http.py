@@ -0,0 +1,77 @@
+# devtools/_http.py
+"""
+Minimal asyncio HTTP/1.1 client with a keep-alive connection pool for the
+devtools load scripts. Enough HTTP for our own server: Content-Length and
+chunked bodies, no TLS, no redirects.
+"""
+import asyncio
+from urllib.parse import urlsplit
+
+
+class HttpPool:
+    def __init__(self, base: str, size: int):
+        u = urlsplit(base)
+        self.host, self.port, self.netloc = u.hostname, u.port or 80, u.netloc
+        self._idle: list = []
+        self._sem = asyncio.Semaphore(size)
+
+    async def request(self, method: str, path: str, headers: dict | None = None, body: bytes = b""):
+        """Returns (status, headers, body)."""
+        async with self._sem:
+            reused = bool(self._idle)
+            conn = self._idle.pop() if reused else await asyncio.open_connection(self.host, self.port)
+            try:
+                result = await self._send(conn, method, path, headers or {}, body)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                conn[1].close()
+                if not reused:
+                    raise
+                # The server closed an idle keep-alive connection; retry once on a fresh one
+                conn = await asyncio.open_connection(self.host, self.port)
+                try:
+                    result = await self._send(conn, method, path, headers or {}, body)
+                except BaseException:
+                    conn[1].close()
+                    raise
+            except BaseException:
+                conn[1].close()
+                raise
+            if result[1].get("connection", "").lower() == "close":
+                conn[1].close()
+            else:
+                self._idle.append(conn)
+            return result
+
+    async def _send(self, conn, method, path, headers, body):
+        reader, writer = conn
+        head = [f"{method} {path} HTTP/1.1", f"Host: {self.netloc}", f"Content-Length: {len(body)}",
+                "Accept: application/json", "Connection: keep-alive"]
+        head += [f"{k}: {v}" for k, v in headers.items()]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionError("closed")
+        status = int(status_line.split()[1])
+        hdrs = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            k, _, v = line.decode("latin-1").partition(":")
+            hdrs[k.strip().lower()] = v.strip()
+        if "chunked" in hdrs.get("transfer-encoding", "").lower():
+            parts = []
+            while True:
+                size = int((await reader.readline()).strip().split(b";")[0] or b"0", 16)
+                parts.append(await reader.readexactly(size + 2))
+                if size == 0:
+                    break
+            data = b"".join(p[:-2] for p in parts)
+        else:
+            data = await reader.readexactly(int(hdrs.get("content-length") or 0))
+        return status, hdrs, data
+
+    def close(self):
+        for _, w in self._idle:
+            w.close()
@@ -0,0 +1,144 @@
+# devtools/bench_analytics.py
+"""
+Benchmark AnalyticsSpendView aggregation: legacy three round trips
+(total, by-category, top-5 merchants) vs. the single-statement spend_summary().
+
+Run against a THROWAWAY database; it inserts synthetic rows for bench_* users.
+
+  DB_ENGINE=postgresql python devtools/bench_analytics.py --rows 5000000 --users 50
+  python devtools/bench_analytics.py --rows 200000 --users 10 --cleanup   # sqlite smoke run
+
+--out writes the JSON result (e.g. devtools/baselines/analytics-postgresql.json).
+"""
+import argparse, json, os, pathlib, platform, statistics, sys, time
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "capstone_backend.settings")
+
+import django  # noqa: E402
+django.setup()
+
+from decimal import Decimal  # noqa: E402
+import random  # noqa: E402
+from django.contrib.auth.models import User  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.db.models import Sum  # noqa: E402
+from financekit.analytics import spend_summary  # noqa: E402
+from financekit.models import Receipt  # noqa: E402
+
+CATEGORIES = ["Food", "Grocery", "Transport", "Shopping", "Bills", "Health", "Fun", "Other"]
+MERCHANTS = 400
+
+_PG_FILL = """
+INSERT INTO financekit_receipt
+    (user_id, year, month, category, merchant, date_str, currency, total,
+     subtotal, tax_total, discount_total, fees_total, tip_total, raw_text, ocr_json, created_at, body_ref)
+SELECT u.ids[1 + (g %% array_length(u.ids, 1))],
+       2024 + (g %% 2), 1 + (g %% 12),
+       (ARRAY[%s])[1 + (g %% %s)],
+       'Merchant ' || (floor(power(random(), 3) * %s))::int,
+       '', 'USD', round((random() * 200)::numeric, 2),
+       0, 0, 0, 0, 0, '', '{}', now(), ''
+FROM generate_series(1, %s) AS g,
+     (SELECT array_agg(id ORDER BY id) AS ids FROM auth_user WHERE username LIKE 'bench\\_%%') AS u
+"""
+
+
+def ensure_users(n: int) -> list[User]:
+    return [User.objects.get_or_create(username=f"bench_{i}")[0] for i in range(n)]
+
+
+def fill(users: list[User], rows: int) -> None:
+    have = Receipt.objects.filter(user__in=users).count()
+    missing = rows - have
+    if missing <= 0:
+        print(f"[*] {have} synthetic rows already present")
+        return
+    print(f"[*] inserting {missing} synthetic rows ...")
+    t0 = time.perf_counter()
+    if connection.vendor == "postgresql":
+        cats = ",".join(f"'{c}'" for c in CATEGORIES)
+        with connection.cursor() as cur:
+            cur.execute(_PG_FILL % (cats, len(CATEGORIES), MERCHANTS, missing))
+            cur.execute("ANALYZE financekit_receipt")
+    else:
+        batch = []
+        for i in range(missing):
+            batch.append(Receipt(
+                user=users[i % len(users)], year=2024 + i % 2, month=1 + i % 12,
+                category=CATEGORIES[i % len(CATEGORIES)],
+                merchant=f"Merchant {int(random.random() ** 3 * MERCHANTS)}",
+                total=Decimal(random.randint(0, 20000)) / 100,
+            ))
+            if len(batch) >= 10000:
+                Receipt.objects.bulk_create(batch)
+                batch.clear()
+        Receipt.objects.bulk_create(batch)
+    print(f"    done in {time.perf_counter() - t0:.1f}s")
+
+
+def legacy(qs):
+    total = qs.aggregate(total=Sum("total")).get("total") or 0
+    by_category = list(qs.values("category").annotate(total=Sum("total")).order_by("-total"))
+    top = list(qs.values("merchant").annotate(total=Sum("total")).order_by("-total")[:5])
+    return total, by_category, top
+
+
+def timeit(fn, qs, iterations: int) -> dict:
+    fn(qs)  # warm-up
+    samples = []
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn(qs)
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    return {
+        "p50_ms": round(statistics.median(samples), 2),
+        "p95_ms": round(samples[max(0, int(len(samples) * 0.95) - 1)], 2),
+        "mean_ms": round(statistics.fmean(samples), 2),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=5_000_000)
+    ap.add_argument("--users", type=int, default=50)
+    ap.add_argument("--iterations", type=int, default=20)
+    ap.add_argument("--cleanup", action="store_true")
+    ap.add_argument("--out", help="also write the JSON result to this file")
+    args = ap.parse_args()
+
+    users = ensure_users(args.users)
+    fill(users, args.rows)
+
+    user = users[0]
+    cases = {
+        "user_all_time": Receipt.objects.filter(user=user),
+        "user_one_month": Receipt.objects.filter(user=user, year=2025, month=1),
+        "user_month_category": Receipt.objects.filter(user=user, year=2025, month=1, category__iexact="Food"),
+    }
+    results = {
+        "vendor": connection.vendor, "server_version": getattr(connection, "pg_version", None),
+        "python": platform.python_version(), "django": django.get_version(),
+        "rows": args.rows, "users": args.users, "iterations": args.iterations,
+        "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "cases": {},
+    }
+    for name, qs in cases.items():
+        results["cases"][name] = {
+            "legacy_3_queries": timeit(legacy, qs, args.iterations),
+            "spend_summary": timeit(lambda q: spend_summary(q, top=5), qs, args.iterations),
+        }
+    print(json.dumps(results, indent=2))
+    if args.out:
+        path = pathlib.Path(args.out)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(results, indent=2) + "\n")
+
+    if args.cleanup:
+        Receipt.objects.filter(user__in=users).delete()
+        User.objects.filter(id__in=[u.id for u in users]).delete()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# devtools/bench_concurrency.py
+"""
+Concurrency benchmark: WSGI (gunicorn sync workers) vs ASGI (gunicorn + uvicorn
+workers with ASYNC_VIEWS=1) on the same endpoints.
+
+The asyncio HTTP/1.1 client in devtools/_http.py keeps N keep-alive connections
+busy for a fixed duration and reports throughput, error counts and latency
+percentiles (JSON).
+
+  # Against an already running server
+  python devtools/bench_concurrency.py --url http://127.0.0.1:8000 --user bench --password pass1234
+
+  # Start each profile in turn on a free port and compare (needs gunicorn + uvicorn)
+  python devtools/bench_concurrency.py --compare --user bench --password pass1234 --concurrency 64
+"""
+import argparse, asyncio, base64, json, os, pathlib, socket, statistics, subprocess, time
+
+from _http import HttpPool
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+
+PROFILES = {
+    "wsgi": ["gunicorn", "capstone_backend.wsgi:application", "--workers", "3", "--timeout", "120"],
+    "asgi": ["gunicorn", "capstone_backend.asgi:application", "-k", "uvicorn.workers.UvicornWorker",
+             "--workers", "3", "--timeout", "120"],
+}
+DEFAULT_PATHS = ["/api/v1/receipts", "/api/v1/analytics/spend", "/api/v1/health"]
+
+
+async def _worker(base: str, paths: list, auth: str, deadline: float, lat: list, errors: dict, idx: int):
+    pool = HttpPool(base, 1)  # one keep-alive connection per worker, reopened after an error
+    headers = {"Authorization": auth}
+    i = idx
+    try:
+        while time.perf_counter() < deadline:
+            path = paths[i % len(paths)]
+            i += 1
+            try:
+                t0 = time.perf_counter()
+                status, _, _ = await pool.request("GET", path, headers)
+                lat.append((time.perf_counter() - t0) * 1000.0)
+                if status >= 400:
+                    errors[str(status)] = errors.get(str(status), 0) + 1
+            except Exception as e:
+                errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+    finally:
+        pool.close()
+
+
+async def run_load(base: str, paths: list, auth: str, concurrency: int, duration: float) -> dict:
+    lat: list = []
+    errors: dict = {}
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*(_worker(base, paths, auth, deadline, lat, errors, i) for i in range(concurrency)))
+    lat.sort()
+
+    def pct(p):
+        return round(lat[min(len(lat) - 1, int(p / 100.0 * len(lat)))], 2) if lat else None
+
+    return {
+        "requests": len(lat),
+        "rps": round(len(lat) / duration, 1),
+        "errors": errors,
+        "latency_ms": {"p50": pct(50), "p90": pct(90), "p99": pct(99), "max": pct(100),
+                       "mean": round(statistics.fmean(lat), 2) if lat else None},
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(port: int, timeout: float = 30.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"server on :{port} did not start")
+
+
+def run_profile(name: str, args, auth: str) -> dict:
+    port = _free_port()
+    env = dict(os.environ, ASYNC_VIEWS="1" if name == "asgi" else "0")
+    cmd = PROFILES[name] + ["--bind", f"127.0.0.1:{port}", "--workers", str(args.workers)]
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        _wait_ready(port)
+        base = f"http://127.0.0.1:{port}"
+        asyncio.run(run_load(base, args.paths, auth, min(4, args.concurrency), 2.0))  # warm-up
+        return asyncio.run(run_load(base, args.paths, auth, args.concurrency, args.duration))
+    finally:
+        proc.terminate()
+        proc.wait(timeout=15)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--url", default=None, help="benchmark a running server instead of --compare")
+    ap.add_argument("--compare", action="store_true", help="start the wsgi and asgi profiles in turn")
+    ap.add_argument("--user", required=True)
+    ap.add_argument("--password", required=True)
+    ap.add_argument("--concurrency", type=int, default=32)
+    ap.add_argument("--duration", type=float, default=15.0)
+    ap.add_argument("--workers", type=int, default=3)
+    ap.add_argument("--paths", nargs="+", default=DEFAULT_PATHS)
+    args = ap.parse_args()
+
+    auth = "Basic " + base64.b64encode(f"{args.user}:{args.password}".encode()).decode()
+    meta = {"concurrency": args.concurrency, "duration_s": args.duration, "paths": args.paths}
+    if args.compare:
+        out = {**meta, "workers": args.workers, "profiles": {n: run_profile(n, args, auth) for n in PROFILES}}
+    elif args.url:
+        out = {**meta, "url": args.url, "result": asyncio.run(
+            run_load(args.url, args.paths, auth, args.concurrency, args.duration))}
+    else:
+        ap.error("pass --url or --compare")
+    print(json.dumps(out, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# devtools/bench_dbpool.py
+"""
+Requests/second with and without database connection reuse, against Postgres.
+
+Starts gunicorn once per DB_POOL mode (off / persistent / pool) on a free port
+and drives it with the asyncio client from bench_concurrency.py. Each run ends
+with the worker-reported /api/v1/health "db_pool" stats (connects, average
+connect/checkout time, ...). Prints JSON.
+
+  make db-up                                   # local Postgres container (docker-compose.yml)
+  DB_ENGINE=postgresql python manage.py migrate
+  DB_ENGINE=postgresql python devtools/bench_dbpool.py --user bench --password pass1234
+  # TLS cost too (server must have ssl=on):
+  DB_ENGINE=postgresql DB_SSLMODE=require python devtools/bench_dbpool.py --user bench --password pass1234
+"""
+import argparse, asyncio, base64, json, os, pathlib, subprocess, sys, urllib.request
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent))
+from bench_concurrency import ROOT, _free_port, _wait_ready, run_load  # noqa: E402
+
+MODES = ("off", "persistent", "pool")
+
+
+def _health(base: str, auth: str) -> dict:
+    req = urllib.request.Request(base + "/api/v1/health", headers={"Authorization": auth})
+    with urllib.request.urlopen(req, timeout=10) as r:
+        return json.loads(r.read()).get("db_pool") or {}
+
+
+def run_mode(mode: str, args, auth: str) -> dict:
+    port = _free_port()
+    env = dict(os.environ, DB_POOL=mode, DB_ENGINE=os.environ.get("DB_ENGINE", "postgresql"))
+    cmd = ["gunicorn", "capstone_backend.wsgi:application", "--bind", f"127.0.0.1:{port}",
+           "--workers", str(args.workers), "--threads", str(args.threads), "--timeout", "120"]
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        _wait_ready(port)
+        base = f"http://127.0.0.1:{port}"
+        asyncio.run(run_load(base, args.paths, auth, 2, 2.0))  # warm-up
+        result = asyncio.run(run_load(base, args.paths, auth, args.concurrency, args.duration))
+        result["db_pool"] = _health(base, auth)  # one worker's view
+        return result
+    finally:
+        proc.terminate()
+        proc.wait(timeout=15)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--user", required=True)
+    ap.add_argument("--password", required=True)
+    ap.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    ap.add_argument("--concurrency", type=int, default=32)
+    ap.add_argument("--duration", type=float, default=15.0)
+    ap.add_argument("--workers", type=int, default=3)
+    ap.add_argument("--threads", type=int, default=4)
+    ap.add_argument("--paths", nargs="+", default=["/api/v1/receipts", "/api/v1/analytics/spend"])
+    args = ap.parse_args()
+
+    auth = "Basic " + base64.b64encode(f"{args.user}:{args.password}".encode()).decode()
+    out = {
+        "sslmode": os.environ.get("DB_SSLMODE", "disable"),
+        "concurrency": args.concurrency,
+        "duration_s": args.duration,
+        "workers": args.workers,
+        "threads": args.threads,
+        "modes": {m: run_mode(m, args, auth) for m in args.modes},
+    }
+    print(json.dumps(out, indent=2))
+
+
+if __name__ == "__main__":
+    main()
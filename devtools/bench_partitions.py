@@ -0,0 +1,126 @@
+# devtools/bench_partitions.py
+"""
+Per-user list and analytics latency vs. table size, plain vs. hash-partitioned
+(Postgres only).
+
+Builds two scratch tables shaped like financekit_receipt (bench_rcpt_plain and
+bench_rcpt_hash, PARTITION BY HASH (user_id)) with the same indexes, grows both
+to each --sizes step with a fixed number of receipts per user, and times the
+queries ReceiptListView / AnalyticsSpendView issue for one user. Prints JSON.
+The app tables are not touched; scratch tables are dropped unless --keep.
+
+  DB_ENGINE=postgresql python devtools/bench_partitions.py --sizes 1000000 10000000 50000000
+"""
+import argparse, json, os, pathlib, statistics, sys, time
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "capstone_backend.settings")
+
+import django  # noqa: E402
+django.setup()
+
+from django.db import connection  # noqa: E402
+
+PLAIN, HASHED = "bench_rcpt_plain", "bench_rcpt_hash"
+CATEGORIES = ["Food", "Grocery", "Transport", "Shopping", "Bills", "Health", "Fun", "Other"]
+
+QUERIES = {
+    "list_page": "SELECT id, merchant, total, created_at FROM {t} WHERE user_id = %s "
+                 "ORDER BY created_at DESC LIMIT 20",
+    "list_count": "SELECT COUNT(*) FROM {t} WHERE user_id = %s",
+    "analytics_month": "SELECT category, SUM(total) FROM {t} WHERE user_id = %s AND year = 2025 AND month = 3 "
+                       "GROUP BY ROLLUP (category)",
+    "analytics_all_time": "SELECT merchant, SUM(total) AS s FROM {t} WHERE user_id = %s "
+                          "GROUP BY merchant ORDER BY s DESC LIMIT 5",
+}
+
+
+def create(cur, partitions: int) -> None:
+    cols = ("id bigint NOT NULL, user_id integer NOT NULL, year integer, month integer, category varchar(64), "
+            "merchant varchar(255) NOT NULL, total numeric(12,2) NOT NULL, created_at timestamptz NOT NULL")
+    cur.execute(f"DROP TABLE IF EXISTS {PLAIN}, {HASHED}")
+    cur.execute(f"CREATE TABLE {PLAIN} ({cols}, PRIMARY KEY (id))")
+    cur.execute(f"CREATE TABLE {HASHED} ({cols}, PRIMARY KEY (id, user_id)) PARTITION BY HASH (user_id)")
+    for n in range(partitions):
+        cur.execute(f"CREATE TABLE {HASHED}_p{n} PARTITION OF {HASHED} "
+                    f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {n})")
+    for t in (PLAIN, HASHED):
+        cur.execute(f"CREATE INDEX ON {t} (user_id, created_at DESC)")
+        cur.execute(f"CREATE INDEX ON {t} (user_id, year, month)")
+
+
+def grow(cur, start: int, stop: int, per_user: int) -> None:
+    cats = ",".join(f"'{c}'" for c in CATEGORIES)
+    for t in (PLAIN, HASHED):
+        cur.execute(
+            f"INSERT INTO {t} SELECT g, 1 + (g - 1) / %s, 2024 + (g %% 2), 1 + (g %% 12), "
+            f"(ARRAY[{cats}])[1 + (g %% {len(CATEGORIES)})], 'Merchant ' || (g %% 97), "
+            f"round((random() * 200)::numeric, 2), now() - (g %% 700) * interval '1 day' "
+            f"FROM generate_series(%s, %s) AS g",
+            [per_user, start + 1, stop],
+        )
+        cur.execute(f"ANALYZE {t}")
+
+
+def timeit(cur, sql: str, user_id: int, iterations: int) -> dict:
+    cur.execute(sql, [user_id])  # warm-up
+    cur.fetchall()
+    samples = []
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        cur.execute(sql, [user_id])
+        cur.fetchall()
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    return {
+        "p50_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(samples[max(0, int(len(samples) * 0.95) - 1)], 3),
+    }
+
+
+def index_mb(cur, table: str) -> float:
+    cur.execute(
+        "SELECT COALESCE(SUM(pg_indexes_size(relid)), 0) FROM pg_partition_tree(%s::regclass)", [table]
+    )
+    return round(cur.fetchone()[0] / 2**20, 1)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000, 10_000_000])
+    ap.add_argument("--per-user", type=int, default=2000, help="receipts per user (fixed as the table grows)")
+    ap.add_argument("--partitions", type=int, default=16)
+    ap.add_argument("--iterations", type=int, default=50)
+    ap.add_argument("--keep", action="store_true", help="keep the scratch tables")
+    args = ap.parse_args()
+    if connection.vendor != "postgresql":
+        sys.exit("bench_partitions needs Postgres (DB_ENGINE=postgresql)")
+
+    out = {"partitions": args.partitions, "per_user": args.per_user, "steps": []}
+    with connection.cursor() as cur:
+        create(cur, args.partitions)
+        have = 0
+        try:
+            for size in sorted(args.sizes):
+                t0 = time.perf_counter()
+                grow(cur, have, size, args.per_user)
+                have = size
+                user_id = max(1, size // args.per_user // 2)  # a user in the middle of the table
+                step = {"rows": size, "load_s": round(time.perf_counter() - t0, 1), "tables": {}}
+                for label, t in (("plain", PLAIN), ("hash", HASHED)):
+                    step["tables"][label] = {
+                        "index_mb": index_mb(cur, t),
+                        **{name: timeit(cur, sql.format(t=t), user_id, args.iterations)
+                           for name, sql in QUERIES.items()},
+                    }
+                out["steps"].append(step)
+                print(json.dumps(step), file=sys.stderr)
+        finally:
+            if not args.keep:
+                cur.execute(f"DROP TABLE IF EXISTS {PLAIN}, {HASHED}")
+    print(json.dumps(out, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+# devtools/bench_reads.py
+"""
+Time every read endpoint at several data scales and keep JSON baselines.
+
+For each scale (receipts per user) the synth_* users are topped up with
+financekit.synthetic (COPY on Postgres, batched inserts on SQLite), then each
+endpoint is requested in-process through the full middleware stack with the
+response cache cleared before every request, so numbers are cold-path
+server time. Sync reads an empty change log (synthetic rows bypass it).
+Per endpoint: p50/p95/mean ms, SQL queries per request and
+response bytes.
+
+Run against a THROWAWAY database:
+
+  DB_ENGINE=postgresql python devtools/bench_reads.py --scales 1000,10000,100000
+  python devtools/bench_reads.py --scales 200,2000 --iterations 5          # sqlite smoke run
+  python devtools/bench_reads.py --reset --compare devtools/baselines/reads-postgresql.json --tolerance 0.25
+
+Results are written to devtools/baselines/reads-<vendor>.json (or --out).
+--compare exits 1 when any endpoint's p50 is more than --tolerance slower
+than the baseline, or issues more queries. Scales only grow (rows are never
+trimmed), so pass --reset to start from empty synth_* users on a rerun; a
+scale whose measured row count differs from the baseline's is not compared.
+"""
+import argparse, json, os, pathlib, platform, statistics, sys, time
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "capstone_backend.settings")
+# Per-user/export throttles would turn later iterations into 429s
+os.environ.setdefault("THROTTLE_RATE_USER", "1000000/min")
+os.environ.setdefault("THROTTLE_RATE_EXPORT", "1000000/min")
+
+import django  # noqa: E402
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.core.cache import cache  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.db.models import Count  # noqa: E402
+from django.test import Client  # noqa: E402
+from financekit import synthetic  # noqa: E402
+from financekit.models import Receipt  # noqa: E402
+from financekit.querylog import QueryLog  # noqa: E402
+from financekit.recurring import recompute_user  # noqa: E402
+
+BASELINES = ROOT / "devtools" / "baselines"
+
+
+def endpoints(user) -> dict[str, str]:
+    """Name -> URL for one user's data (a busy month, a head merchant, a real receipt id)."""
+    rs = Receipt.objects.filter(user=user)
+    latest = rs.order_by("-created_at").values("id", "year", "month").first()
+    head = (rs.values("merchant").order_by().annotate(n=Count("id")).order_by("-n").first() or {})
+    count = rs.count()
+    page = settings.REST_FRAMEWORK.get("PAGE_SIZE", 20)
+    deep = max(1, count // page // 2)
+    ym = f"{latest['year']:04d}-{latest['month']:02d}"
+    return {
+        "receipts_page1": "/api/v1/receipts",
+        "receipts_deep_page": f"/api/v1/receipts?page={deep}",
+        "receipts_month": f"/api/v1/receipts?month={ym}",
+        "receipts_merchant": f"/api/v1/receipts?merchant={head.get('merchant', '')}",
+        "receipt_detail": f"/api/v1/receipts/{latest['id']}",
+        "analytics_spend_month": f"/api/v1/analytics/spend?month={ym}",
+        "analytics_spend_all": "/api/v1/analytics/spend",
+        "analytics_series_month": f"/api/v1/analytics/spend/series?from={latest['year'] - 1}-01&to={ym}&group_by=category",
+        "analytics_series_day": f"/api/v1/analytics/spend/series?from={ym}&to={ym}&granularity=day",
+        "analytics_insights": "/api/v1/analytics/insights",
+        "recurring": "/api/v1/recurring",
+        "sync_receipts": "/api/v1/sync/receipts?limit=500",
+        "export_jsonl": "/api/v1/receipts/export?fmt=jsonl",
+    }
+
+
+def measure(client: Client, url: str, iterations: int) -> dict:
+    samples, queries, size = [], [], 0
+    for i in range(iterations + 1):
+        cache.clear()
+        ql = QueryLog()
+        with ql.installed():
+            t0 = time.perf_counter()
+            r = client.get(url)
+            body = b"".join(r.streaming_content) if r.streaming else r.content
+            ms = (time.perf_counter() - t0) * 1000
+        if r.status_code != 200:
+            return {"status": r.status_code}
+        if i == 0:
+            continue  # warm-up (imports, connection, plan cache)
+        samples.append(ms)
+        queries.append(ql.count)
+        size = len(body)
+    samples.sort()
+    return {
+        "p50_ms": round(statistics.median(samples), 2),
+        "p95_ms": round(samples[max(0, int(len(samples) * 0.95) - 1)], 2),
+        "mean_ms": round(statistics.fmean(samples), 2),
+        "queries": max(queries),
+        "bytes": size,
+    }
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list[str]:
+    problems = []
+    for scale, eps in current["scales"].items():
+        base = baseline.get("scales", {}).get(scale, {})
+        if base.get("receipts_per_user") != eps.get("receipts_per_user"):
+            continue
+        for name, now in eps.items():
+            then = base.get(name)
+            if not isinstance(now, dict):
+                continue
+            if not then or "p50_ms" not in then or "p50_ms" not in now:
+                continue
+            if now["p50_ms"] > then["p50_ms"] * (1 + tolerance):
+                problems.append(f"{scale}/{name}: p50 {now['p50_ms']}ms vs baseline {then['p50_ms']}ms")
+            if now["queries"] > then["queries"]:
+                problems.append(f"{scale}/{name}: {now['queries']} queries vs baseline {then['queries']}")
+    return problems
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--scales", default="1000,10000,100000", help="receipts per user, comma-separated")
+    ap.add_argument("--users", type=int, default=4, help="synthetic users (data is per user; others add table size)")
+    ap.add_argument("--iterations", type=int, default=20)
+    ap.add_argument("--only", help="comma-separated endpoint names")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--reset", action="store_true", help="delete the synth_* users' receipts first")
+    ap.add_argument("--out", help="baseline file to write (default devtools/baselines/reads-<vendor>.json)")
+    ap.add_argument("--compare", help="baseline file to check against")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="allowed p50 slowdown vs --compare")
+    args = ap.parse_args()
+
+    users = synthetic.synth_users(args.users, "synth_")
+    if args.reset:
+        Receipt.objects.filter(user__in=users).delete()
+    client = Client()
+    client.force_login(users[0])
+    only = set(args.only.split(",")) if args.only else None
+    results = {
+        "vendor": connection.vendor, "python": platform.python_version(), "django": django.get_version(),
+        "users": args.users, "iterations": args.iterations, "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "scales": {},
+    }
+    for scale in sorted(int(s) for s in args.scales.split(",")):
+        t0 = time.perf_counter()
+        n = synthetic.generate(users, scale, seed=args.seed)
+        print(f"[*] scale {scale}/user: wrote {n} receipts in {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+        recompute_user(users[0].pk)  # materialized recurring charges for the measured user
+        out = results["scales"][str(scale)] = {"receipts_per_user": Receipt.objects.filter(user=users[0]).count()}
+        for name, url in endpoints(users[0]).items():
+            if only and name not in only:
+                continue
+            out[name] = measure(client, url, args.iterations)
+            print(f"    {name:24s} {json.dumps(out[name])}", file=sys.stderr)
+
+    path = pathlib.Path(args.out) if args.out else BASELINES / f"reads-{connection.vendor}.json"
+    if args.compare:
+        baseline = json.loads(pathlib.Path(args.compare).read_text())
+        problems = compare(results, baseline, args.tolerance)
+        for p in problems:
+            print(f"REGRESSION {p}")
+        if problems:
+            sys.exit(1)
+        print("[*] no regressions against", args.compare)
+        if not args.out:
+            return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(results, indent=2) + "\n")
+    print(f"[*] wrote {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+# devtools/loadgen.py
+"""
+Load generator for the full client flow: provisions N users + devices, then
+drives a mixed ingest / decrypt / list / analytics workload at a target rate
+(open loop, Poisson arrivals) and reports throughput, latency percentiles,
+status/throttle breakdowns and the server's own per-stage times (averaged
+from Server-Timing headers) as JSON.
+
+Provisioning uses the same endpoints as the mobile client, with client-side
+keys: /auth/register (or /auth/token when the user already exists),
+/device/register with a fresh Ed25519 key, and a random DEK wrapped for the
+server's RSA key. Every ingest/decrypt signs a new single-use grant.
+
+Measure everything but Tesseract by starting the server with the fake engine,
+and relax the throttles unless they are what you are measuring:
+
+  OCR_ENGINE=fake OCR_FAKE_DELAY_MS=0 THROTTLE_RATE_USER=100000/min \
+  THROTTLE_RATE_INGEST=100000/min THROTTLE_RATE_DECRYPT=100000/min THROTTLE_RATE_DECRYPT_DEVICE=100000/min \
+  THROTTLE_RATE_INGEST_IP= THROTTLE_RATE_DECRYPT_IP= make serve-wsgi
+
+  python devtools/loadgen.py --url http://127.0.0.1:8000 --users 20 --rate 50 --duration 30 \
+      --mix ingest=1,decrypt=2,list=5,analytics=2 --out loadgen.json
+"""
+import argparse, asyncio, base64, json, os, random, statistics, struct, sys, time, uuid, zlib
+from collections import defaultdict
+
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding as asy_padding
+from nacl import signing
+from nacl.encoding import Base64Encoder
+
+from _http import HttpPool
+
+DEFAULT_MIX = "ingest=1,decrypt=2,list=5,analytics=2"
+
+
+def _json(headers: dict | None = None) -> dict:
+    return {"Content-Type": "application/json", **(headers or {})}
+
+
+def _multipart(fields: dict, file_field: str, filename: str, content: bytes, ctype: str):
+    boundary = uuid.uuid4().hex
+    out = []
+    for k, v in fields.items():
+        out.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{k}"\r\n\r\n{v}\r\n'.encode())
+    out.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{file_field}"; filename="{filename}"\r\n'
+               f"Content-Type: {ctype}\r\n\r\n".encode() + content + b"\r\n")
+    out.append(f"--{boundary}--\r\n".encode())
+    return b"".join(out), f"multipart/form-data; boundary={boundary}"
+
+
+def make_png(seed: int, size: int = 96) -> bytes:
+    """Small grayscale PNG (no PIL needed); the seed varies the bytes, so the fake OCR varies too."""
+    rng = random.Random(seed)
+    rows = b"".join(b"\x00" + bytes(rng.choice((0, 255)) if rng.random() < 0.1 else 255 for _ in range(size))
+                    for _ in range(size))
+
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+    ihdr = struct.pack(">IIBBBBB", size, size, 8, 0, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", ihdr) + chunk(b"IDAT", zlib.compress(rows)) + chunk(b"IEND", b"")
+
+
+def b64u(b: bytes) -> str:
+    return base64.urlsafe_b64encode(b).decode().rstrip("=")
+
+
+# ---- simulated client ------------------------------------------------------
+
+class VirtualUser:
+    def __init__(self, username: str):
+        self.username = username
+        self.access = self.refresh = ""
+        self.device_id = f"lg-{uuid.uuid4().hex[:12]}"
+        self.sk = signing.SigningKey.generate()
+        self.dek = os.urandom(32)
+        self.dek_wrap = ""
+        self.receipts: list[int] = []
+
+    def grant(self, scope: str) -> str:
+        now = int(time.time())
+        header = {"alg": "EdDSA", "typ": "JWT", "kid": self.device_id}
+        payload = {"iss": "loadgen", "sub": self.username, "scope": [scope], "iat": now, "nbf": now - 60,
+                   "exp": now + 300, "jti": os.urandom(16).hex()}
+        h = b64u(json.dumps(header, separators=(",", ":")).encode())
+        p = b64u(json.dumps(payload, separators=(",", ":")).encode())
+        return f"{h}.{p}.{b64u(self.sk.sign(f'{h}.{p}'.encode()).signature)}"
+
+    def auth(self) -> dict:
+        return {"Authorization": f"Bearer {self.access}"}
+
+
+async def _with_retry(pool, method, path, build, attempts=20):
+    """Provisioning requests retry 429/503 (honouring Retry-After) so a throttled setup still completes.
+    build() returns (headers, body) and is called per attempt, so grant-bearing bodies are re-signed."""
+    for _ in range(attempts):
+        headers, body = build()
+        status, hdrs, data = await pool.request(method, path, headers, body)
+        if status not in (429, 503):
+            return status, hdrs, data
+        await asyncio.sleep(float(hdrs.get("retry-after") or 1))
+    return status, hdrs, data
+
+
+async def provision(pool: HttpPool, user: VirtualUser, password: str, server_pem: bytes, image_seed: int) -> None:
+    body = json.dumps({"username": user.username, "password": password}).encode()
+    status, _, data = await _with_retry(pool, "POST", "/api/v1/auth/register", lambda: (_json(), body))
+    if status != 201:  # already exists (re-run with the same --prefix): log in instead
+        status, _, data = await _with_retry(pool, "POST", "/api/v1/auth/token", lambda: (_json(), body))
+        if status != 200:
+            raise RuntimeError(f"cannot provision {user.username}: {status} {data[:200]!r}")
+    tokens = json.loads(data)
+    user.access, user.refresh = tokens["access"], tokens["refresh"]
+
+    pub = user.sk.verify_key.encode(encoder=Base64Encoder).decode()
+    body = json.dumps({"device_id": user.device_id, "public_key_b64": pub}).encode()
+    status, _, data = await _with_retry(pool, "POST", "/api/v1/device/register", lambda: (_json(user.auth()), body))
+    if status >= 300:
+        raise RuntimeError(f"device register failed for {user.username}: {status} {data[:200]!r}")
+
+    key = serialization.load_pem_public_key(server_pem)
+    user.dek_wrap = base64.b64encode(key.encrypt(user.dek, asy_padding.OAEP(
+        mgf=asy_padding.MGF1(algorithm=hashes.SHA256()), algorithm=hashes.SHA256(), label=None))).decode()
+
+    # One receipt per user up front, so decrypt has targets from the start
+    status, _, data = await ingest(pool, user, image_seed, retry=True)
+    if status != 200:
+        raise RuntimeError(f"seed ingest failed for {user.username}: {status} {data[:200]!r}")
+
+
+async def ingest(pool, user: VirtualUser, seed: int, retry: bool = False):
+    month, category = str(1 + seed % 12), random.choice(("Food", "Groceries", "Travel", "Home"))
+    image = make_png(seed)
+
+    def build():
+        body, ctype = _multipart(
+            {"token": user.grant("receipt:ingest"), "dek_wrap_srv": user.dek_wrap, "year": "2025",
+             "month": month, "category": category},
+            "image", f"r{seed}.png", image, "image/png",
+        )
+        return {**user.auth(), "Content-Type": ctype}, body
+
+    if retry:
+        status, hdrs, data = await _with_retry(pool, "POST", "/api/v1/ingest/receipt", build)
+    else:
+        status, hdrs, data = await pool.request("POST", "/api/v1/ingest/receipt", *build())
+    if status == 200:
+        user.receipts.append(json.loads(data)["receipt_id"])
+    return status, hdrs, data
+
+
+async def decrypt(pool, user: VirtualUser, seed: int):
+    targets = random.sample(user.receipts, min(len(user.receipts), 3)) if user.receipts else []
+    body = json.dumps({"token": user.grant("receipt:decrypt"), "dek_wrap_srv": user.dek_wrap, "targets": targets})
+    return await pool.request("POST", "/api/v1/decrypt/process", _json(user.auth()), body.encode())
+
+
+async def list_receipts(pool, user: VirtualUser, seed: int):
+    return await pool.request("GET", "/api/v1/receipts", user.auth())
+
+
+async def analytics(pool, user: VirtualUser, seed: int):
+    return await pool.request("GET", f"/api/v1/analytics/spend?month=2025-{1 + seed % 12:02d}", user.auth())
+
+
+OPS = {"ingest": ingest, "decrypt": decrypt, "list": list_receipts, "analytics": analytics}
+
+
+async def refresh_access(pool, user: VirtualUser) -> bool:
+    status, _, data = await pool.request("POST", "/api/v1/auth/token/refresh", _json(),
+                                         json.dumps({"refresh": user.refresh}).encode())
+    if status != 200:
+        return False
+    tokens = json.loads(data)
+    user.access = tokens["access"]
+    user.refresh = tokens.get("refresh", user.refresh)
+    return True
+
+
+# ---- driver + report ---------------------------------------------------------
+
+class Stats:
+    def __init__(self):
+        self.lat = defaultdict(list)          # op -> [ms]
+        self.status = defaultdict(lambda: defaultdict(int))
+        self.server = defaultdict(lambda: defaultdict(list))  # op -> stage -> [ms]
+        self.skipped = 0
+
+    def record(self, op: str, ms: float, outcome: str, headers: dict | None = None):
+        self.lat[op].append(ms)
+        self.status[op][outcome] += 1
+        for part in (headers or {}).get("server-timing", "").split(","):
+            name, _, rest = part.strip().partition(";")
+            for attr in rest.split(";"):
+                k, _, v = attr.strip().partition("=")
+                if name and k == "dur":
+                    self.server[op][name].append(float(v))
+
+    def report(self, elapsed: float) -> dict:
+        def pct(xs, p):
+            return round(xs[min(len(xs) - 1, int(p / 100.0 * len(xs)))], 2)
+
+        ops = {}
+        for op, xs in sorted(self.lat.items()):
+            xs.sort()
+            codes = dict(self.status[op])
+            ops[op] = {
+                "requests": len(xs),
+                "rps": round(len(xs) / elapsed, 2),
+                "ok": sum(n for c, n in codes.items() if c.startswith("2")),
+                "throttled": codes.get("429", 0),
+                "shed": codes.get("503", 0),
+                "errors": {c: n for c, n in codes.items() if not c.startswith("2") and c not in ("429", "503")},
+                "latency_ms": {"p50": pct(xs, 50), "p90": pct(xs, 90), "p99": pct(xs, 99), "max": round(xs[-1], 2),
+                               "mean": round(statistics.fmean(xs), 2)},
+                "server_ms_mean": {k: round(statistics.fmean(v), 2) for k, v in sorted(self.server[op].items())},
+            }
+        total = sum(len(xs) for xs in self.lat.values())
+        return {"elapsed_s": round(elapsed, 2), "requests": total, "rps": round(total / elapsed, 2),
+                "skipped_at_max_inflight": self.skipped, "ops": ops}
+
+
+async def run(args) -> dict:
+    mix = {k: float(v) for k, v in (p.split("=") for p in args.mix.split(","))}
+    unknown = set(mix) - set(OPS)
+    if unknown:
+        raise SystemExit(f"unknown ops in --mix: {sorted(unknown)}")
+    pool = HttpPool(args.url, args.connections)
+    try:
+        status, _, data = await pool.request("GET", "/api/v1/crypto/server-public-key")
+        if status != 200:
+            raise SystemExit(f"server public key: {status} {data[:200]!r}")
+        pem = json.loads(data)["pem"].encode()
+
+        prefix = args.prefix or f"lg{uuid.uuid4().hex[:6]}"
+        users = [VirtualUser(f"{prefix}-{i}") for i in range(args.users)]
+        t0 = time.perf_counter()
+        sem = asyncio.Semaphore(args.connections)
+
+        async def _prov(i, u):
+            async with sem:
+                await provision(pool, u, args.password, pem, i)
+
+        await asyncio.gather(*(_prov(i, u) for i, u in enumerate(users)))
+        print(f"provisioned {len(users)} users in {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+
+        stats = Stats()
+        names, weights = list(mix), list(mix.values())
+        inflight = set()
+
+        async def one(op: str, seed: int):
+            user = random.choice(users)
+            start = time.perf_counter()
+            try:
+                status, hdrs, _ = await OPS[op](pool, user, seed)
+                if status == 401 and await refresh_access(pool, user):
+                    start = time.perf_counter()
+                    status, hdrs, _ = await OPS[op](pool, user, seed)
+                stats.record(op, (time.perf_counter() - start) * 1000.0, str(status), hdrs)
+            except Exception as e:
+                stats.record(op, (time.perf_counter() - start) * 1000.0, type(e).__name__)
+
+        start = time.perf_counter()
+        deadline = start + args.duration
+        next_at, seed = start, 1_000_000
+        while True:
+            next_at += random.expovariate(args.rate)
+            if next_at >= deadline:
+                break
+            await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+            if len(inflight) >= args.max_inflight:
+                stats.skipped += 1  # the server is not keeping up; don't let the backlog grow unbounded
+                continue
+            seed += 1
+            task = asyncio.create_task(one(random.choices(names, weights)[0], seed))
+            inflight.add(task)
+            task.add_done_callback(inflight.discard)
+        if inflight:
+            await asyncio.wait(inflight)
+        return {"url": args.url, "users": args.users, "target_rps": args.rate, "mix": mix,
+                **stats.report(time.perf_counter() - start)}
+    finally:
+        pool.close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--url", default=os.environ.get("BASE_URL", "http://127.0.0.1:8000"))
+    ap.add_argument("--users", type=int, default=10)
+    ap.add_argument("--rate", type=float, default=20.0, help="target requests/second (Poisson arrivals)")
+    ap.add_argument("--duration", type=float, default=30.0)
+    ap.add_argument("--mix", default=DEFAULT_MIX, help="op=weight,... over ingest, decrypt, list, analytics")
+    ap.add_argument("--connections", type=int, default=32, help="keep-alive connection pool size")
+    ap.add_argument("--max-inflight", type=int, default=512)
+    ap.add_argument("--password", default="loadgen-pass")
+    ap.add_argument("--prefix", default="", help="username prefix (reuse to skip re-registering users)")
+    ap.add_argument("--out", default="", help="also write the JSON report here")
+    args = ap.parse_args()
+
+    out = asyncio.run(run(args))
+    text = json.dumps(out, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
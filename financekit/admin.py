@@ -11,6 +11,9 @@ class ReceiptAdmin(admin.ModelAdmin):
     list_display = ("id", "merchant", "total", "currency", "created_at")
     search_fields = ("merchant", "raw_text")
     inlines = [ReceiptItemInline]
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).defer(*Receipt.CIPHERTEXT_FIELDS)
     
 @admin.register(AuditEvent)
 class AuditEventAdmin(admin.ModelAdmin):
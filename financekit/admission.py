@@ -0,0 +1,237 @@
+"""
+Admission control for expensive stages (OCR in ingest).
+
+A Limiter caps in-flight work at two levels:
+  - per process: <PREFIX>_MAX_INFLIGHT slots (threads / event-loop tasks);
+  - per host: <PREFIX>_MAX_INFLIGHT_HOST slots shared by every worker on the
+    machine, a Redis semaphore (sorted set of leases, one Lua call per try).
+    Leases expire after ADMISSION_LEASE_SECONDS so a killed worker cannot leak
+    slots. Without Redis (or while it is unreachable) only the process cap
+    applies.
+Callers that find no free slot wait in a bounded per-process queue
+(<PREFIX>_QUEUE_MAX waiters, at most <PREFIX>_QUEUE_TIMEOUT_MS each); beyond
+that they are shed at once with Overloaded (503 + Retry-After). With sync
+workers this is what keeps a burst of uploads from occupying every worker in
+Tesseract: the excess returns 503 in milliseconds and the workers stay free
+for list/analytics/decrypt/health.
+"""
+from __future__ import annotations
+import asyncio
+import socket
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+
+from django.conf import settings
+
+from .exceptions import Overloaded
+from .metrics import ADMISSION, ADMISSION_WAIT
+from .tracing import span
+
+POLL_SECONDS = 0.02
+REDIS_RETRY_SECONDS = 5.0
+
+# KEYS: semaphore zset. ARGV: limit, token, lease_ms. Returns 1 if a slot was taken.
+_ACQUIRE_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - tonumber(ARGV[3]))
+if redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[1]) then
+  redis.call('ZADD', KEYS[1], now, ARGV[2])
+  redis.call('PEXPIRE', KEYS[1], ARGV[3])
+  return 1
+end
+return 0
+"""
+
+
+class _HostSemaphore:
+    """Redis-backed counting semaphore for one host; fails open when Redis is down."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._url = None
+        self._client = None
+        self._script = None
+        self._down_until = 0.0
+
+    def key(self) -> str:
+        host = getattr(settings, "ADMISSION_HOST", "") or socket.gethostname()
+        return f"adm:{self.name}:{host}"
+
+    def _get(self):
+        url = getattr(settings, "REDIS_URL", None)
+        if not url or time.monotonic() < self._down_until:
+            return None
+        if self._script is None or self._url != url:
+            with self._lock:
+                if self._script is None or self._url != url:
+                    import redis as redislib
+                    self._client = redislib.from_url(url, socket_timeout=0.2, socket_connect_timeout=0.2)
+                    self._script, self._url = self._client.register_script(_ACQUIRE_LUA), url
+        return self._script
+
+    def acquire(self, token: str, limit: int) -> bool | None:
+        """True/False, or None when the host level is not enforced (no Redis)."""
+        script = self._get()
+        if script is None or limit <= 0:
+            return None
+        lease_ms = int(getattr(settings, "ADMISSION_LEASE_SECONDS", 120) * 1000)
+        try:
+            with span("redis", op="admission"):
+                return bool(script(keys=[self.key()], args=[limit, token, lease_ms]))
+        except Exception:
+            self._down_until = time.monotonic() + REDIS_RETRY_SECONDS
+            return None
+
+    def release(self, token: str) -> None:
+        if self._client is None or time.monotonic() < self._down_until:
+            return
+        try:
+            self._client.zrem(self.key(), token)
+        except Exception:
+            self._down_until = time.monotonic() + REDIS_RETRY_SECONDS  # the lease expires on its own
+
+    # Async variants use the event loop's redis.asyncio client (financekit.aio), so they never block it
+
+    async def aacquire(self, token: str, limit: int) -> bool | None:
+        from .aio import redis
+        client = redis() if time.monotonic() >= self._down_until else None
+        if client is None or limit <= 0:
+            return None
+        lease_ms = int(getattr(settings, "ADMISSION_LEASE_SECONDS", 120) * 1000)
+        try:
+            with span("redis", op="admission"):
+                return bool(await client.register_script(_ACQUIRE_LUA)(keys=[self.key()], args=[limit, token, lease_ms]))
+        except Exception:
+            self._down_until = time.monotonic() + REDIS_RETRY_SECONDS
+            return None
+
+    async def arelease(self, token: str) -> None:
+        from .aio import redis
+        client = redis() if time.monotonic() >= self._down_until else None
+        if client is None:
+            return
+        try:
+            await client.zrem(self.key(), token)
+        except Exception:
+            self._down_until = time.monotonic() + REDIS_RETRY_SECONDS
+
+
+class Limiter:
+    def __init__(self, name: str, prefix: str):
+        self.name = name
+        self.prefix = prefix
+        self.host = _HostSemaphore(name)
+        self._cond = threading.Condition()
+        self.active = 0
+        self.waiting = 0
+
+    def _setting(self, suffix: str, default):
+        return getattr(settings, f"{self.prefix}_{suffix}", default)
+
+    def _take_local(self) -> bool:
+        with self._cond:
+            if self.active >= max(1, self._setting("MAX_INFLIGHT", 2)):
+                return False
+            self.active += 1
+            return True
+
+    def _try(self, token: str) -> bool:
+        if not self._take_local():
+            return False
+        if self.host.acquire(token, self._setting("MAX_INFLIGHT_HOST", 0)) is False:
+            self._release_local()
+            return False
+        return True
+
+    async def _atry(self, token: str) -> bool:
+        if not self._take_local():
+            return False
+        if await self.host.aacquire(token, self._setting("MAX_INFLIGHT_HOST", 0)) is False:
+            self._release_local()
+            return False
+        return True
+
+    def _release_local(self) -> None:
+        with self._cond:
+            self.active -= 1
+            self._cond.notify()
+
+    def _release(self, token: str) -> None:
+        self.host.release(token)
+        self._release_local()
+
+    def _enqueue(self) -> None:
+        with self._cond:
+            if self.waiting >= self._setting("QUEUE_MAX", 4):
+                self._shed("shed_queue_full")
+            self.waiting += 1
+
+    def _dequeue(self) -> None:
+        with self._cond:
+            self.waiting -= 1
+
+    def _shed(self, outcome: str):
+        ADMISSION.inc(limiter=self.name, outcome=outcome)
+        raise Overloaded(wait=self._setting("RETRY_AFTER", 5))
+
+    def _admitted(self, t0: float | None) -> None:
+        ADMISSION.inc(limiter=self.name, outcome="admitted" if t0 is None else "queued")
+        ADMISSION_WAIT.observe(0.0 if t0 is None else time.monotonic() - t0, limiter=self.name)
+
+    @contextmanager
+    def admit(self):
+        """Hold one slot for the block; raises Overloaded when none frees up in time."""
+        token = uuid.uuid4().hex
+        if self._try(token):
+            self._admitted(None)
+        else:
+            self._enqueue()
+            t0 = time.monotonic()
+            deadline = t0 + self._setting("QUEUE_TIMEOUT_MS", 2000) / 1000.0
+            try:
+                with span("admission", limiter=self.name):
+                    while not self._try(token):
+                        left = deadline - time.monotonic()
+                        if left <= 0:
+                            self._shed("shed_timeout")
+                        with self._cond:  # woken by local releases; polls for host-level ones
+                            self._cond.wait(min(left, POLL_SECONDS))
+            finally:
+                self._dequeue()
+            self._admitted(t0)
+        try:
+            yield
+        finally:
+            self._release(token)
+
+    @asynccontextmanager
+    async def aadmit(self):
+        """admit() for async views: waits, and talks to Redis, on the event loop instead of blocking it."""
+        token = uuid.uuid4().hex
+        if await self._atry(token):
+            self._admitted(None)
+        else:
+            self._enqueue()
+            t0 = time.monotonic()
+            deadline = t0 + self._setting("QUEUE_TIMEOUT_MS", 2000) / 1000.0
+            try:
+                with span("admission", limiter=self.name):
+                    while not await self._atry(token):
+                        if time.monotonic() >= deadline:
+                            self._shed("shed_timeout")
+                        await asyncio.sleep(POLL_SECONDS)
+            finally:
+                self._dequeue()
+            self._admitted(t0)
+        try:
+            yield
+        finally:
+            await self.host.arelease(token)
+            self._release_local()
+
+
+OCR = Limiter("ocr", "OCR")
@@ -0,0 +1,73 @@
+"""
+Async helpers for the ASGI views (financekit.async_views).
+
+- run_cpu(): CPU-bound work (OCR, RSA/AES, JWT verify) on a bounded thread
+  pool, so the event loop never blocks and at most ASYNC_CPU_MAX_PENDING jobs
+  are queued per process (callers beyond that wait for a slot).
+- redis(): per-event-loop redis.asyncio client (None when REDIS_URL is unset).
+- aaudit(): audit() off the loop (the "sync" sink writes to the DB inline).
+"""
+from __future__ import annotations
+import asyncio
+import contextvars
+import functools
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .audit import audit
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+_per_loop: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict]" = weakref.WeakKeyDictionary()
+
+
+def _loop_state() -> dict:
+    loop = asyncio.get_running_loop()
+    state = _per_loop.get(loop)
+    if state is None:
+        state = _per_loop[loop] = {}
+    return state
+
+
+def executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, "ASYNC_CPU_WORKERS", 4),
+                    thread_name_prefix="fk-cpu",
+                )
+    return _executor
+
+
+async def run_cpu(fn, *args, **kwargs):
+    state = _loop_state()
+    sem = state.get("cpu_sem")
+    if sem is None:
+        sem = state["cpu_sem"] = asyncio.Semaphore(getattr(settings, "ASYNC_CPU_MAX_PENDING", 16))
+    # Run in a copy of the caller's context so tracing spans nest under the request
+    ctx = contextvars.copy_context()
+    async with sem:
+        return await asyncio.get_running_loop().run_in_executor(
+            executor(), functools.partial(ctx.run, fn, *args, **kwargs)
+        )
+
+
+def redis():
+    url = getattr(settings, "REDIS_URL", None)
+    if not url:
+        return None
+    state = _loop_state()
+    client = state.get("redis")
+    if client is None:
+        import redis.asyncio as aredis
+        client = state["redis"] = aredis.from_url(url, socket_timeout=1.0)
+    return client
+
+
+aaudit = sync_to_async(audit)
@@ -0,0 +1,207 @@
+from __future__ import annotations
+import datetime
+from decimal import Decimal
+from typing import Optional
+
+from django.db import connections
+from django.db.models import Case, Count, DateField, Sum, When
+from django.db.models.functions import Cast, TruncDate, TruncDay, TruncMonth, TruncWeek, TruncYear
+
+from .models import Receipt
+
+# date_str is best-effort OCR output; only trust it when it is a real calendar date.
+# Shape alone is not enough: casting "2025-02-30" raises in Python and aborts the
+# whole query on Postgres, so days-per-month and leap years are checked here too.
+ISO_DATE_RE = (
+    r"^(?:[1-9][0-9]{3}-(?:(?:0[13578]|1[02])-(?:0[1-9]|[12][0-9]|3[01])"
+    r"|(?:0[469]|11)-(?:0[1-9]|[12][0-9]|30)"
+    r"|02-(?:0[1-9]|1[0-9]|2[0-8]))"
+    r"|(?:[1-9][0-9](?:0[48]|[2468][048]|[13579][26])|(?:[2468][048]|[13579][26])00)-02-29)$"
+)
+
+GRANULARITIES = {
+    "day": TruncDay,
+    "week": TruncWeek,
+    "month": TruncMonth,
+    "year": TruncYear,
+}
+GROUP_BY_FIELDS = ("category", "merchant")
+MAX_BUCKETS = 1000
+
+
+def receipt_date_expr():
+    """SQL expression for a receipt's effective date: a valid ISO date_str, else created_at's date."""
+    return Case(
+        When(date_str__regex=ISO_DATE_RE, then=Cast("date_str", DateField())),
+        default=TruncDate("created_at"),
+        output_field=DateField(),
+    )
+
+
+def bucket_floor(d: datetime.date, granularity: str) -> datetime.date:
+    if granularity == "week":
+        return d - datetime.timedelta(days=d.weekday())  # ISO week, Monday start (matches date_trunc)
+    if granularity == "month":
+        return d.replace(day=1)
+    if granularity == "year":
+        return d.replace(month=1, day=1)
+    return d
+
+
+def bucket_next(d: datetime.date, granularity: str) -> datetime.date:
+    if granularity == "week":
+        return d + datetime.timedelta(days=7)
+    if granularity == "month":
+        return datetime.date(d.year + d.month // 12, d.month % 12 + 1, 1)
+    if granularity == "year":
+        return datetime.date(d.year + 1, 1, 1)
+    return d + datetime.timedelta(days=1)
+
+
+def bucket_range(start: datetime.date, end: datetime.date, granularity: str) -> list[datetime.date]:
+    out = []
+    cur = bucket_floor(start, granularity)
+    while cur <= end:
+        out.append(cur)
+        if len(out) > MAX_BUCKETS:
+            raise ValueError(f"range spans more than {MAX_BUCKETS} {granularity} buckets")
+        cur = bucket_next(cur, granularity)
+    return out
+
+
+def _as_date(v) -> datetime.date:
+    # Trunc of a date can surface as datetime on some backends
+    return v.date() if isinstance(v, datetime.datetime) else v
+
+
+def spend_series(
+    user,
+    start: datetime.date,
+    end: datetime.date,
+    granularity: str = "month",
+    group_by: Optional[str] = None,
+    category: Optional[str] = None,
+    top: int = 10,
+) -> dict:
+    """
+    Dense, columnar spend time-series for [start, end].
+    All buckets (and groups) come from a single GROUP BY over the truncated date;
+    empty buckets are zero-filled here.
+    """
+    buckets = bucket_range(start, end, granularity)
+    trunc = GRANULARITIES[granularity]
+
+    qs = (
+        Receipt.objects.filter(user=user)
+        .annotate(d=receipt_date_expr())
+        .filter(d__gte=start, d__lte=end)
+    )
+    if category:
+        qs = qs.filter(category__iexact=category)
+
+    group_fields = [group_by] if group_by else []
+    rows = (
+        qs.annotate(bucket=trunc("d", output_field=DateField()))
+          .values("bucket", *group_fields)
+          .annotate(total=Sum("total"), n=Count("id"))
+          .order_by()
+    )
+
+    index = {b: i for i, b in enumerate(buckets)}
+    totals = [Decimal("0")] * len(buckets)
+    counts = [0] * len(buckets)
+    per_group: dict[str, list[Decimal]] = {}
+    for row in rows:
+        i = index.get(_as_date(row["bucket"]))
+        if i is None:
+            continue
+        amt = row["total"] or Decimal("0")
+        totals[i] += amt
+        counts[i] += row["n"]
+        if group_by:
+            key = row.get(group_by) or ""
+            per_group.setdefault(key, [Decimal("0")] * len(buckets))[i] += amt
+
+    out = {
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "granularity": granularity,
+        "group_by": group_by,
+        "buckets": [b.isoformat() for b in buckets],
+        "total": [round(float(v), 2) for v in totals],
+        "count": counts,
+    }
+    if group_by:
+        ranked = sorted(per_group.items(), key=lambda kv: sum(kv[1]), reverse=True)
+        keep, rest = ranked[:top], ranked[top:]
+        if rest:
+            other = [sum(col) for col in zip(*(vals for _, vals in rest))]
+            keep.append(("(other)", other))
+        out["groups"] = [k for k, _ in keep]
+        out["series"] = [[round(float(v), 2) for v in vals] for _, vals in keep]
+    return out
+
+
+# ----- One-statement spend summary (total + by category + top merchants) -----
+
+_GROUPING_SETS_SQL = """
+WITH g AS (
+    SELECT s.category, s.merchant,
+           GROUPING(s.category) AS g_cat, GROUPING(s.merchant) AS g_merch,
+           SUM(s.total) AS total
+    FROM (%(inner)s) s
+    GROUP BY GROUPING SETS ((), (s.category), (s.merchant))
+)
+SELECT category, merchant, g_cat, g_merch, total FROM (
+    SELECT g.*, ROW_NUMBER() OVER (PARTITION BY g_cat, g_merch ORDER BY total DESC) AS rn
+    FROM g
+) ranked
+WHERE NOT (g_cat = 1 AND g_merch = 0) OR rn <= %s
+"""
+
+
+def _summary_grouping_sets(qs, top: int) -> tuple:
+    inner, params = qs.values("category", "merchant", "total").order_by().query.sql_with_params()
+    total = None
+    by_category, merchants = [], []
+    with connections[qs.db].cursor() as cur:
+        cur.execute(_GROUPING_SETS_SQL.replace("%(inner)s", inner), (*params, top))
+        for category, merchant, g_cat, g_merch, amt in cur.fetchall():
+            if g_cat and g_merch:
+                total = amt
+            elif g_merch:
+                by_category.append((category, amt))
+            else:
+                merchants.append((merchant, amt))
+    return total, by_category, merchants
+
+
+def _summary_portable(qs, top: int) -> tuple:
+    # One GROUP BY (category, merchant); the three rollups are folded in Python
+    cats: dict = {}
+    merchs: dict = {}
+    total = None
+    for row in qs.values("category", "merchant").annotate(total=Sum("total")).order_by():
+        amt = row["total"] or Decimal("0")
+        total = amt if total is None else total + amt
+        cats[row["category"]] = cats.get(row["category"], Decimal("0")) + amt
+        merchs[row["merchant"]] = merchs.get(row["merchant"], Decimal("0")) + amt
+    return total, list(cats.items()), list(merchs.items())
+
+
+def spend_summary(qs, top: int = 5) -> dict:
+    """
+    Overall total, per-category totals and top-N merchants for a filtered
+    Receipt queryset in a single statement (GROUPING SETS on Postgres).
+    """
+    if connections[qs.db].vendor == "postgresql":
+        total, by_category, merchants = _summary_grouping_sets(qs, top)
+    else:
+        total, by_category, merchants = _summary_portable(qs, top)
+    by_category.sort(key=lambda kv: kv[1] or 0, reverse=True)
+    merchants.sort(key=lambda kv: kv[1] or 0, reverse=True)
+    return {
+        "total": total or 0,
+        "by_category": by_category,
+        "top_merchants": merchants[:top],
+    }
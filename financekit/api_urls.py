@@ -7,15 +7,33 @@ from .views import (
     DevCreateEncryptedReceiptView,
     IngestReceiptView,
     AnalyticsSpendView,
+    AnalyticsSeriesView,
+    AnalyticsInsightsView,
     DevMintTokenView,          # NEW
     DevWrapDekView,            # NEW
     RegisterView,
     ReceiptListView,
     ReceiptDetailView,
+    ReceiptExportView,
+    ReceiptImageView,
+    RecurringChargeListView,
+    SyncReceiptsView,
+    AuditEventListView,
+    ProfileListView,
+    ProfileDownloadView,
     HealthView,
 )
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
+# ASGI deployments serve the I/O-bound endpoints from native async views
+if getattr(settings, "ASYNC_VIEWS", False):
+    from .async_views import (
+        AsyncAnalyticsSpendView as AnalyticsSpendView,
+        AsyncIngestReceiptView as IngestReceiptView,
+        AsyncProcessDecryptView as ProcessDecryptView,
+        AsyncReceiptListView as ReceiptListView,
+    )
+
 urlpatterns = [
     path("crypto/server-public-key", ServerPubKeyView.as_view()),
     path("device/register", DeviceRegisterView.as_view()),
@@ -23,8 +41,17 @@ urlpatterns = [
     path("dev/create-receipt", DevCreateEncryptedReceiptView.as_view()),  # existing dev helper
     path("ingest/receipt", IngestReceiptView.as_view()),
     path("analytics/spend", AnalyticsSpendView.as_view()),
+    path("analytics/spend/series", AnalyticsSeriesView.as_view()),
+    path("analytics/insights", AnalyticsInsightsView.as_view()),
     path("receipts", ReceiptListView.as_view()),
     path("receipts/<int:pk>", ReceiptDetailView.as_view()),
+    path("receipts/<int:pk>/image", ReceiptImageView.as_view()),
+    path("receipts/export", ReceiptExportView.as_view()),
+    path("recurring", RecurringChargeListView.as_view()),
+    path("sync/receipts", SyncReceiptsView.as_view()),
+    path("audit/events", AuditEventListView.as_view()),
+    path("profiles", ProfileListView.as_view()),
+    path("profiles/<str:key>", ProfileDownloadView.as_view()),
     path("health", HealthView.as_view()),
     # Auth endpoints
     path("auth/register", RegisterView.as_view()),
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class FinancekitConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'financekit'
+
+    def ready(self):
+        # Register model signal handlers (per-user data version bumps)
+        from . import signals  # noqa: F401
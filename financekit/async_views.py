@@ -0,0 +1,267 @@
+"""
+ASGI-native versions of the I/O-bound endpoints (enabled with ASYNC_VIEWS=1,
+the default under capstone_backend.asgi).
+
+DRF's authentication/permission/throttle pipeline is synchronous, so it runs in
+one sync_to_async hop; the handlers then await Django's async ORM and a
+redis.asyncio client, and push CPU-bound work (JWT verify, RSA unwrap,
+AES-GCM, OCR) to the bounded executor in financekit.aio. Behaviour, status
+codes and audit outcomes match the sync views in financekit.views.
+"""
+from __future__ import annotations
+import asyncio
+import base64
+import json
+import traceback
+from contextlib import nullcontext
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed, NotFound, ParseError, PermissionDenied, Throttled
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from rest_framework.views import APIView
+
+from .admission import OCR
+from .aio import aaudit, redis, run_cpu
+from .crypto_utils import aesgcm_decrypt, jwt_verify_eddsa, unwrap_dek_rsa_oaep
+from .exceptions import Overloaded
+from .image_archive import archive_upload
+from .metrics import DECRYPT_STAGE, INGEST_STAGE
+from .tracing import span
+from .models import DeviceKey, GrantJTI, Receipt
+from .response_cache import acached_response
+from .serializers import IngestReceiptSerializer, ProcessGrantSerializer, ReceiptSerializer
+from .throttling import hit_limit
+from .views import (
+    AnalyticsSpendView, IngestReceiptView, IngestStepFailed, ProcessDecryptView, ReceiptListView,
+    ingest_result, ocr_and_seal, persist_receipt,
+)
+
+
+class AsyncAPIView(APIView):
+    """APIView whose handlers are coroutines (initial() runs in a worker thread)."""
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            response = handler(request, *args, **kwargs)
+            if asyncio.iscoroutine(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+
+async def _consume_jti(request, jti: str, device_id: str) -> bool:
+    """Single-use check; False when the jti was already used."""
+    r = redis()
+    if r is not None:
+        with span("redis", op="jti"):
+            return bool(await r.set(name=f"grant:jti:{jti}", value="1", nx=True, ex=180))
+    if await GrantJTI.objects.filter(jti=jti).aexists():
+        return False
+    await GrantJTI.objects.acreate(jti=jti, user=request.user, device_id=device_id)
+    return True
+
+
+async def _release_jti(jti: str) -> None:
+    """views.release_grant for async views."""
+    r = redis()
+    if r is not None:
+        with span("redis", op="jti"):
+            await r.delete(f"grant:jti:{jti}")
+    else:
+        await GrantJTI.objects.filter(jti=jti).adelete()
+
+
+async def averify_grant(request, token: str, scope: str, endpoint: str, *, stage=None, on_invalid=None, **audit_kw):
+    """views.verify_grant for async views (on_invalid is awaited); returns (kid, jti)."""
+    from .exceptions import ReplayDetected
+
+    async def reject(outcome, exc, **kw):
+        if on_invalid is not None:
+            await on_invalid()
+        await aaudit(request, endpoint, outcome, **kw, **audit_kw)
+        raise exc
+
+    try:
+        kid = json.loads(base64.urlsafe_b64decode(token.split(".")[0] + "==")).get("kid")
+    except Exception:
+        await reject("invalid_header", ParseError("Invalid token header"))
+    try:
+        dev = await DeviceKey.objects.aget(user=request.user, device_id=kid, is_active=True)
+    except DeviceKey.DoesNotExist:
+        await reject("unknown_device", PermissionDenied("Unknown device"), device_id=kid)
+    try:
+        with (stage.time(stage="jwt_verify") if stage else nullcontext()), span("crypto", op="jwt_verify"):
+            payload = await run_cpu(jwt_verify_eddsa, token, dev.public_key_b64)
+    except Exception as e:
+        await reject("auth_failed", AuthenticationFailed(f"JWT verify failed: {e}"), device_id=kid)
+    jti = payload.get("jti")
+    if not jti:
+        await reject("missing_jti", ParseError("Missing jti"), device_id=kid)
+    if not await _consume_jti(request, jti, dev.device_id):
+        await aaudit(request, endpoint, "replay", device_id=kid, jti=jti, **audit_kw)
+        raise ReplayDetected()
+    if scope not in set(payload.get("scope") or []):
+        await aaudit(request, endpoint, "scope_denied", device_id=kid, jti=jti, **audit_kw)
+        raise PermissionDenied("Scope denied")
+    return kid, jti
+
+
+class AsyncProcessDecryptView(AsyncAPIView, ProcessDecryptView):
+    async def post(self, request):
+        async def _audit(outcome, extra=None, device_id=None, jti=None):
+            try:
+                targets = list(request.data.get("targets") or [])
+            except Exception:
+                targets = []
+            await aaudit(request, "decrypt/process", outcome, device_id=device_id, jti=jti, targets=targets, extra=extra)
+
+        async def manual_limit_or_increment():
+            ident = request.META.get("REMOTE_ADDR") or "anon"
+            if await sync_to_async(hit_limit)(f"rl:decrypt:ip:{ident}", limit=1, period=60):
+                await _audit("throttled")
+                raise Throttled(detail="Request was throttled.")
+
+        s = ProcessGrantSerializer(data=request.data)
+        s.is_valid(raise_exception=True)
+        token = s.validated_data["token"]
+        dek_wrap_srv = s.validated_data["dek_wrap_srv"]
+        targets = s.validated_data["targets"]
+
+        kid, jti = await averify_grant(request, token, "receipt:decrypt", "decrypt/process", stage=DECRYPT_STAGE,
+                                       on_invalid=manual_limit_or_increment, targets=targets)
+
+        try:
+            with DECRYPT_STAGE.time(stage="dek_unwrap"), span("crypto", op="dek_unwrap"):
+                dek = await run_cpu(unwrap_dek_rsa_oaep, dek_wrap_srv)
+        except Exception:
+            await _audit("unwrap_failed", device_id=kid, jti=jti)
+            raise ParseError("DEK unwrap failed")
+
+        with DECRYPT_STAGE.time(stage="db_fetch"):
+            receipts = [r async for r in Receipt.objects.filter(user=request.user, id__in=targets)]
+
+        def _decrypt_all():
+            return [
+                {"id": rcp.id, "plaintext_json": aesgcm_decrypt(
+                    key=dek, nonce=bytes(rcp.body_nonce), ct=rcp.ciphertext(),
+                    tag=bytes(rcp.body_tag), aad=b"receipt_v1",
+                ).decode("utf-8")}
+                for rcp in receipts
+            ]
+
+        try:
+            with DECRYPT_STAGE.time(stage="aes_decrypt"), span("crypto", op="aes_decrypt"):
+                results = await run_cpu(_decrypt_all)
+        finally:
+            # Best-effort zeroize
+            ba = bytearray(dek)
+            for i in range(len(ba)): ba[i] = 0
+
+        await _audit("success", device_id=kid, jti=jti)
+        return Response({"data": results, "processed_at": timezone.now().isoformat()})
+
+
+class AsyncIngestReceiptView(AsyncAPIView, IngestReceiptView):
+    async def post(self, request):
+        endpoint = "ingest/receipt"
+        s = IngestReceiptSerializer(data=request.data)
+        s.is_valid(raise_exception=True)
+        v = s.validated_data
+        token, dek_wrap_srv = v["token"], v["dek_wrap_srv"]
+
+        kid, jti = await averify_grant(request, token, "receipt:ingest", endpoint, stage=INGEST_STAGE)
+
+        with INGEST_STAGE.time(stage="read_image"):
+            img_bytes = v["image"].read()
+        if not img_bytes:
+            return Response({"detail": "empty image upload"}, status=400)
+
+        try:
+            async with OCR.aadmit():
+                parsed_obj, nonce, ct, tag = await run_cpu(ocr_and_seal, img_bytes, dek_wrap_srv)
+        except Overloaded:
+            await _release_jti(jti)
+            await aaudit(request, endpoint, "overloaded", device_id=kid, jti=jti)
+            raise
+        except IngestStepFailed as f:
+            if f.outcome == "ocr_deferred":
+                await _release_jti(jti)  # nothing was stored: the retry may reuse the grant
+            if f.outcome:
+                await aaudit(request, endpoint, f.outcome, device_id=kid, jti=jti)
+            return f.response
+
+        with INGEST_STAGE.time(stage="image_archive"), span("archive"):
+            image_info = await run_cpu(archive_upload, v["image"], dek_wrap_srv)
+
+        try:
+            # Several writes + on_commit hooks: one sync hop rather than many async ones
+            with INGEST_STAGE.time(stage="db_persist"):
+                rec = await sync_to_async(persist_receipt)(
+                    request.user, v["year"], v["month"], v["category"], parsed_obj, nonce, ct, tag, image=image_info
+                )
+        except Exception as e:
+            await aaudit(request, endpoint, "db_failed", device_id=kid, jti=jti)
+            return Response({"detail": f"DB insert failed: {e}", "trace": traceback.format_exc()}, status=500)
+
+        await aaudit(request, endpoint, "success", device_id=kid, jti=jti, targets=[rec.id])
+        return Response(ingest_result(rec, parsed_obj), status=200)
+
+
+class AsyncReceiptListView(AsyncAPIView, ReceiptListView):
+    async def get(self, request, *args, **kwargs):
+        return await acached_response(request, "receipts", self._alist)
+
+    async def _alist(self) -> dict:
+        # Same payload as PageNumberPagination, built from async queries
+        request = self.request
+        qs = self.get_queryset()
+        size = self.paginator.get_page_size(request) or getattr(settings, "REST_FRAMEWORK", {}).get("PAGE_SIZE", 20)
+        try:
+            page = int(request.query_params.get("page") or 1)
+        except ValueError:
+            raise NotFound("Invalid page.")
+        count = await qs.acount()
+        pages = max(1, -(-count // size))
+        if page < 1 or page > pages:
+            raise NotFound("Invalid page.")
+        offset = (page - 1) * size
+        rows = [r async for r in qs[offset:offset + size]]  # items prefetched by get_queryset()
+        url = request.build_absolute_uri()
+        nxt = replace_query_param(url, "page", page + 1) if page < pages else None
+        prev = None
+        if page > 1:
+            prev = remove_query_param(url, "page") if page == 2 else replace_query_param(url, "page", page - 1)
+        return {
+            "count": count,
+            "next": nxt,
+            "previous": prev,
+            "results": ReceiptSerializer(rows, many=True).data,
+        }
+
+
+class AsyncAnalyticsSpendView(AsyncAPIView, AnalyticsSpendView):
+    async def get(self, request):
+        return await acached_response(request, "analytics:spend", lambda: self._acompute(request))
+
+    async def _acompute(self, request) -> dict:
+        from .analytics import spend_summary
+        qs, year_val, month_val, category = self._filtered(request)
+        # spend_summary may run raw SQL (GROUPING SETS on Postgres): one sync hop
+        summary = await sync_to_async(spend_summary)(qs, top=5)
+        rows = [r async for r in qs.only("date_str", "created_at", "total")]
+        return self._payload(summary, rows, year_val, month_val, category)
@@ -0,0 +1,232 @@
+"""
+Batched audit writer.
+
+Request paths call emit(); events are queued (in process memory or a Redis
+list shared by all workers) and written with bulk_create when the batch size
+or flush interval is reached. The queue is bounded: once full, new events are
+dropped and counted instead of adding write load to the primary DB.
+
+Modes (settings.AUDIT_SINK):
+  sync   - write each event immediately (previous behaviour; dev/test default)
+  memory - per-process bounded queue + background flusher thread
+  redis  - shared Redis list (falls back to memory when Redis is unreachable)
+"""
+from __future__ import annotations
+import atexit
+import json
+import threading
+from collections import deque
+from datetime import datetime
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+_PUSH_LUA = """
+if redis.call('LLEN', KEYS[1]) >= tonumber(ARGV[2]) then
+  redis.call('INCR', KEYS[2])
+  return -1
+end
+return redis.call('RPUSH', KEYS[1], ARGV[1])
+"""
+
+
+class AuditSink:
+    def __init__(self, mode: str = "memory", batch_size: int = 200, flush_interval: float = 2.0,
+                 max_queue: int = 10000, redis_url: str | None = None, key: str = "audit:queue"):
+        self.mode = mode
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_queue = max(1, max_queue)
+        self.key = key
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self._q: deque = deque()
+        self._lock = threading.Lock()        # guards _q and counters
+        self._flush_lock = threading.Lock()  # one flusher at a time
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._redis = None
+        self._push = None
+        if mode == "redis" and redis_url:
+            try:
+                import redis as redislib
+                self._redis = redislib.from_url(redis_url, socket_timeout=0.5)
+                self._push = self._redis.register_script(_PUSH_LUA)
+            except Exception:
+                self._redis = None
+
+    # ----- producer side -----
+
+    def emit(self, **event) -> None:
+        event.setdefault("created_at", timezone.now())
+        if self.mode == "sync":
+            self._write([event])
+            return
+        depth = self._push_redis(event) if self._redis is not None else None
+        if depth is None:
+            depth = self._push_local(event)
+        if depth >= self.batch_size:
+            self.flush(block=False)
+        self._ensure_thread()
+
+    def _push_local(self, event: dict) -> int:
+        with self._lock:
+            if len(self._q) >= self.max_queue:
+                self.dropped += 1
+                return 0
+            self._q.append(event)
+            return len(self._q)
+
+    def _push_redis(self, event: dict) -> int | None:
+        payload = dict(event, created_at=event["created_at"].isoformat())
+        try:
+            n = self._push(keys=[self.key, f"{self.key}:dropped"],
+                           args=[json.dumps(payload, separators=(",", ":")), self.max_queue])
+        except Exception:
+            return None  # Redis unavailable: queue locally instead
+        return 0 if n < 0 else int(n)
+
+    # ----- consumer side -----
+
+    def _drain_local(self) -> list[dict]:
+        with self._lock:
+            n = min(len(self._q), self.batch_size)
+            return [self._q.popleft() for _ in range(n)]
+
+    def _drain_redis(self) -> list[dict]:
+        if self._redis is None:
+            return []
+        try:
+            raw = self._redis.lpop(self.key, self.batch_size) or []
+        except Exception:
+            return []
+        out = []
+        for item in raw:
+            try:
+                ev = json.loads(item)
+                ev["created_at"] = datetime.fromisoformat(ev["created_at"])
+                out.append(ev)
+            except Exception:
+                self.failed += 1
+        return out
+
+    def flush(self, block: bool = True) -> int:
+        """Write everything queued (batch by batch). Returns events written."""
+        if not self._flush_lock.acquire(blocking=block):
+            return 0  # another thread is already flushing
+        written = 0
+        try:
+            for drain in (self._drain_local, self._drain_redis):
+                while True:
+                    batch = drain()
+                    if not batch:
+                        break
+                    written += self._write(batch)
+        finally:
+            self._flush_lock.release()
+        return written
+
+    def _write(self, events: list[dict]) -> int:
+        from .models import AuditEvent
+        try:
+            AuditEvent.objects.bulk_create([AuditEvent(**ev) for ev in events])
+        except Exception:
+            # Never break a request (or the flusher) on audit failures
+            with self._lock:
+                self.failed += len(events)
+            return 0
+        with self._lock:
+            self.written += len(events)
+        return len(events)
+
+    # ----- lifecycle -----
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None or self.flush_interval <= 0:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="audit-flusher", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            close_old_connections()
+            self.flush()
+        close_old_connections()
+
+    def close(self) -> None:
+        """Stop the flusher and write whatever is still queued (worker shutdown)."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.flush()
+
+    def stats(self) -> dict:
+        out = {
+            "mode": self.mode,
+            "queued": len(self._q),
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+        if self._redis is not None:
+            try:
+                out["queued"] += int(self._redis.llen(self.key))
+                out["dropped"] += int(self._redis.get(f"{self.key}:dropped") or 0)
+            except Exception:
+                pass
+        return out
+
+
+_sink: AuditSink | None = None
+_sink_lock = threading.Lock()
+
+
+def get_sink() -> AuditSink:
+    global _sink
+    if _sink is None:
+        with _sink_lock:
+            if _sink is None:
+                _sink = AuditSink(
+                    mode=getattr(settings, "AUDIT_SINK", "sync"),
+                    batch_size=getattr(settings, "AUDIT_BATCH_SIZE", 200),
+                    flush_interval=getattr(settings, "AUDIT_FLUSH_INTERVAL", 2.0),
+                    max_queue=getattr(settings, "AUDIT_MAX_QUEUE", 10000),
+                    redis_url=getattr(settings, "REDIS_URL", None),
+                )
+                atexit.register(_sink.close)
+    return _sink
+
+
+def shutdown() -> None:
+    """Flush on worker exit (wired into gunicorn.conf.py's worker_exit)."""
+    if _sink is not None:
+        _sink.close()
+
+
+def audit(request, endpoint: str, outcome: str, *, device_id: str | None = None,
+          jti: str | None = None, targets=None, extra: dict | None = None) -> None:
+    try:
+        from .metrics import GRANT_OUTCOMES
+        GRANT_OUTCOMES.inc(endpoint=endpoint, outcome=outcome)
+    except Exception:
+        pass
+    try:
+        user = getattr(request, "user", None)
+        get_sink().emit(
+            user_id=user.pk if user is not None and user.is_authenticated else None,
+            device_id=device_id or "",
+            jti=jti or "",
+            endpoint=endpoint,
+            outcome=outcome,
+            targets=list(targets or []),
+            ip=request.META.get("REMOTE_ADDR"),
+            request_id=getattr(request, "request_id", ""),
+            extra=extra or {},
+        )
+    except Exception:
+        # Never break request due to audit failures
+        pass
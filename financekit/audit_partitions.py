@@ -0,0 +1,394 @@
+"""
+Time-partitioned AuditEvent storage.
+
+Postgres: financekit_auditevent becomes a RANGE(created_at) partitioned table
+with one partition per month (financekit_auditevent_pYYYYMM). Retention detaches
+and drops whole partitions; time-bounded queries are pruned to the relevant months.
+A DEFAULT partition keeps audit inserts working if maintenance falls behind; the
+command warns when it holds rows and moves them once their month is created.
+
+SQLite: rolling tables. The live financekit_auditevent table only keeps the
+current month; rotate() moves each completed month into its own archive table,
+so the live table (and its indexes) stays small. Retention drops archive tables.
+"""
+from __future__ import annotations
+import base64
+import datetime
+import re
+from typing import Optional
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import AuditEvent
+
+TABLE = AuditEvent._meta.db_table
+PART_RE = re.compile(rf"^{TABLE}_p(\d{{4}})(\d{{2}})$")
+LEGACY = f"{TABLE}_legacy"
+DEFAULT = f"{TABLE}_default"
+_COLUMNS = [f.column for f in AuditEvent._meta.concrete_fields]
+
+
+def _month_start(d: datetime.date) -> datetime.date:
+    return datetime.date(d.year, d.month, 1)
+
+
+def _add_months(d: datetime.date, n: int) -> datetime.date:
+    m = d.year * 12 + (d.month - 1) + n
+    return datetime.date(m // 12, m % 12 + 1, 1)
+
+
+def _aware(d: datetime.date) -> datetime.datetime:
+    return datetime.datetime(d.year, d.month, d.day, tzinfo=datetime.timezone.utc)
+
+
+def partition_name(month: datetime.date) -> str:
+    return f"{TABLE}_p{month.year:04d}{month.month:02d}"
+
+
+def _list_tables() -> list[str]:
+    if connection.vendor == "postgresql":
+        # introspection.table_names() leaves out partitions
+        with connection.cursor() as cur:
+            cur.execute(
+                "SELECT relname FROM pg_class WHERE relkind IN ('r', 'p') "
+                "AND relnamespace = current_schema()::regnamespace"
+            )
+            return [r[0] for r in cur.fetchall()]
+    return connection.introspection.table_names()
+
+
+def _months_of(tables: list[str]) -> list[tuple[datetime.date, str]]:
+    out = []
+    for t in tables:
+        m = PART_RE.match(t)
+        if m:
+            out.append((datetime.date(int(m.group(1)), int(m.group(2)), 1), t))
+    return sorted(out)
+
+
+# ----- Postgres --------------------------------------------------------------
+
+def pg_is_partitioned() -> bool:
+    with connection.cursor() as cur:
+        cur.execute(
+            "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = %s",
+            [TABLE],
+        )
+        return cur.fetchone() is not None
+
+
+def _pg_legacy_end() -> Optional[datetime.date]:
+    """Upper bound of the attached legacy partition (None once it is gone)."""
+    with connection.cursor() as cur:
+        cur.execute(
+            "SELECT pg_get_expr(c.relpartbound, c.oid) FROM pg_class c WHERE c.relname = %s AND c.relispartition",
+            [LEGACY],
+        )
+        row = cur.fetchone()
+    m = re.search(r"TO \('(\d{4})-(\d{2})-01", row[0]) if row else None
+    return datetime.date(int(m.group(1)), int(m.group(2)), 1) if m else None
+
+
+# Parent indexes (name suffix, DDL after ON <table>). ATTACH adopts an equivalent index
+# on the legacy table instead of building one: AuditEvent.Meta.indexes already cover the
+# btree ones, _pg_prepare() builds the brin one concurrently beforehand.
+_PG_INDEXES = (
+    ("_user_created", "(user_id, created_at)"),
+    ("_endpoint_created", "(endpoint, created_at)"),
+    ("_created_brin", "USING brin (created_at)"),
+)
+
+
+def _pg_index_concurrently(cur, name: str, ddl: str, unique: bool = False) -> None:
+    q = connection.ops.quote_name
+    cur.execute("SELECT i.indisvalid FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid WHERE c.relname = %s", [name])
+    row = cur.fetchone()
+    if row and row[0]:
+        return
+    if row:  # left INVALID by an interrupted run
+        cur.execute(f"DROP INDEX CONCURRENTLY {q(name)}")
+    cur.execute(f"CREATE {'UNIQUE ' if unique else ''}INDEX CONCURRENTLY {q(name)} ON {q(TABLE)} {ddl}")
+
+
+def _pg_prepare(boundary: str) -> None:
+    """
+    The slow part of pg_convert, run while audit writes continue: the range CHECK
+    (added NOT VALID, then validated under a lock that does not block inserts) and
+    the legacy partition's indexes, built CONCURRENTLY. Must run outside a transaction.
+    """
+    q = connection.ops.quote_name
+    with connection.cursor() as cur:
+        cur.execute(f"ALTER TABLE {q(TABLE)} DROP CONSTRAINT IF EXISTS {q(LEGACY + '_range')}")
+        cur.execute(
+            f"ALTER TABLE {q(TABLE)} ADD CONSTRAINT {q(LEGACY + '_range')} CHECK (created_at < %s) NOT VALID", [boundary]
+        )
+        cur.execute(f"ALTER TABLE {q(TABLE)} VALIDATE CONSTRAINT {q(LEGACY + '_range')}")
+        # Becomes the legacy partition's primary key: it must match the parent's (id, created_at)
+        _pg_index_concurrently(cur, LEGACY + "_pk", "(id, created_at)", unique=True)
+        _pg_index_concurrently(cur, LEGACY + "_created_brin", "USING brin (created_at)")
+
+
+def pg_convert(months_ahead: int = 2) -> bool:
+    """
+    Convert the plain table into a partitioned one without copying rows: the old
+    table is attached as a single 'legacy' partition covering everything before
+    next month (so the current month's rows, and inserts racing the conversion,
+    stay valid), monthly partitions are created from next month onward, and a
+    DEFAULT partition catches anything no monthly partition covers.
+    _pg_prepare() does the scans and index builds beforehand; the swap itself is
+    one short transaction under ACCESS EXCLUSIVE (audit inserts wait on it) that
+    only touches the catalog: ATTACH trusts the validated CHECK and adopts the
+    pre-built indexes, and the old (id) primary key is replaced by the pre-built
+    unique (id, created_at) index.
+    """
+    if pg_is_partitioned():
+        return False
+    # Inserts must stay below the boundary until the swap: leave at least a day of slack
+    boundary = _add_months(_month_start((timezone.now() + datetime.timedelta(days=1)).date()), 1)
+    b = _aware(boundary).isoformat()
+    _pg_prepare(b)
+    q = connection.ops.quote_name
+    with transaction.atomic(), connection.cursor() as cur:
+        cur.execute(f"LOCK TABLE {q(TABLE)} IN ACCESS EXCLUSIVE MODE")
+        cur.execute("SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p'", [TABLE])
+        old_pk = cur.fetchone()
+        if old_pk:
+            cur.execute(f"ALTER TABLE {q(TABLE)} DROP CONSTRAINT {q(old_pk[0])}")
+        cur.execute(f"ALTER TABLE {q(TABLE)} ADD CONSTRAINT {q(LEGACY + '_pkey')} PRIMARY KEY USING INDEX {q(LEGACY + '_pk')}")
+        cur.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {q(TABLE)}")
+        next_id = cur.fetchone()[0]
+        cur.execute(f"ALTER TABLE {q(TABLE)} RENAME TO {q(LEGACY)}")
+        cur.execute(f"ALTER TABLE {q(LEGACY)} ALTER COLUMN id DROP IDENTITY IF EXISTS")
+        cur.execute(f"ALTER TABLE {q(LEGACY)} ALTER COLUMN id DROP DEFAULT")
+        cur.execute(
+            f"CREATE TABLE {q(TABLE)} (LIKE {q(LEGACY)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+            f"PARTITION BY RANGE (created_at)"
+        )
+        cur.execute(f"ALTER TABLE {q(TABLE)} DROP CONSTRAINT IF EXISTS {q(LEGACY + '_range')}")
+        cur.execute(f"ALTER TABLE {q(TABLE)} ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY (START WITH {int(next_id)})")
+        # Partition key must be part of the primary key; per-partition indexes stay small.
+        cur.execute(f"ALTER TABLE {q(TABLE)} ADD PRIMARY KEY (id, created_at)")
+        for suffix, ddl in _PG_INDEXES:
+            cur.execute(f"CREATE INDEX {q(TABLE + suffix)} ON {q(TABLE)} {ddl}")
+        cur.execute(
+            f"ALTER TABLE {q(TABLE)} ADD CONSTRAINT {q(TABLE + '_user_fk')} FOREIGN KEY (user_id) "
+            f"REFERENCES auth_user (id) DEFERRABLE INITIALLY DEFERRED"
+        )
+        cur.execute(f"ALTER TABLE {q(TABLE)} ATTACH PARTITION {q(LEGACY)} FOR VALUES FROM (MINVALUE) TO (%s)", [b])
+    pg_ensure(months_ahead)
+    return True
+
+
+def pg_default_rows() -> int:
+    """Rows in the DEFAULT partition: inserted for a month that had no partition yet."""
+    if DEFAULT not in _list_tables():
+        return 0
+    with connection.cursor() as cur:
+        cur.execute(f"SELECT COUNT(*) FROM {connection.ops.quote_name(DEFAULT)}")
+        return cur.fetchone()[0]
+
+
+def pg_ensure(months_ahead: int = 2) -> list[str]:
+    """
+    Create monthly partitions through months_ahead. Rows that already landed in the
+    DEFAULT partition for a new month are moved into it: the default is detached
+    for that (short) transaction, since Postgres refuses a new partition whose range
+    overlaps rows in the default.
+    """
+    created = []
+    start = _month_start(timezone.now().date())
+    existing = set(_list_tables())
+    legacy_end = _pg_legacy_end() if LEGACY in existing else None
+    q = connection.ops.quote_name
+    cols = ", ".join(q(c) for c in _COLUMNS)
+    if DEFAULT not in existing:  # also added to tables converted before it existed
+        with connection.cursor() as cur:
+            cur.execute(f"CREATE TABLE IF NOT EXISTS {q(DEFAULT)} PARTITION OF {q(TABLE)} DEFAULT")
+    for i in range(months_ahead + 1):
+        lo = _add_months(start, i)
+        name = partition_name(lo)
+        if name in existing or (legacy_end and lo < legacy_end):
+            continue
+        bounds = [_aware(lo).isoformat(), _aware(_add_months(lo, 1)).isoformat()]
+        with transaction.atomic(), connection.cursor() as cur:
+            cur.execute(f"SELECT EXISTS (SELECT 1 FROM {q(DEFAULT)} WHERE created_at >= %s AND created_at < %s)", bounds)
+            stray = cur.fetchone()[0]
+            if stray:
+                cur.execute(f"ALTER TABLE {q(TABLE)} DETACH PARTITION {q(DEFAULT)}")
+            cur.execute(f"CREATE TABLE {q(name)} PARTITION OF {q(TABLE)} FOR VALUES FROM (%s) TO (%s)", bounds)
+            if stray:
+                cur.execute(
+                    f"INSERT INTO {q(name)} ({cols}) SELECT {cols} FROM {q(DEFAULT)} "
+                    f"WHERE created_at >= %s AND created_at < %s", bounds,
+                )
+                cur.execute(f"DELETE FROM {q(DEFAULT)} WHERE created_at >= %s AND created_at < %s", bounds)
+                cur.execute(f"ALTER TABLE {q(TABLE)} ATTACH PARTITION {q(DEFAULT)} DEFAULT")
+        created.append(name)
+    return created
+
+
+def pg_drop_expired(retention_months: int) -> list[str]:
+    cutoff = _add_months(_month_start(timezone.now().date()), -retention_months)
+    q = connection.ops.quote_name
+    dropped = []
+    with connection.cursor() as cur:
+        for month, name in _months_of(_list_tables()):
+            if _add_months(month, 1) <= cutoff:
+                cur.execute(f"ALTER TABLE {q(TABLE)} DETACH PARTITION {q(name)}")
+                cur.execute(f"DROP TABLE {q(name)}")
+                dropped.append(name)
+        if LEGACY in _list_tables():
+            # Pre-partitioning rows expire row-wise; drop the partition once it is empty
+            cur.execute(f"DELETE FROM {q(LEGACY)} WHERE created_at < %s", [_aware(cutoff).isoformat()])
+            cur.execute(f"SELECT EXISTS (SELECT 1 FROM {q(LEGACY)})")
+            if not cur.fetchone()[0]:
+                cur.execute(f"ALTER TABLE {q(TABLE)} DETACH PARTITION {q(LEGACY)}")
+                cur.execute(f"DROP TABLE {q(LEGACY)}")
+                dropped.append(LEGACY)
+    return dropped
+
+
+# ----- SQLite rolling tables -------------------------------------------------
+
+
+def sqlite_rotate() -> list[str]:
+    """Move every completed month out of the live table into its archive table."""
+    q = connection.ops.quote_name
+    current = _month_start(timezone.now().date())
+    oldest = AuditEvent.objects.order_by("created_at").values_list("created_at", flat=True).first()
+    moved = []
+    if oldest is None:
+        return moved
+    month = _month_start(oldest.date())
+    cols = ", ".join(q(c) for c in _COLUMNS)
+    while month < current:
+        lo, hi = _aware(month), _aware(_add_months(month, 1))
+        rows = AuditEvent.objects.filter(created_at__gte=lo, created_at__lt=hi)
+        if rows.exists():
+            name = partition_name(month)
+            select_sql, params = rows.values(*[f.attname for f in AuditEvent._meta.concrete_fields]).query.sql_with_params()
+            with transaction.atomic(), connection.cursor() as cur:
+                cur.execute(f"CREATE TABLE IF NOT EXISTS {q(name)} AS SELECT {cols} FROM {q(TABLE)} WHERE 0")
+                cur.execute(f"CREATE INDEX IF NOT EXISTS {q(name + '_created')} ON {q(name)} (created_at, id)")
+                cur.execute(f"INSERT INTO {q(name)} ({cols}) {select_sql}", params)
+                rows.delete()
+            moved.append(name)
+        month = _add_months(month, 1)
+    return moved
+
+
+def sqlite_drop_expired(retention_months: int) -> list[str]:
+    cutoff = _add_months(_month_start(timezone.now().date()), -retention_months)
+    q = connection.ops.quote_name
+    dropped = []
+    with connection.cursor() as cur:
+        for month, name in _months_of(_list_tables()):
+            if _add_months(month, 1) <= cutoff:
+                cur.execute(f"DROP TABLE {q(name)}")
+                dropped.append(name)
+    return dropped
+
+
+# ----- Maintenance entrypoint ------------------------------------------------
+
+def maintain(retention_months: int, months_ahead: int = 2, convert: bool = False) -> dict:
+    if connection.vendor == "postgresql":
+        converted = pg_convert(months_ahead) if convert else False
+        if not pg_is_partitioned():
+            return {"converted": False, "created": [], "dropped": [], "partitioned": False, "default_rows": 0}
+        return {
+            "converted": converted,
+            "created": pg_ensure(months_ahead),
+            "dropped": pg_drop_expired(retention_months),
+            "partitioned": True,
+            "default_rows": pg_default_rows(),
+        }
+    return {
+        "converted": False,
+        "created": sqlite_rotate(),
+        "dropped": sqlite_drop_expired(retention_months),
+        "partitioned": True,
+        "default_rows": 0,
+    }
+
+
+# ----- Keyset-paginated query ------------------------------------------------
+
+def encode_cursor(ev: AuditEvent) -> str:
+    raw = f"{ev.created_at.isoformat()}|{ev.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime.datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        ts, pk = raw.rsplit("|", 1)
+        return datetime.datetime.fromisoformat(ts), int(pk)
+    except Exception:
+        raise ValueError("invalid cursor")
+
+
+def _archive_query(table: str, filters: dict, after: Optional[tuple], limit: int):
+    q = connection.ops.quote_name
+    adapt = connection.ops.adapt_datetimefield_value
+    where, params = [], []
+    for col, key in (("user_id", "user_id"), ("endpoint", "endpoint"), ("outcome", "outcome")):
+        if filters.get(key) is not None:
+            where.append(f"{col} = %s")
+            params.append(filters[key])
+    if filters.get("start"):
+        where.append("created_at >= %s")
+        params.append(adapt(filters["start"]))
+    if filters.get("end"):
+        where.append("created_at < %s")
+        params.append(adapt(filters["end"]))
+    if after:
+        where.append("(created_at < %s OR (created_at = %s AND id < %s))")
+        params += [adapt(after[0]), adapt(after[0]), after[1]]
+    sql = f"SELECT {', '.join(q(c) for c in _COLUMNS)} FROM {q(table)}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY created_at DESC, id DESC LIMIT {int(limit)}"
+    return list(AuditEvent.objects.raw(sql, params))
+
+
+def query_events(user_id=None, endpoint=None, outcome=None, start=None, end=None,
+                 cursor: Optional[str] = None, limit: int = 100) -> tuple[list[AuditEvent], Optional[str]]:
+    """
+    Newest-first audit events, keyset-paginated on (created_at, id).
+    [start, end) bounds let Postgres prune to the matching monthly partitions;
+    on SQLite only archive tables overlapping the range are read.
+    """
+    after = decode_cursor(cursor) if cursor else None
+    filters = {"user_id": user_id, "endpoint": endpoint, "outcome": outcome, "start": start, "end": end}
+
+    qs = AuditEvent.objects.all()
+    if user_id is not None:
+        qs = qs.filter(user_id=user_id)
+    if endpoint:
+        qs = qs.filter(endpoint=endpoint)
+    if outcome:
+        qs = qs.filter(outcome=outcome)
+    if start:
+        qs = qs.filter(created_at__gte=start)
+    if end:
+        qs = qs.filter(created_at__lt=end)
+    if after:
+        from django.db.models import Q
+        qs = qs.filter(Q(created_at__lt=after[0]) | Q(created_at=after[0], id__lt=after[1]))
+    rows = list(qs.order_by("-created_at", "-id")[: limit + 1])
+
+    if connection.vendor != "postgresql" and len(rows) <= limit:
+        for month, table in reversed(_months_of(_list_tables())):
+            if end and _aware(month) >= end:
+                continue
+            if start and _aware(_add_months(month, 1)) <= start:
+                break
+            rows += _archive_query(table, filters, after, limit + 1 - len(rows))
+            if len(rows) > limit:
+                break
+
+    page = rows[:limit]
+    next_cursor = encode_cursor(page[-1]) if len(rows) > limit else None
+    return page, next_cursor
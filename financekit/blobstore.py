@@ -0,0 +1,271 @@
+"""
+Content-addressed storage for large receipt ciphertexts (optional, BLOB_BACKEND).
+
+Ciphertexts above BLOB_INLINE_MAX_BYTES are written here at ingest (or moved by
+`manage.py migrate_blobs`) and the Receipt row keeps only body_ref
+("sha256:<hex>"), so heap/TOAST pages and SELECT * stay small.
+
+- LocalBlobStore: files under BLOB_LOCAL_ROOT/ab/cd/<hex>, written atomically
+  (temp file + rename) and read through mmap.
+- S3BlobStore: same interface on any S3-compatible service (boto3; set
+  BLOB_S3_ENDPOINT_URL for MinIO etc.). LocalBlobStore is its local stand-in.
+Blobs are immutable; identical content shares one object, so deletes check
+that no other row still references the blob.
+"""
+from __future__ import annotations
+import hashlib
+import mmap
+import os
+import tempfile
+import threading
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+PREFIX = "sha256:"
+
+
+def ref_for(data) -> str:
+    return PREFIX + hashlib.sha256(data).hexdigest()
+
+
+def _digest(ref: str) -> str:
+    if not ref.startswith(PREFIX) or len(ref) != len(PREFIX) + 64:
+        raise ValueError(f"invalid blob ref: {ref!r}")
+    return ref[len(PREFIX):]
+
+
+def _shard(digest: str) -> str:
+    return f"{digest[:2]}/{digest[2:4]}/{digest}"
+
+
+class BlobStore:
+    """put() returns a ref; get() returns a bytes-like object. The *_stream/open
+    variants move data in bounded chunks for large objects (archived images)."""
+
+    def put(self, data) -> str:
+        raise NotImplementedError
+
+    def put_stream(self, chunks) -> tuple[str, int]:
+        """Store an iterable of byte chunks; returns (ref, size)."""
+        raise NotImplementedError
+
+    def get(self, ref: str):
+        raise NotImplementedError
+
+    def open(self, ref: str):
+        """Binary file-like object for reading the blob incrementally."""
+        raise NotImplementedError
+
+    def exists(self, ref: str) -> bool:
+        raise NotImplementedError
+
+    def delete(self, ref: str) -> None:
+        raise NotImplementedError
+
+
+class LocalBlobStore(BlobStore):
+    def __init__(self, root):
+        self.root = str(root)
+
+    def path(self, ref: str) -> str:
+        return os.path.join(self.root, *_shard(_digest(ref)).split("/"))
+
+    def put(self, data) -> str:
+        ref = ref_for(data)
+        path = self.path(ref)
+        if os.path.exists(path):
+            return ref
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)  # atomic: readers never see a partial blob
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+        return ref
+
+    def put_stream(self, chunks) -> tuple[str, int]:
+        # The name is only known once hashed: spool to a temp file in the root, then rename
+        os.makedirs(self.root, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix=".tmp-")
+        h, size = hashlib.sha256(), 0
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in chunks:
+                    h.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+            ref = PREFIX + h.hexdigest()
+            path = self.path(ref)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+        return ref, size
+
+    def open(self, ref: str):
+        return open(self.path(ref), "rb")
+
+    def get(self, ref: str):
+        """Read-only memoryview over an mmap of the blob (no copy into the Python heap)."""
+        with open(self.path(ref), "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return b""
+            m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(m)  # the mapping lives as long as the view
+
+    def exists(self, ref: str) -> bool:
+        return os.path.exists(self.path(ref))
+
+    def delete(self, ref: str) -> None:
+        try:
+            os.unlink(self.path(ref))
+        except FileNotFoundError:
+            pass
+
+
+class S3BlobStore(BlobStore):
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: str | None = None, client=None):
+        if client is None:
+            try:
+                import boto3
+            except ImportError:
+                raise ImproperlyConfigured("BLOB_BACKEND=s3 needs boto3 (pip install boto3)")
+            client = boto3.client("s3", endpoint_url=endpoint_url or None)
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def key(self, ref: str) -> str:
+        return self.prefix + _shard(_digest(ref))
+
+    def put(self, data) -> str:
+        ref = ref_for(data)
+        if not self.exists(ref):
+            self.client.put_object(Bucket=self.bucket, Key=self.key(ref), Body=bytes(data))
+        return ref
+
+    def put_stream(self, chunks) -> tuple[str, int]:
+        # Spool (memory up to 8 MiB, then disk) while hashing; upload_fileobj sends multipart
+        h, size = hashlib.sha256(), 0
+        with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as f:
+            for chunk in chunks:
+                h.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+            ref = PREFIX + h.hexdigest()
+            if not self.exists(ref):
+                f.seek(0)
+                self.client.upload_fileobj(f, self.bucket, self.key(ref))
+        return ref, size
+
+    def get(self, ref: str):
+        return self.client.get_object(Bucket=self.bucket, Key=self.key(ref))["Body"].read()
+
+    def open(self, ref: str):
+        return self.client.get_object(Bucket=self.bucket, Key=self.key(ref))["Body"]
+
+    def exists(self, ref: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.key(ref))
+            return True
+        except Exception as e:
+            code = str(getattr(e, "response", {}).get("Error", {}).get("Code", ""))
+            if code in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def delete(self, ref: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self.key(ref))
+
+
+_store: BlobStore | None = None
+_store_key = None
+_lock = threading.Lock()
+
+
+def get_store() -> BlobStore | None:
+    """Configured store, or None when ciphertexts stay inline (BLOB_BACKEND unset)."""
+    global _store, _store_key
+    backend = (getattr(settings, "BLOB_BACKEND", "") or "").lower()
+    key = (backend, getattr(settings, "BLOB_LOCAL_ROOT", None), getattr(settings, "BLOB_S3_BUCKET", None))
+    if _store_key == key:
+        return _store
+    with _lock:
+        if backend == "local":
+            store = LocalBlobStore(settings.BLOB_LOCAL_ROOT)
+        elif backend == "s3":
+            if not getattr(settings, "BLOB_S3_BUCKET", ""):
+                raise ImproperlyConfigured("BLOB_BACKEND=s3 needs BLOB_S3_BUCKET")
+            store = S3BlobStore(settings.BLOB_S3_BUCKET, getattr(settings, "BLOB_S3_PREFIX", ""),
+                                getattr(settings, "BLOB_S3_ENDPOINT_URL", None))
+        elif not backend:
+            store = None
+        else:
+            raise ImproperlyConfigured(f"unknown BLOB_BACKEND {backend!r}")
+        _store, _store_key = store, key
+    return _store
+
+
+def externalize(ct) -> tuple[bytes | None, str]:
+    """(body_ct, body_ref) for a new row: large ciphertexts go to the store."""
+    store = get_store()
+    if store is None or ct is None or len(ct) <= getattr(settings, "BLOB_INLINE_MAX_BYTES", 16384):
+        return ct, ""
+    return None, store.put(ct)
+
+
+def release(ref: str) -> None:
+    """Delete a blob once no receipt or image references it (identical content shares a blob)."""
+    from .models import Receipt, ReceiptImage
+    store = get_store()
+    if not ref or store is None:
+        return
+    if Receipt.objects.filter(body_ref=ref).exists() or ReceiptImage.objects.filter(blob_ref=ref).exists():
+        return
+    store.delete(ref)
+
+
+def migrate_rows(min_bytes: int, batch: int = 500, limit: int | None = None) -> tuple[int, int]:
+    """
+    Move inline ciphertexts longer than min_bytes into the store, in id order.
+    The blob is written before the row is switched to the reference, so an
+    interrupted run leaves at most an unreferenced blob. Returns (rows, bytes).
+    """
+    from django.db.models.functions import Length
+    from .models import Receipt
+    store = get_store()
+    if store is None:
+        raise ImproperlyConfigured("set BLOB_BACKEND before migrating ciphertexts")
+    rows = moved_bytes = 0
+    last = 0
+    base = Receipt.objects.filter(body_ref="", body_ct__isnull=False).annotate(ct_len=Length("body_ct"))
+    while limit is None or rows < limit:
+        chunk = list(
+            base.filter(pk__gt=last, ct_len__gt=min_bytes).order_by("pk").values_list("pk", "body_ct")[:batch]
+        )
+        if not chunk:
+            break
+        for pk, ct in chunk:
+            last = pk
+            ref = store.put(ct)
+            if Receipt.objects.filter(pk=pk, body_ref="").update(body_ct=None, body_ref=ref):
+                rows += 1
+                moved_bytes += len(ct)
+            if limit is not None and rows >= limit:
+                break
+    return rows, moved_bytes
@@ -0,0 +1,339 @@
+"""
+Two-tier Django cache: a small per-process LRU (L1) in front of Django's pooled
+RedisCache (L2).
+
+Reads hit L1 first; L1 entries live for min(L1_TTL, the key's own timeout), so
+cross-worker staleness is bounded even if an invalidation is lost. Every write
+(set/add/delete/incr/touch/clear) publishes the affected keys on a Redis pub/sub
+channel; each process's subscriber evicts them from its L1. Messages carry a
+per-node sequence number: a gap (missed message) or a subscriber reconnect
+flushes the whole L1, and L1 is bypassed entirely while not subscribed.
+get_l2() always reads Redis, for values that must not lag (response_cache's
+per-user data versions).
+
+CACHES = {"default": {
+    "BACKEND": "financekit.cache_backend.TieredCache",
+    "LOCATION": "redis://...",
+    "TIMEOUT": 300,
+    "OPTIONS": {"L1_MAX_ENTRIES": 1000, "L1_TTL": 5, "max_connections": 50},
+}}
+Options other than L1_* / CHANNEL are passed to the redis connection pool.
+"""
+from __future__ import annotations
+import json
+import os
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.redis import RedisCache
+
+from .tracing import span
+
+_MISSING = object()
+
+
+class LocalLRU:
+    """Thread-safe LRU of pickled values with absolute expiry times."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max(1, max_entries)
+        self._d: OrderedDict[str, tuple[bytes, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            hit = self._d.get(key)
+            if hit is None:
+                return _MISSING
+            blob, expires = hit
+            if expires <= time.monotonic():
+                del self._d[key]
+                return _MISSING
+            self._d.move_to_end(key)
+        return pickle.loads(blob)
+
+    def set(self, key: str, value, ttl: float) -> None:
+        if ttl <= 0:
+            self.discard(key)
+            return
+        blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._d[key] = (blob, time.monotonic() + ttl)
+            self._d.move_to_end(key)
+            while len(self._d) > self.max_entries:
+                self._d.popitem(last=False)
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            self._d.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._d.clear()
+
+    def __len__(self):
+        return len(self._d)
+
+
+class TieredCache(RedisCache):
+    def __init__(self, server, params):
+        params = dict(params)
+        options = dict(params.get("OPTIONS") or {})
+        self.l1_ttl = float(options.pop("L1_TTL", 5))
+        l1_max = int(options.pop("L1_MAX_ENTRIES", 1000))
+        self.channel = options.pop("CHANNEL", "cache:invalidate")
+        params["OPTIONS"] = options
+        super().__init__(server, params)
+        self._l1 = LocalLRU(l1_max)
+        self._node = uuid.uuid4().hex
+        self._seq = 0
+        self._seen: dict[str, int] = {}
+        self._pid = os.getpid()
+        self._sub_thread: threading.Thread | None = None
+        self._subscribed = False
+        self._state_lock = threading.Lock()
+        self._stats = {
+            "l1_hits": 0, "l2_hits": 0, "misses": 0, "writes": 0,
+            "invalidations_sent": 0, "invalidations_received": 0, "l1_flushes": 0, "errors": 0,
+            "l2_ops": 0, "l2_time_ms": 0.0, "l2_max_ms": 0.0,
+        }
+
+    # ----- L1 plumbing -----
+
+    def _l1_enabled(self) -> bool:
+        if self.l1_ttl <= 0:
+            return False
+        if os.getpid() != self._pid:
+            # Forked (e.g. gunicorn --preload): the subscriber thread did not survive
+            with self._state_lock:
+                self._pid, self._sub_thread, self._subscribed = os.getpid(), None, False
+                self._l1.clear()
+        self._ensure_subscriber()
+        return self._subscribed
+
+    def _l1_ttl_for(self, timeout) -> float:
+        timeout = self.get_backend_timeout(timeout)
+        return self.l1_ttl if timeout is None else min(self.l1_ttl, float(timeout))
+
+    def _count(self, name: str, n=1) -> None:
+        self._stats[name] += n
+
+    def _timed(self, fn, *args):
+        t0 = time.perf_counter()
+        try:
+            with span("redis", op=fn.__name__):
+                return fn(*args)
+        except Exception:
+            self._count("errors")
+            raise
+        finally:
+            ms = (time.perf_counter() - t0) * 1000.0
+            s = self._stats
+            s["l2_ops"] += 1
+            s["l2_time_ms"] += ms
+            if ms > s["l2_max_ms"]:
+                s["l2_max_ms"] = ms
+
+    def _publish(self, keys) -> None:
+        for k in keys:
+            self._l1.discard(k)
+        with self._state_lock:
+            self._seq += 1
+            seq = self._seq
+        msg = json.dumps({"n": self._node, "s": seq, "k": list(keys)})
+        try:
+            self._cache.get_client(write=True).publish(self.channel, msg)
+            self._count("invalidations_sent")
+        except Exception:
+            self._count("errors")
+
+    def _ensure_subscriber(self) -> None:
+        if self._sub_thread is not None:
+            return
+        with self._state_lock:
+            if self._sub_thread is None:
+                self._sub_thread = threading.Thread(target=self._listen, name="cache-invalidate", daemon=True)
+                self._sub_thread.start()
+
+    def _flush_l1(self) -> None:
+        self._l1.clear()
+        self._count("l1_flushes")
+
+    def _listen(self) -> None:
+        pid = os.getpid()
+        while os.getpid() == pid:
+            ps = None
+            try:
+                ps = self._cache.get_client(write=True).pubsub(ignore_subscribe_messages=False)
+                ps.subscribe(self.channel)
+                while os.getpid() == pid:
+                    # Polling with a timeout (not listen()) so the pool's socket_timeout
+                    # does not turn an idle channel into reconnect churn
+                    msg = ps.get_message(timeout=1.0)
+                    if msg is None:
+                        continue
+                    if msg["type"] == "subscribe":
+                        self._flush_l1()  # anything cached before (re)subscribing may be stale
+                        self._subscribed = True
+                    elif msg["type"] == "message":
+                        self._on_message(msg["data"])
+            except Exception:
+                self._count("errors")
+            finally:
+                self._subscribed = False
+                self._flush_l1()
+                if ps is not None:
+                    try:
+                        ps.close()
+                    except Exception:
+                        pass
+            time.sleep(1.0)
+
+    def _on_message(self, data) -> None:
+        try:
+            msg = json.loads(data)
+        except Exception:
+            return
+        node, seq = msg.get("n"), int(msg.get("s") or 0)
+        last = self._seen.get(node)
+        self._seen[node] = seq
+        self._count("invalidations_received")
+        if node == self._node:
+            return
+        if msg.get("k") == ["*"] or (last is not None and seq != last + 1):
+            self._flush_l1()  # clear() elsewhere, or we missed a message from that node
+            return
+        for k in msg.get("k") or ():
+            self._l1.discard(k)
+
+    # ----- cache API -----
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        use_l1 = self._l1_enabled()
+        if use_l1:
+            value = self._l1.get(key)
+            if value is not _MISSING:
+                self._count("l1_hits")
+                return value
+        if not use_l1:
+            value = self._timed(self._cache.get, key, _MISSING)
+            self._count("misses" if value is _MISSING else "l2_hits")
+            return default if value is _MISSING else value
+        # Fetch the remaining TTL in the same round trip so L1 never outlives the key
+        pipe = self._cache.get_client(key).pipeline(transaction=False)
+        pipe.get(key)
+        pipe.pttl(key)
+        raw, ttl_ms = self._timed(pipe.execute)
+        if raw is None:
+            self._count("misses")
+            return default
+        self._count("l2_hits")
+        value = self._cache._serializer.loads(raw)
+        self._l1.set(key, value, self.l1_ttl if ttl_ms is None or ttl_ms < 0 else min(self.l1_ttl, ttl_ms / 1000.0))
+        return value
+
+    def get_l2(self, key, default=None, version=None):
+        """Read straight from Redis, skipping (and not filling) L1: for values that must never be stale."""
+        made = self.make_and_validate_key(key, version=version)
+        value = self._timed(self._cache.get, made, _MISSING)
+        self._count("misses" if value is _MISSING else "l2_hits")
+        return default if value is _MISSING else value
+
+    def get_many(self, keys, version=None):
+        key_map = {self.make_and_validate_key(k, version=version): k for k in keys}
+        out, missing = {}, []
+        use_l1 = self._l1_enabled()
+        for made, orig in key_map.items():
+            value = self._l1.get(made) if use_l1 else _MISSING
+            if value is _MISSING:
+                missing.append(made)
+            else:
+                out[orig] = value
+                self._count("l1_hits")
+        if missing:
+            found = self._timed(self._cache.get_many, missing)
+            for made, value in found.items():
+                out[key_map[made]] = value
+                if use_l1:
+                    self._l1.set(made, value, self.l1_ttl)
+            self._count("l2_hits", len(found))
+            self._count("misses", len(missing) - len(found))
+        return out
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        made = self.make_and_validate_key(key, version=version)
+        self._timed(self._cache.set, made, value, self.get_backend_timeout(timeout))
+        self._count("writes")
+        self._publish([made])
+        if self._l1_enabled():
+            self._l1.set(made, value, self._l1_ttl_for(timeout))
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        if not data:
+            return []
+        safe = {self.make_and_validate_key(k, version=version): v for k, v in data.items()}
+        self._timed(self._cache.set_many, safe, self.get_backend_timeout(timeout))
+        self._count("writes", len(safe))
+        self._publish(list(safe))
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        made = self.make_and_validate_key(key, version=version)
+        added = self._timed(self._cache.add, made, value, self.get_backend_timeout(timeout))
+        if added:
+            self._count("writes")
+            self._publish([made])
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        made = self.make_and_validate_key(key, version=version)
+        ok = self._timed(self._cache.touch, made, self.get_backend_timeout(timeout))
+        self._publish([made])
+        return ok
+
+    def delete(self, key, version=None):
+        made = self.make_and_validate_key(key, version=version)
+        ok = self._timed(self._cache.delete, made)
+        self._publish([made])
+        return ok
+
+    def delete_many(self, keys, version=None):
+        made = [self.make_and_validate_key(k, version=version) for k in keys]
+        if made:
+            self._timed(self._cache.delete_many, made)
+            self._publish(made)
+
+    def incr(self, key, delta=1, version=None):
+        made = self.make_and_validate_key(key, version=version)
+        value = self._timed(self._cache.incr, made, delta)
+        self._count("writes")
+        self._publish([made])
+        return value
+
+    def has_key(self, key, version=None):
+        made = self.make_and_validate_key(key, version=version)
+        if self._l1_enabled() and self._l1.get(made) is not _MISSING:
+            return True
+        return self._timed(self._cache.has_key, made)
+
+    def clear(self):
+        ok = self._timed(self._cache.clear)
+        self._flush_l1()
+        self._publish(["*"])
+        return ok
+
+    def stats(self) -> dict:
+        s = dict(self._stats)
+        reads = s["l1_hits"] + s["l2_hits"] + s["misses"]
+        s["l1_entries"] = len(self._l1)
+        s["l1_active"] = self._subscribed
+        s["hit_ratio"] = round((s["l1_hits"] + s["l2_hits"]) / reads, 4) if reads else None
+        s["l2_avg_ms"] = round(s["l2_time_ms"] / s["l2_ops"], 3) if s["l2_ops"] else None
+        s["l2_time_ms"] = round(s["l2_time_ms"], 3)
+        s["l2_max_ms"] = round(s["l2_max_ms"], 3)
+        return s
@@ -53,7 +53,7 @@ def unwrap_dek_rsa_oaep(b64_ciphertext: str) -> bytes:
 
 def aesgcm_decrypt(key: bytes, nonce: bytes, ct: bytes, tag: bytes, aad: bytes = b""):
     aead = AESGCM(key)
-    return aead.decrypt(nonce, ct + tag, aad)
+    return aead.decrypt(nonce, b"".join((ct, tag)), aad)  # ct may be a memoryview (blob store mmap)
 
 def aesgcm_encrypt(key: bytes, plaintext: bytes, aad: bytes = b"") -> tuple[bytes, bytes, bytes]:
     """
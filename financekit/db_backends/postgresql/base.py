@@ -0,0 +1,8 @@
+"""PostgreSQL backend with connection lifecycle instrumentation (see financekit.dbpool)."""
+from django.db.backends.postgresql import base
+
+from financekit.dbpool import InstrumentedConnectionMixin
+
+
+class DatabaseWrapper(InstrumentedConnectionMixin, base.DatabaseWrapper):
+    pass
@@ -0,0 +1,8 @@
+"""SQLite backend with connection lifecycle instrumentation (see financekit.dbpool)."""
+from django.db.backends.sqlite3 import base
+
+from financekit.dbpool import InstrumentedConnectionMixin
+
+
+class DatabaseWrapper(InstrumentedConnectionMixin, base.DatabaseWrapper):
+    pass
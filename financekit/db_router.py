@@ -0,0 +1,161 @@
+"""
+Read-replica routing for read-only endpoints.
+
+Views opt in with ReplicaReadMixin: for safe methods, after authentication, the
+request's reads are pointed at a replica through a context variable consulted
+by ReplicaRouter. Everything else (writes, other views, background jobs) uses
+the primary. A replica is skipped when:
+  - the user wrote recently (cache marker set by signals.py, REPLICA_STICKY_SECONDS),
+    so they always read their own writes;
+  - its replication lag exceeds REPLICA_MAX_LAG_SECONDS or the lag check fails
+    (checked at most every REPLICA_LAG_CHECK_INTERVAL seconds per process).
+"""
+from __future__ import annotations
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from rest_framework.permissions import SAFE_METHODS
+
+PRIMARY = "default"
+_read_alias: ContextVar[str | None] = ContextVar("financekit_read_alias", default=None)
+
+_PG_LAG_SQL = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END
+"""
+
+_lag_cache: dict[str, tuple[float, float | None]] = {}
+_lag_lock = threading.Lock()
+
+
+def replica_aliases() -> list[str]:
+    return list(getattr(settings, "DATABASE_REPLICAS", []) or [])
+
+
+def _marker_key(user_id) -> str:
+    return f"rw:user:{user_id}"
+
+
+def mark_recent_write(user_id) -> None:
+    if not user_id or not replica_aliases():
+        return
+    try:
+        cache.set(_marker_key(user_id), 1, timeout=getattr(settings, "REPLICA_STICKY_SECONDS", 5))
+    except Exception:
+        pass
+
+
+def recently_wrote(user_id) -> bool:
+    if not user_id:
+        return False
+    try:
+        return bool(cache.get(_marker_key(user_id)))
+    except Exception:
+        return True  # cannot tell: stay on the primary
+
+
+def _measure_lag(alias: str) -> float | None:
+    try:
+        conn = connections[alias]
+        if conn.vendor != "postgresql":
+            return 0.0
+        with conn.cursor() as cur:
+            cur.execute(_PG_LAG_SQL)
+            return float(cur.fetchone()[0] or 0.0)
+    except Exception:
+        return None
+
+
+def replica_lag(alias: str) -> float | None:
+    """Replication lag in seconds (None when unreachable), cached per process."""
+    interval = getattr(settings, "REPLICA_LAG_CHECK_INTERVAL", 2.0)
+    now = time.monotonic()
+    hit = _lag_cache.get(alias)
+    if hit is not None and now - hit[0] < interval:
+        return hit[1]
+    with _lag_lock:
+        hit = _lag_cache.get(alias)
+        if hit is not None and now - hit[0] < interval:
+            return hit[1]
+        lag = _measure_lag(alias)
+        _lag_cache[alias] = (time.monotonic(), lag)
+        return lag
+
+
+def choose_read_db(user_id=None) -> str:
+    replicas = replica_aliases()
+    if not replicas or recently_wrote(user_id):
+        return PRIMARY
+    max_lag = getattr(settings, "REPLICA_MAX_LAG_SECONDS", 5.0)
+    healthy = [a for a in replicas if (lag := replica_lag(a)) is not None and lag <= max_lag]
+    return random.choice(healthy) if healthy else PRIMARY
+
+
+def current_read_db() -> str:
+    return _read_alias.get() or PRIMARY
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return _read_alias.get() or PRIMARY
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True  # replicas hold the same data as the primary
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
+
+
+class ReplicaReadMixin:
+    """DRF view mixin: serve safe-method requests from a replica (see module docstring)."""
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS and replica_aliases():
+            user = getattr(request, "user", None)
+            uid = user.pk if user is not None and user.is_authenticated else None
+            _read_alias.set(choose_read_db(uid))
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        _read_alias.set(None)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class ReplicaRoutingMiddleware:
+    """Start every request on the primary and drop any routing left over afterwards."""
+
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = _read_alias.set(None)
+        try:
+            return self.get_response(request)
+        finally:
+            _read_alias.reset(token)
+
+    async def __acall__(self, request):
+        token = _read_alias.set(None)
+        try:
+            return await self.get_response(request)
+        finally:
+            _read_alias.reset(token)
@@ -0,0 +1,73 @@
+"""
+Database connection lifecycle instrumentation (per worker process).
+
+The instrumented backends (financekit.db_backends.*) time every
+get_new_connection(): a TCP/TLS connect without pooling, a pool checkout when
+the psycopg3 pool is enabled. stats() reports those timings plus the age of
+connections currently held by this process and, when pooled, psycopg_pool's
+own counters (size, available, waiting, ...).
+"""
+from __future__ import annotations
+import os
+import threading
+import time
+import weakref
+
+_lock = threading.Lock()
+_stats = {"connects": 0, "connect_ms_total": 0.0, "connect_ms_max": 0.0, "closes": 0}
+_live: "weakref.WeakSet" = weakref.WeakSet()
+
+
+class InstrumentedConnectionMixin:
+    """Mix into a backend's DatabaseWrapper to record connect/checkout time and connection age."""
+
+    opened_at: float | None = None
+
+    def get_new_connection(self, conn_params):
+        t0 = time.perf_counter()
+        conn = super().get_new_connection(conn_params)
+        ms = (time.perf_counter() - t0) * 1000.0
+        with _lock:
+            _stats["connects"] += 1
+            _stats["connect_ms_total"] += ms
+            _stats["connect_ms_max"] = max(_stats["connect_ms_max"], ms)
+            _live.add(self)
+        self.opened_at = time.monotonic()
+        return conn
+
+    def _close(self):
+        try:
+            return super()._close()
+        finally:
+            with _lock:
+                _stats["closes"] += 1
+                _live.discard(self)
+            self.opened_at = None
+
+
+def stats() -> dict:
+    from django.db import connections
+    from django.conf import settings
+    now = time.monotonic()
+    with _lock:
+        s = dict(_stats)
+        ages = [now - w.opened_at for w in list(_live) if w.opened_at is not None]
+    out = {
+        "pid": os.getpid(),
+        "mode": getattr(settings, "DB_POOL_MODE", "off"),
+        "server": getattr(settings, "SERVER_INTERFACE", "wsgi"),
+        "conn_max_age": connections["default"].settings_dict.get("CONN_MAX_AGE"),
+        "connects": s["connects"],
+        "closes": s["closes"],
+        "connect_ms_avg": round(s["connect_ms_total"] / s["connects"], 3) if s["connects"] else None,
+        "connect_ms_max": round(s["connect_ms_max"], 3),
+        "open_connections": len(ages),
+        "connection_age_s_max": round(max(ages), 1) if ages else None,
+    }
+    pool = getattr(connections["default"], "pool", None)
+    if pool:
+        try:
+            out["pool"] = pool.get_stats()
+        except Exception:
+            pass
+    return out
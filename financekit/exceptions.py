@@ -12,6 +12,17 @@ class ReplayDetected(APIException):
     default_code = "replay_detected"
 
 
+class Overloaded(APIException):
+    """Load shed by admission control; `wait` becomes the Retry-After header."""
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Server busy, retry later"
+    default_code = "overloaded"
+
+    def __init__(self, detail=None, code=None, wait: int | None = None):
+        super().__init__(detail, code)
+        self.wait = wait
+
+
 def exception_handler(exc, context) -> Optional[Response]:
     """
     Wrap DRF/default exceptions into a consistent envelope:
@@ -0,0 +1,108 @@
+"""
+Streaming export of derived receipt columns (CSV or JSON Lines).
+
+Rows are read with a server-side cursor (QuerySet.iterator(chunk_size)) with
+items prefetched per chunk, encoded incrementally and optionally gzip'd on the
+fly, so memory stays flat regardless of how many receipts are exported.
+"""
+from __future__ import annotations
+import csv
+import io
+import json
+import zlib
+from typing import Iterable, Iterator
+
+from django.db.models import Prefetch
+
+from .models import Receipt
+from .receipt_partitions import owned_items
+
+RECEIPT_FIELDS = (
+    "id", "year", "month", "category", "merchant", "date_str", "currency",
+    "total", "subtotal", "tax_total", "discount_total", "fees_total", "tip_total", "created_at",
+)
+ITEM_FIELDS = ("desc", "qty", "price")
+CSV_HEADER = RECEIPT_FIELDS + tuple(f"item_{f}" for f in ITEM_FIELDS)
+
+CHUNK_SIZE = 2000          # rows per server-side cursor fetch
+FLUSH_BYTES = 64 * 1024    # encoded bytes buffered before yielding
+
+
+def export_queryset(user, start=None, end=None, category=None):
+    from .analytics import receipt_date_expr
+    qs = Receipt.objects.filter(user=user)
+    if start or end:
+        qs = qs.annotate(d=receipt_date_expr())
+        if start:
+            qs = qs.filter(d__gte=start)
+        if end:
+            qs = qs.filter(d__lte=end)
+    if category:
+        qs = qs.filter(category__iexact=category)
+    # user filter lets Postgres prune to the user's hash partition (receipt_partitions)
+    items = owned_items(user).only("receipt_id", *ITEM_FIELDS).order_by("id")
+    return (
+        qs.only(*RECEIPT_FIELDS)
+          .prefetch_related(Prefetch("items", queryset=items))
+          .order_by("id")
+    )
+
+
+def _receipt_values(r: Receipt) -> list:
+    return [
+        r.id, r.year, r.month, r.category or "", r.merchant, r.date_str, r.currency,
+        r.total, r.subtotal, r.tax_total, r.discount_total, r.fees_total, r.tip_total,
+        r.created_at.isoformat(),
+    ]
+
+
+def iter_csv(qs) -> Iterator[str]:
+    """One row per item (receipt columns repeated); item-less receipts get one row."""
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    w.writerow(CSV_HEADER)
+    for r in qs.iterator(chunk_size=CHUNK_SIZE):
+        base = _receipt_values(r)
+        items = r.items.all()
+        if not items:
+            w.writerow(base + ["", "", ""])
+        for it in items:
+            w.writerow(base + [it.desc, it.qty, it.price])
+        if buf.tell() >= FLUSH_BYTES:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+
+def iter_jsonl(qs) -> Iterator[str]:
+    parts: list[str] = []
+    size = 0
+    for r in qs.iterator(chunk_size=CHUNK_SIZE):
+        obj = dict(zip(RECEIPT_FIELDS, _receipt_values(r)))
+        for k in ("total", "subtotal", "tax_total", "discount_total", "fees_total", "tip_total"):
+            obj[k] = str(obj[k])
+        obj["items"] = [{"desc": it.desc, "qty": str(it.qty), "price": str(it.price)} for it in r.items.all()]
+        line = json.dumps(obj, separators=(",", ":"), ensure_ascii=False) + "\n"
+        parts.append(line)
+        size += len(line)
+        if size >= FLUSH_BYTES:
+            yield "".join(parts)
+            parts.clear()
+            size = 0
+    if parts:
+        yield "".join(parts)
+
+
+def encode(chunks: Iterable[str], gzip: bool = False) -> Iterator[bytes]:
+    if not gzip:
+        for c in chunks:
+            yield c.encode("utf-8")
+        return
+    z = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for c in chunks:
+        out = z.compress(c.encode("utf-8"))
+        if out:
+            yield out
+    yield z.flush()
@@ -0,0 +1,76 @@
+"""
+Encrypted archive of original receipt images (RECEIPT_IMAGE_ARCHIVE=1, needs BLOB_BACKEND).
+
+At ingest the upload is encrypted under the user's DEK with the chunked
+streaming AEAD in financekit.stream_aead and written to the blob store
+segment by segment; ReceiptImage keeps the reference. The image is streamed
+back, decrypted segment by segment, through a decrypt grant
+(POST /receipts/<id>/image). Memory stays bounded by the segment size on
+both paths, so OCR can be re-run on old receipts without a rescan.
+"""
+from __future__ import annotations
+import logging
+
+from django.conf import settings
+
+from .blobstore import get_store
+from .crypto_utils import unwrap_dek_rsa_oaep
+from .stream_aead import decrypt_stream, encrypt_stream
+
+log = logging.getLogger(__name__)
+
+
+def enabled() -> bool:
+    return bool(getattr(settings, "RECEIPT_IMAGE_ARCHIVE", False)) and get_store() is not None
+
+
+def _zeroize(dek) -> None:
+    try:
+        ba = bytearray(dek)
+        for i in range(len(ba)): ba[i] = 0
+    except Exception:
+        pass
+
+
+def archive_upload(upload, dek_wrap_srv: str) -> dict | None:
+    """Encrypt + store an UploadedFile; returns ReceiptImage fields, or None when disabled/failed."""
+    if not enabled():
+        return None
+    segment = getattr(settings, "IMAGE_SEGMENT_SIZE", 64 * 1024)
+    dek = None
+    try:
+        dek = unwrap_dek_rsa_oaep(dek_wrap_srv)
+        ref, _ = get_store().put_stream(encrypt_stream(dek, upload.chunks(segment), segment))
+        return {"blob_ref": ref, "size": upload.size, "content_type": (upload.content_type or "")[:64]}
+    except Exception:
+        log.warning("image archive failed; receipt stored without its image", exc_info=True)
+        return None  # do not fail ingest over the archive copy
+    finally:
+        if dek is not None:
+            _zeroize(dek)
+
+
+def open_plaintext(image, dek: bytes):
+    """
+    Iterator over the decrypted image. The first segment is decrypted before
+    returning (a wrong DEK raises StreamError here, not mid-response); the blob
+    is closed and the DEK zeroized once the iterator is exhausted or closed.
+    """
+    f = get_store().open(image.blob_ref)
+    try:
+        segments = decrypt_stream(dek, f)
+        first = next(segments)
+    except BaseException:
+        f.close()
+        _zeroize(dek)
+        raise
+
+    def _iter():
+        try:
+            yield first
+            yield from segments
+        finally:
+            f.close()
+            _zeroize(dek)
+
+    return _iter()
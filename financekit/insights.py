@@ -0,0 +1,176 @@
+"""
+Vectorized spending insights: rolling per-category baselines, z-scores,
+month-over-month deltas and duplicate-charge detection.
+
+A user's receipts are pulled once via values_list() into flat NumPy arrays;
+everything after that is array arithmetic (no per-row Python loops).
+"""
+from __future__ import annotations
+from dataclasses import dataclass
+
+import numpy as np
+
+from .analytics import receipt_date_expr
+from .models import Receipt
+
+BASELINE_MONTHS = 6     # trailing window for the per-category baseline
+MIN_HISTORY = 3         # months of history needed before scoring a category
+Z_THRESHOLD = 2.5
+RATIO_THRESHOLD = 3.0   # e.g. a category running 3x its usual monthly level
+MIN_BASELINE = 1.0      # ignore ratios against (near) zero baselines
+DUPLICATE_DAYS = 2      # same merchant + same amount within this many days
+
+
+@dataclass
+class SpendArrays:
+    ids: np.ndarray         # int64
+    dates: np.ndarray       # datetime64[D]
+    cat_codes: np.ndarray   # int64 index into categories
+    merch_codes: np.ndarray # int64 index into merchants
+    totals: np.ndarray      # float64
+    categories: np.ndarray  # unique labels
+    merchants: np.ndarray   # unique labels
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def load_arrays(user) -> SpendArrays:
+    rows = list(
+        Receipt.objects.filter(user=user)
+        .annotate(d=receipt_date_expr())
+        .values_list("id", "d", "category", "merchant", "total")
+    )
+    # NaT would poison months.min() and every date diff; drop undated rows up front
+    rows = [r for r in rows if r[1] is not None]
+    n = len(rows)
+    if not n:
+        empty = np.array([], dtype=object)
+        return SpendArrays(
+            np.array([], dtype=np.int64), np.array([], dtype="datetime64[D]"),
+            np.array([], dtype=np.int64), np.array([], dtype=np.int64),
+            np.array([], dtype=np.float64), empty, empty,
+        )
+    ids, dates, cats, merchs, totals = zip(*rows)
+    categories, cat_codes = np.unique(np.array([c or "" for c in cats], dtype=object), return_inverse=True)
+    merchants, merch_codes = np.unique(np.array([m or "" for m in merchs], dtype=object), return_inverse=True)
+    return SpendArrays(
+        ids=np.fromiter(ids, dtype=np.int64, count=n),
+        dates=np.array(dates, dtype="datetime64[D]"),
+        cat_codes=cat_codes.astype(np.int64),
+        merch_codes=merch_codes.astype(np.int64),
+        totals=np.fromiter((float(t) for t in totals), dtype=np.float64, count=n),
+        categories=categories,
+        merchants=merchants,
+    )
+
+
+def monthly_matrix(a: SpendArrays) -> tuple[np.ndarray, np.ndarray]:
+    """(months[M] as datetime64[M], spend[M, C]) with every month between first and last present."""
+    months = a.dates.astype("datetime64[M]")
+    first = months.min()
+    idx = (months - first).astype(np.int64)
+    n_months = int(idx.max()) + 1
+    n_cats = len(a.categories)
+    flat = np.bincount(idx * n_cats + a.cat_codes, weights=a.totals, minlength=n_months * n_cats)
+    return first + np.arange(n_months), flat.reshape(n_months, n_cats)
+
+
+def rolling_baseline(spend: np.ndarray, window: int = BASELINE_MONTHS) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Trailing mean/std over the previous `window` months (current month excluded),
+    via prefix sums. Returns (mean, std, n_history), each shaped like spend.
+    """
+    n_months = spend.shape[0]
+    zero = np.zeros((1, spend.shape[1]))
+    cs = np.vstack([zero, np.cumsum(spend, axis=0)])
+    cs2 = np.vstack([zero, np.cumsum(spend * spend, axis=0)])
+    m = np.arange(n_months)
+    lo = np.maximum(0, m - window)
+    count = (m - lo).astype(np.float64)[:, None]
+    s = cs[m] - cs[lo]
+    s2 = cs2[m] - cs2[lo]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(count > 0, s / count, 0.0)
+        var = np.where(count > 0, s2 / count - mean * mean, 0.0)
+    std = np.sqrt(np.clip(var, 0.0, None))
+    return mean, std, np.broadcast_to(count, spend.shape)
+
+
+def duplicate_charges(a: SpendArrays, days: int = DUPLICATE_DAYS) -> list[dict]:
+    """Adjacent receipts (after sorting) with same merchant and amount within `days`."""
+    if len(a) < 2:
+        return []
+    cents = np.rint(a.totals * 100).astype(np.int64)
+    order = np.lexsort((a.dates.astype(np.int64), cents, a.merch_codes))
+    m, c, d = a.merch_codes[order], cents[order], a.dates[order]
+    gap = (d[1:] - d[:-1]).astype(np.int64)
+    hit = (m[1:] == m[:-1]) & (c[1:] == c[:-1]) & (c[1:] > 0) & (gap <= days)
+    out = []
+    for i in np.flatnonzero(hit):
+        out.append({
+            "merchant": str(a.merchants[m[i]]),
+            "total": round(c[i] / 100.0, 2),
+            "date": str(d[i + 1]),
+            "receipt_ids": [int(a.ids[order[i]]), int(a.ids[order[i + 1]])],
+        })
+    return out
+
+
+def compute_insights(user, recent_months: int = 3) -> dict:
+    a = load_arrays(user)
+    if not len(a):
+        return {"months": [], "monthly_total": [], "month_over_month": None, "anomalies": [], "duplicates": []}
+
+    months, spend = monthly_matrix(a)
+    mean, std, hist = rolling_baseline(spend)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        z = np.where(std > 0, (spend - mean) / std, 0.0)
+        ratio = np.where(mean >= MIN_BASELINE, spend / mean, 0.0)
+    flagged = (hist >= MIN_HISTORY) & (spend > 0) & ((z >= Z_THRESHOLD) | (ratio >= RATIO_THRESHOLD))
+    flagged[:-max(1, recent_months)] = False
+
+    anomalies = []
+    for mi, ci in zip(*np.nonzero(flagged)):
+        anomalies.append({
+            "month": str(months[mi]),
+            "category": str(a.categories[ci]),
+            "total": round(float(spend[mi, ci]), 2),
+            "baseline": round(float(mean[mi, ci]), 2),
+            "zscore": round(float(z[mi, ci]), 2),
+            "ratio": round(float(ratio[mi, ci]), 2),
+        })
+    anomalies.sort(key=lambda x: (x["month"], x["ratio"]), reverse=True)
+
+    monthly_total = spend.sum(axis=1)
+    cur = spend[-1]
+    prev = spend[-2] if len(months) >= 2 else np.zeros_like(cur)
+    delta = cur - prev
+    with np.errstate(invalid="ignore", divide="ignore"):
+        pct = np.where(prev > 0, delta / prev * 100.0, np.nan)
+    prev_total = float(monthly_total[-2]) if len(months) >= 2 else 0.0
+    mom = {
+        "month": str(months[-1]),
+        "total": round(float(monthly_total[-1]), 2),
+        "previous": round(prev_total, 2),
+        "delta": round(float(monthly_total[-1]) - prev_total, 2),
+        "by_category": [
+            {
+                "category": str(a.categories[ci]),
+                "total": round(float(cur[ci]), 2),
+                "previous": round(float(prev[ci]), 2),
+                "delta": round(float(delta[ci]), 2),
+                "pct": None if np.isnan(pct[ci]) else round(float(pct[ci]), 1),
+            }
+            for ci in np.argsort(-np.abs(delta)) if cur[ci] or prev[ci]
+        ],
+    }
+
+    return {
+        "months": [str(m) for m in months],
+        "monthly_total": [round(float(v), 2) for v in monthly_total],
+        "month_over_month": mom,
+        "anomalies": anomalies,
+        "duplicates": duplicate_charges(a),
+    }
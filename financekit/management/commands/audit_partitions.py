@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from financekit.audit_partitions import maintain
+
+
+class Command(BaseCommand):
+    help = (
+        "Maintain time-partitioned audit storage: create upcoming monthly partitions (Postgres) "
+        "or roll completed months into archive tables (SQLite), then drop partitions past retention."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--convert", action="store_true",
+                            help="Postgres: convert the plain audit table to a partitioned one (run once)")
+        parser.add_argument("--retention-months", type=int, default=None,
+                            help="override AUDIT_RETENTION_MONTHS")
+        parser.add_argument("--ahead", type=int, default=None,
+                            help="override AUDIT_PARTITIONS_AHEAD (months of partitions created in advance)")
+
+    def handle(self, *args, **opts):
+        retention = opts["retention_months"] or settings.AUDIT_RETENTION_MONTHS
+        ahead = settings.AUDIT_PARTITIONS_AHEAD if opts["ahead"] is None else opts["ahead"]
+        out = maintain(retention, months_ahead=ahead, convert=opts["convert"])
+        if not out["partitioned"]:
+            self.stdout.write(self.style.WARNING("audit table is not partitioned; run with --convert"))
+            return
+        if out["converted"]:
+            self.stdout.write("converted audit table to monthly partitions")
+        self.stdout.write(self.style.SUCCESS(
+            f"created/rolled {len(out['created'])} partition(s), dropped {len(out['dropped'])}"
+        ))
+        if out["default_rows"]:
+            # Rows dated beyond --ahead months (clock skew, or bad created_at): non-zero exit for cron alerting
+            raise CommandError(
+                f"{out['default_rows']} audit row(s) sit in the DEFAULT partition, past the monthly partitions; "
+                f"check their created_at or raise AUDIT_PARTITIONS_AHEAD"
+            )
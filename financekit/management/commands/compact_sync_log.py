@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from financekit.sync import compact
+
+
+class Command(BaseCommand):
+    help = "Delete receipt sync-log entries older than the retention window (SYNC_LOG_RETENTION_DAYS)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=None, help="override retention in days")
+        parser.add_argument("--batch", type=int, default=5000)
+
+    def handle(self, *args, **opts):
+        removed = compact(opts["days"], batch=opts["batch"])
+        self.stdout.write(self.style.SUCCESS(f"removed {removed} sync log entries"))
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from financekit import synthetic
+
+
+class Command(BaseCommand):
+    help = ("Bulk-generate synthetic receipts/items (Zipf merchants, skewed categories) for benchmarking. "
+            "COPY on Postgres, batched inserts on SQLite. Use a throwaway database.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10)
+        parser.add_argument("--per-user", type=int, default=1000, help="receipts per user")
+        parser.add_argument("--append", action="store_true",
+                            help="add --per-user receipts each instead of topping up to --per-user")
+        parser.add_argument("--months", type=int, default=24, help="date window, ending today")
+        parser.add_argument("--merchants", type=int, default=2000)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--batch-size", type=int, default=20000)
+        parser.add_argument("--prefix", default="synth_", help="username prefix for the generated users")
+
+    def handle(self, *args, **opts):
+        users = synthetic.synth_users(opts["users"], opts["prefix"])
+        t0 = time.perf_counter()
+
+        def progress(n):
+            if opts["verbosity"] >= 2:
+                self.stdout.write(f"  {n} receipts ({n / (time.perf_counter() - t0):.0f}/s)")
+
+        n = synthetic.generate(users, opts["per_user"], months=opts["months"], merchants=opts["merchants"],
+                               seed=opts["seed"], batch_size=opts["batch_size"], top_up=not opts["append"],
+                               progress=progress)
+        secs = time.perf_counter() - t0
+        self.stdout.write(self.style.SUCCESS(f"{len(users)} users, {n} receipts written in {secs:.1f}s"))
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from financekit.blobstore import migrate_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Move inline receipt ciphertexts larger than a threshold into the blob store (BLOB_BACKEND), "
+        "leaving only a reference in the row. On Postgres, VACUUM the receipt table afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--min-bytes", type=int, default=None, help="override BLOB_INLINE_MAX_BYTES")
+        parser.add_argument("--batch", type=int, default=500)
+        parser.add_argument("--limit", type=int, default=None, help="stop after this many rows")
+
+    def handle(self, *args, **opts):
+        threshold = settings.BLOB_INLINE_MAX_BYTES if opts["min_bytes"] is None else opts["min_bytes"]
+        rows, size = migrate_rows(threshold, batch=opts["batch"], limit=opts["limit"])
+        self.stdout.write(self.style.SUCCESS(f"moved {rows} ciphertext(s), {size} bytes"))
@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from financekit.receipt_partitions import convert, drop_legacy, is_partitioned, partition_sizes
+
+
+class Command(BaseCommand):
+    help = (
+        "Hash-partition receipts and items by user_id (Postgres), converting the live tables online. "
+        "On other databases only ReceiptItem.user_id is backfilled."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--partitions", type=int, default=None,
+                            help="override RECEIPT_HASH_PARTITIONS (fixed once converted)")
+        parser.add_argument("--batch-size", type=int, default=5000, help="rows per copy/backfill transaction")
+        parser.add_argument("--drop-legacy", action="store_true",
+                            help="drop the pre-conversion tables kept after the swap")
+        parser.add_argument("--status", action="store_true", help="print estimated rows per partition")
+
+    def handle(self, *args, **opts):
+        if opts["status"]:
+            sizes = partition_sizes()
+            if not sizes:
+                self.stdout.write(self.style.WARNING("receipts are not hash-partitioned"))
+            for name, rows in sizes.items():
+                self.stdout.write(f"{name}\t{rows}")
+            return
+        if opts["drop_legacy"]:
+            dropped = drop_legacy()
+            self.stdout.write(self.style.SUCCESS(f"dropped {', '.join(dropped) or 'nothing'}"))
+            return
+        if is_partitioned():
+            self.stdout.write("receipts are already hash-partitioned")
+            return
+        partitions = opts["partitions"] or settings.RECEIPT_HASH_PARTITIONS
+        if convert(partitions, opts["batch_size"], log=self.stdout.write):
+            self.stdout.write(self.style.SUCCESS(
+                "converted; legacy tables are kept until --drop-legacy"
+            ))
@@ -0,0 +1,60 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from financekit.models import Receipt
+
+
+def _worker_init():
+    # Forked workers must not reuse the parent's DB sockets; spawned ones need setup
+    import django
+    from django.db import connections as conns
+    django.setup()
+    conns.close_all()
+
+
+def _recompute(user_id):
+    from financekit.recurring import recompute_user
+    return user_id, recompute_user(user_id)
+
+
+class Command(BaseCommand):
+    help = "Rebuild RecurringCharge rows for all (or selected) users, in parallel across processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4, help="process pool size (1 = run inline)")
+        parser.add_argument("--user", type=int, action="append", dest="users", help="limit to user id(s)")
+
+    def handle(self, *args, **opts):
+        user_ids = opts.get("users") or list(
+            Receipt.objects.values_list("user_id", flat=True).distinct().order_by("user_id")
+        )
+        workers = max(1, opts["workers"])
+        total = 0
+        failed = []
+        # One bad user (a malformed row, a lock timeout) must not abort everyone else's rebuild
+        if workers == 1 or len(user_ids) <= 1:
+            for uid in user_ids:
+                try:
+                    total += _recompute(uid)[1]
+                except Exception as e:
+                    failed.append(uid)
+                    self.stderr.write(f"user {uid}: {e}")
+        else:
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=_worker_init) as pool:
+                futures = {pool.submit(_recompute, uid): uid for uid in user_ids}
+                for fut in as_completed(futures):
+                    try:
+                        uid, n = fut.result()
+                    except Exception as e:
+                        failed.append(futures[fut])
+                        self.stderr.write(f"user {futures[fut]}: {e}")
+                        continue
+                    total += n
+                    if opts["verbosity"] >= 2:
+                        self.stdout.write(f"user {uid}: {n} recurring charges")
+        self.stdout.write(self.style.SUCCESS(f"{len(user_ids) - len(failed)} users, {total} recurring charges"))
+        if failed:
+            raise CommandError(f"{len(failed)} user(s) failed: {', '.join(map(str, sorted(failed)))}")
@@ -0,0 +1,294 @@
+"""
+Low-overhead Prometheus metrics (counters and histograms), safe across gunicorn workers.
+
+With METRICS_DIR set, each process keeps its samples in its own memory-mapped
+file there (as prometheus_client's multiprocess mode does): an observation is a
+dict lookup and an in-place float add under a process-local lock, with no
+syscall. GET /metrics merges every file in the directory, so a scrape of any
+worker sees the sum over all of them, including workers that have exited
+(counters stay monotonic). Clear the directory when the server (re)starts
+(`make serve-wsgi` / `serve-asgi` do). Without METRICS_DIR, samples live in
+this process only (dev server, tests).
+"""
+from __future__ import annotations
+import glob
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_REGISTRY: dict[str, "_Metric"] = {}
+_HEADER = struct.Struct("<Q")    # bytes used
+_KEYLEN = struct.Struct("<I")
+_VALUE = struct.Struct("<d")
+_INITIAL_SIZE = 64 * 1024
+
+
+class _FileValues:
+    """Append-only key -> float records in a per-process mmap'd file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._f = open(path, "a+b")
+        if os.fstat(self._f.fileno()).st_size < _INITIAL_SIZE:
+            self._f.truncate(_INITIAL_SIZE)
+        self._m = mmap.mmap(self._f.fileno(), 0)
+        self._offsets: dict[str, int] = {}
+        self._used = _HEADER.size
+        for key, _, off in _read_records(self._m):
+            self._offsets[key] = off
+            self._used = off + _VALUE.size
+        _HEADER.pack_into(self._m, 0, self._used)
+
+    def add(self, key: str, amount: float) -> None:
+        off = self._offsets.get(key)
+        if off is None:
+            off = self._append(key)
+        self._m[off:off + 8] = _VALUE.pack(_VALUE.unpack_from(self._m, off)[0] + amount)
+
+    def _append(self, key: str) -> int:
+        raw = key.encode("utf-8")
+        # Pad so the value is 8-byte aligned
+        size = _KEYLEN.size + len(raw)
+        size += (-size) % 8
+        need = self._used + size + _VALUE.size
+        if need > len(self._m):
+            new = max(len(self._m) * 2, need)
+            self._m.close()
+            self._f.truncate(new)
+            self._m = mmap.mmap(self._f.fileno(), 0)
+        _KEYLEN.pack_into(self._m, self._used, len(raw))
+        self._m[self._used + _KEYLEN.size:self._used + _KEYLEN.size + len(raw)] = raw
+        off = self._used + size
+        _VALUE.pack_into(self._m, off, 0.0)
+        self._used = need
+        _HEADER.pack_into(self._m, 0, self._used)  # published last: readers stop before partial records
+        self._offsets[key] = off
+        return off
+
+    def items(self):
+        return [(k, v) for k, v, _ in _read_records(self._m)]
+
+
+def _read_records(buf):
+    used = _HEADER.unpack_from(buf, 0)[0] if len(buf) >= _HEADER.size else 0
+    pos = _HEADER.size
+    while pos + _KEYLEN.size <= used:
+        (n,) = _KEYLEN.unpack_from(buf, pos)
+        size = _KEYLEN.size + n
+        size += (-size) % 8
+        off = pos + size
+        if off + _VALUE.size > used:
+            break
+        yield bytes(buf[pos + _KEYLEN.size:pos + _KEYLEN.size + n]).decode("utf-8"), _VALUE.unpack_from(buf, off)[0], off
+        pos = off + _VALUE.size
+
+
+class _MemValues:
+    def __init__(self):
+        self._d: dict[str, float] = defaultdict(float)
+
+    def add(self, key: str, amount: float) -> None:
+        self._d[key] += amount
+
+    def items(self):
+        return list(self._d.items())
+
+
+_store = None
+_store_key = None
+_lock = threading.Lock()
+
+
+def _directory() -> str:
+    return getattr(settings, "METRICS_DIR", "") or ""
+
+
+def _values():
+    global _store, _store_key
+    key = (os.getpid(), _directory())
+    if _store_key != key:  # first use, or a forked worker
+        pid, d = key
+        if d:
+            os.makedirs(d, exist_ok=True)
+            _store = _FileValues(os.path.join(d, f"fk_{pid}.db"))
+        else:
+            _store = _MemValues()
+        _store_key = key
+    return _store
+
+
+def _add(key: str, amount: float) -> None:
+    with _lock:
+        _values().add(key, amount)
+
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labelstr(names: tuple, labels: dict) -> str:
+    if set(labels) != set(names):
+        raise ValueError(f"expected labels {names}, got {tuple(labels)}")
+    return ",".join(f'{n}="{_escape(labels[n])}"' for n in names)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        _REGISTRY[name] = self
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        _add(f"{self.name}_total\x00{_labelstr(self.labels, labels)}", amount)
+
+
+class _Timer:
+    __slots__ = ("hist", "labels", "t0")
+
+    def __init__(self, hist, labels):
+        self.hist, self.labels = hist, labels
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self.t0, **self.labels)
+        return False
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels) -> None:
+        ls = _labelstr(self.labels, labels)
+        le = next(b for b in self.buckets if value <= b)
+        # Per-bucket (non-cumulative) counts; render() accumulates
+        with _lock:
+            v = _values()
+            v.add(f"{self.name}_bucket\x00{ls}\x00{le}", 1.0)
+            v.add(f"{self.name}_sum\x00{ls}", value)
+            v.add(f"{self.name}_count\x00{ls}", 1.0)
+
+    def time(self, **labels) -> _Timer:
+        return _Timer(self, labels)
+
+
+def _merged() -> dict[str, float]:
+    totals: dict[str, float] = defaultdict(float)
+    d = _directory()
+    if d:
+        _values()  # make sure this process's file exists
+        for path in glob.glob(os.path.join(d, "fk_*.db")):
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+            except OSError:
+                continue
+            for k, v, _ in _read_records(data):
+                totals[k] += v
+    else:
+        with _lock:
+            for k, v in _values().items():
+                totals[k] += v
+    return totals
+
+
+def _fmt(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    return repr(float(v)) if v != int(v) else str(int(v))
+
+
+def _line(name: str, ls: str, v: float) -> str:
+    return f"{name}{{{ls}}} {_fmt(v)}" if ls else f"{name} {_fmt(v)}"
+
+
+def render(extra: dict[str, dict] | None = None) -> str:
+    """Prometheus text exposition (0.0.4). extra: {name: {"help", "type", "samples": {labelstr: value}}}
+    for point-in-time gauges collected at scrape time."""
+    samples = _merged()
+    by_name: dict[str, list] = defaultdict(list)
+    for key, value in samples.items():
+        parts = key.split("\x00")
+        by_name[parts[0]].append((parts[1:], value))
+    out = []
+    for name, m in sorted(_REGISTRY.items()):
+        out.append(f"# HELP {name} {m.help}")
+        out.append(f"# TYPE {name} {m.kind}")
+        if m.kind == "counter":
+            for (ls,), v in sorted(by_name.get(f"{name}_total", [])):
+                out.append(_line(f"{name}_total", ls, v))
+            continue
+        buckets: dict[str, dict[float, float]] = defaultdict(dict)
+        for (ls, le), v in by_name.get(f"{name}_bucket", []):
+            buckets[ls][float(le)] = v
+        sums = {ls: v for (ls,), v in by_name.get(f"{name}_sum", [])}
+        counts = {ls: v for (ls,), v in by_name.get(f"{name}_count", [])}
+        for ls in sorted(counts):
+            acc = 0.0
+            prefix = f"{ls}," if ls else ""
+            for b in m.buckets:
+                acc += buckets[ls].get(b, 0.0)
+                out.append(f'{name}_bucket{{{prefix}le="{_fmt(b)}"}} {_fmt(acc)}')
+            out.append(_line(f"{name}_sum", ls, sums.get(ls, 0.0)))
+            out.append(_line(f"{name}_count", ls, counts[ls]))
+    for name, g in sorted((extra or {}).items()):
+        out.append(f"# HELP {name} {g['help']}")
+        out.append(f"# TYPE {name} {g.get('type', 'gauge')}")
+        for ls, v in sorted(g["samples"].items()):
+            out.append(_line(name, ls, v))
+    return "\n".join(out) + "\n"
+
+
+def reset() -> None:
+    """Drop this process's samples (tests)."""
+    global _store, _store_key
+    with _lock:
+        if isinstance(_store, _FileValues):
+            _store._m.close()
+            _store._f.close()
+            os.unlink(_store.path)
+        _store = _store_key = None
+
+
+# ----- Application metrics ---------------------------------------------------
+
+INGEST_STAGE = Histogram(
+    "financekit_ingest_stage_seconds", "Time spent per ingest stage.", labels=("stage",))
+OCR_STAGE = Histogram(
+    "financekit_ocr_stage_seconds", "Time spent per OCR pipeline stage.", labels=("stage",))
+OCR_BUDGET = Counter(
+    "financekit_ocr_budget_exceeded", "OCR stages over their time budget, by action taken.", labels=("stage", "action"))
+DECRYPT_STAGE = Histogram(
+    "financekit_decrypt_stage_seconds", "Time spent per decrypt/process stage.", labels=("stage",))
+GRANT_OUTCOMES = Counter(
+    "financekit_grant_outcomes", "Grant-gated request outcomes (as audited).", labels=("endpoint", "outcome"))
+RESPONSE_CACHE = Counter(
+    "financekit_response_cache", "Versioned response cache lookups.", labels=("namespace", "result"))
+DB_QUERIES = Histogram(
+    "financekit_request_queries", "SQL queries issued per request.", labels=("route",),
+    buckets=(1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144))
+NPLUSONE = Counter(
+    "financekit_nplusone", "Requests repeating one query shape NPLUSONE_THRESHOLD+ times.", labels=("route",))
+ADMISSION = Counter(
+    "financekit_admission", "Admission control decisions (admitted, queued, shed_*).", labels=("limiter", "outcome"))
+ADMISSION_WAIT = Histogram(
+    "financekit_admission_wait_seconds", "Time spent queued for an admission slot.", labels=("limiter",))
@@ -1,12 +1,40 @@
 import uuid
 
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from .tracing import atraced, enabled as tracing_enabled, traced
+
 class RequestIDMiddleware:
+    """Assigns request.request_id and, when tracing is on, times the request (see financekit.tracing)."""
+
+    sync_capable = async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
         request.request_id = request.headers.get("X-Request-ID") or str(uuid.uuid4())
-        response = self.get_response(request)
+        if tracing_enabled():
+            response = traced(request, self.get_response)
+        else:
+            response = self.get_response(request)
+        return self._tag(request, response)
+
+    async def __acall__(self, request):
+        request.request_id = request.headers.get("X-Request-ID") or str(uuid.uuid4())
+        if tracing_enabled():
+            response = await atraced(request, self.get_response)
+        else:
+            response = await self.get_response(request)
+        return self._tag(request, response)
+
+    @staticmethod
+    def _tag(request, response):
         try:
             response["X-Request-ID"] = request.request_id
         except Exception:
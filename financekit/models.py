@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 
 class DeviceKey(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
@@ -20,6 +21,8 @@ class Receipt(models.Model):
     body_nonce = models.BinaryField(null=True, blank=True)
     body_ct    = models.BinaryField(null=True, blank=True)
     body_tag   = models.BinaryField(null=True, blank=True)
+    # Set instead of body_ct when the ciphertext lives in the blob store (financekit.blobstore)
+    body_ref   = models.CharField(max_length=80, blank=True, default="")
 
     # Optional derived/plain fields
     merchant = models.CharField(max_length=255, blank=True, default="")
@@ -37,6 +40,25 @@ class Receipt(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "-created_at"]),
+            models.Index(fields=["body_ref"], condition=~models.Q(body_ref=""), name="receipt_body_ref"),
+        ]
+
+    # Encrypted columns: deferred wherever only derived fields are read
+    CIPHERTEXT_FIELDS = ("body_nonce", "body_ct", "body_tag")
+
+    def ciphertext(self):
+        """body_ct, read from the blob store when only a reference is kept in the row."""
+        if self.body_ref:
+            from .blobstore import get_store
+            store = get_store()
+            if store is None:
+                raise RuntimeError("receipt ciphertext is in the blob store but BLOB_BACKEND is unset")
+            return store.get(self.body_ref)
+        return self.body_ct
+
     def __str__(self):
         return f"{self.merchant or 'Receipt'} • {self.total} {self.currency}"
 
@@ -48,19 +70,43 @@ class GrantJTI(models.Model):
 
 class ReceiptItem(models.Model):
     receipt = models.ForeignKey(Receipt, on_delete=models.CASCADE, related_name="items")
+    # Denormalized receipt.user: the hash-partition key (see financekit.receipt_partitions)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True,
+                             editable=False, related_name="+", db_index=False)
     desc = models.CharField(max_length=512)
     qty = models.DecimalField(max_digits=12, decimal_places=3, default=1)
     price = models.DecimalField(max_digits=12, decimal_places=2, default=0)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "receipt"]),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.user_id is None and self.receipt_id is not None:
+            self.user_id = self.receipt.user_id
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.desc} ({self.qty} × {self.price})"
 
 
+class ReceiptImage(models.Model):
+    """Original upload, encrypted under the user's DEK (financekit.image_archive) in the blob store."""
+    receipt = models.OneToOneField(Receipt, on_delete=models.CASCADE, related_name="image")
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+", db_index=False)
+    blob_ref = models.CharField(max_length=80, db_index=True)
+    size = models.PositiveBigIntegerField()  # plaintext bytes
+    content_type = models.CharField(max_length=64, blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+
 class AuditEvent(models.Model):
     """Audit trail for sensitive operations like decrypt/process.
     Stores minimal structured context; avoid storing plaintext data.
+    Written in batches by financekit.audit, so created_at is the event time set at emit().
     """
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL)
     device_id = models.CharField(max_length=128, blank=True, default="")
     jti = models.CharField(max_length=64, blank=True, default="")
@@ -78,3 +124,48 @@ class AuditEvent(models.Model):
             models.Index(fields=["endpoint", "created_at"]),
         ]
         ordering = ["-created_at"]
+
+
+class RecurringCharge(models.Model):
+    """Materialized recurring merchant charges (subscriptions, rent, ...).
+    Maintained by financekit.recurring: per merchant after each ingest/delete,
+    fully via the recompute_recurring management command.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    merchant = models.CharField(max_length=255)
+    period = models.CharField(max_length=16)  # weekly | monthly | annual
+    interval_days = models.FloatField()
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    currency = models.CharField(max_length=8, blank=True, default="USD")
+    occurrences = models.IntegerField()
+    first_seen = models.DateField()
+    last_seen = models.DateField()
+    next_expected = models.DateField()
+    confidence = models.FloatField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "merchant"]),
+            models.Index(fields=["user", "next_expected"]),
+        ]
+        ordering = ["next_expected"]
+
+
+class ReceiptChange(models.Model):
+    """Per-user receipt change log for mobile delta sync (see financekit.sync).
+    The autoincrement id is the monotonic sync cursor; deletes are kept as tombstones
+    until compacted by the compact_sync_log command.
+    """
+    OP_UPSERT = "upsert"
+    OP_DELETE = "delete"
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, db_index=False)
+    receipt_id = models.BigIntegerField()  # plain id: must outlive the receipt row
+    op = models.CharField(max_length=8)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "id"]),
+        ]
@@ -1,4 +1,18 @@
-__all__ = ["run"]
+__all__ = ["run", "OcrDeferred", "OcrTimeout"]
+
+
+class OcrTimeout(Exception):
+	"""Tesseract overran its time budget (the subprocess was killed)."""
+
+
+class OcrDeferred(Exception):
+	"""OCR gave up on this image within its budgets; the caller should answer "deferred", not wait."""
+
+	def __init__(self, stage: str, budget_ms: float):
+		super().__init__(f"OCR {stage} stage exceeded its {budget_ms:.0f}ms budget")
+		self.stage = stage
+		self.budget_ms = budget_ms
+
 
 def run(image_bytes: bytes) -> dict:
 	# Lazy import to avoid importing heavy deps (cv2) at module import time
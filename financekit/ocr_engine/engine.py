@@ -1,11 +1,63 @@
 from __future__ import annotations
-from .reader import load_thresh_from_bytes, ocr_text
+import time
+from django.conf import settings
+from financekit.metrics import OCR_BUDGET, OCR_STAGE
+from financekit.tracing import span
+from . import OcrDeferred, OcrTimeout
+from .fake import fake_text
+from .reader import decode_scale, downscale, load_thresh_from_bytes, ocr_text
 from .normalize import normalize_text_to_schema
 
+def _budget(stage: str) -> float:
+    """OCR_<STAGE>_BUDGET_MS in seconds (0 = unlimited)."""
+    return float(getattr(settings, f"OCR_{stage.upper()}_BUDGET_MS", 0)) / 1000.0
+
+def _tesseract(bin_img, image_bytes: bytes, timeout: float) -> str:
+    if getattr(settings, "OCR_ENGINE", "tesseract") == "fake":
+        return fake_text(image_bytes, timeout)
+    return ocr_text(bin_img, timeout)
+
+def _defer(stage: str, budget: float):
+    OCR_BUDGET.inc(stage=stage, action="deferred")
+    raise OcrDeferred(stage, budget * 1000)
+
 def run(image_bytes: bytes) -> dict:
     """
-    Public entrypoint: identical behavior to your old external pipeline.
+    Public entrypoint: identical behavior to your old external pipeline, within
+    time budgets. Oversized images are decoded at reduced size (OCR_MAX_PIXELS);
+    Tesseract is killed at its budget and retried once at half size within
+    OCR_FALLBACK_BUDGET_MS, giving a result marked "ocr_status": "partial".
+    Raises OcrDeferred when no result fits the budgets. Preprocess and normalize
+    run in-process and cannot be interrupted: an overrun there is counted, and
+    preprocess overruns skip Tesseract.
     """
-    bin_img = load_thresh_from_bytes(image_bytes)
-    text = ocr_text(bin_img)
-    return normalize_text_to_schema(text)
+    with OCR_STAGE.time(stage="preprocess"), span("ocr.preprocess"):
+        t0 = time.monotonic()
+        bin_img = load_thresh_from_bytes(image_bytes, decode_scale(image_bytes, getattr(settings, "OCR_MAX_PIXELS", 0)))
+        elapsed = time.monotonic() - t0
+    if _budget("preprocess") and elapsed > _budget("preprocess"):
+        _defer("preprocess", _budget("preprocess"))
+
+    status = None
+    with OCR_STAGE.time(stage="tesseract"), span("ocr.tesseract"):
+        try:
+            text = _tesseract(bin_img, image_bytes, _budget("tesseract"))
+        except OcrTimeout:
+            if not _budget("fallback"):
+                _defer("tesseract", _budget("tesseract"))
+            OCR_BUDGET.inc(stage="tesseract", action="fallback")
+            try:
+                with span("ocr.fallback"):
+                    text = _tesseract(downscale(bin_img), image_bytes, _budget("fallback"))
+            except OcrTimeout:
+                _defer("fallback", _budget("fallback"))
+            status = "partial"
+
+    with OCR_STAGE.time(stage="normalize"), span("ocr.normalize"):
+        t0 = time.monotonic()
+        result = normalize_text_to_schema(text)
+    if _budget("normalize") and time.monotonic() - t0 > _budget("normalize"):
+        OCR_BUDGET.inc(stage="normalize", action="overrun")
+    if status:
+        result["ocr_status"] = status
+    return result
@@ -0,0 +1,36 @@
+from __future__ import annotations
+import hashlib
+import time
+
+from django.conf import settings
+
+from . import OcrTimeout
+
+_MERCHANTS = ("Walmart", "Target", "Costco", "Trader Joe's", "Amazon")
+_ITEMS = ("MILK 2%", "BREAD WHEAT", "EGGS DOZEN", "BANANAS", "COFFEE BEANS", "PASTA", "APPLES", "YOGURT")
+
+def fake_text(image_bytes: bytes, timeout: float = 0) -> str:
+    """
+    Stand-in for Tesseract (OCR_ENGINE=fake): a plausible receipt text derived
+    from the image hash, so the rest of the pipeline (decode, threshold,
+    normalize, crypto, DB) runs for real. Sleeps OCR_FAKE_DELAY_MS to mimic
+    Tesseract's wall time (it runs as a subprocess, so it does not hold the GIL),
+    and honours timeout like ocr_text().
+    """
+    delay = float(getattr(settings, "OCR_FAKE_DELAY_MS", 0)) / 1000.0
+    if timeout and delay > timeout:
+        time.sleep(timeout)
+        raise OcrTimeout()
+    if delay > 0:
+        time.sleep(delay)
+    h = hashlib.sha256(image_bytes).digest()
+    lines = [_MERCHANTS[h[0] % len(_MERCHANTS)], f"{1 + h[1] % 12:02d}/{1 + h[2] % 28:02d}/2025"]
+    subtotal = 0
+    for i in range(1 + h[3] % 6):
+        cents = 99 + (h[4 + i] * 37) % 1900
+        subtotal += cents
+        lines.append(f"{_ITEMS[h[10 + i] % len(_ITEMS)]} {cents // 100}.{cents % 100:02d}")
+    tax = subtotal * 8 // 100
+    lines += [f"SUBTOTAL {subtotal // 100}.{subtotal % 100:02d}", f"TAX {tax // 100}.{tax % 100:02d}",
+              f"TOTAL {(subtotal + tax) // 100}.{(subtotal + tax) % 100:02d}"]
+    return "\n".join(lines)
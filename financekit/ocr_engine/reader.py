@@ -1,29 +1,61 @@
 from __future__ import annotations
+import io
 import os
 import cv2
 import pytesseract
 import numpy as np
 
+from . import OcrTimeout
+
 # Optional override for tesseract binary:
 #  - Windows: setx TESSERACT_CMD "C:\Program Files\Tesseract-OCR\tesseract.exe"
 #  - Linux:   export TESSERACT_CMD="/usr/bin/tesseract"
 if os.getenv("TESSERACT_CMD"):
     pytesseract.pytesseract.tesseract_cmd = os.getenv("TESSERACT_CMD")
 
-def load_thresh_from_bytes(image_bytes: bytes):
-    """BGR -> gray -> THRESH_BINARY(150) (same as external script)."""
+_REDUCED = {2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+
+def decode_scale(image_bytes: bytes, max_pixels: int) -> int:
+    """Smallest decode reduction (1, 2, 4, 8) that keeps the image under max_pixels (reads the header only)."""
+    if not max_pixels:
+        return 1
+    from PIL import Image
+    try:
+        w, h = Image.open(io.BytesIO(image_bytes)).size
+    except Image.DecompressionBombError:
+        return 8
+    except Exception:
+        return 1  # not an image PIL knows; let cv2 decide
+    for f in (1, 2, 4):
+        if (w // f) * (h // f) <= max_pixels:
+            return f
+    return 8
+
+def load_thresh_from_bytes(image_bytes: bytes, scale: int = 1):
+    """BGR -> gray -> THRESH_BINARY(150) (same as external script), decoded at 1/scale size."""
     arr = np.frombuffer(image_bytes, np.uint8)
-    img = cv2.imdecode(arr, cv2.IMREAD_COLOR)
+    img = cv2.imdecode(arr, _REDUCED.get(scale, cv2.IMREAD_COLOR))
     if img is None:
         return None
     gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
     _, thresh = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY)
     return thresh
 
-def ocr_text(bin_img) -> str:
+def downscale(bin_img):
+    """Half-size copy for the fallback pass (Tesseract time grows with pixel count)."""
+    if bin_img is None or min(bin_img.shape[:2]) < 2:
+        return bin_img
+    return cv2.resize(bin_img, None, fx=0.5, fy=0.5, interpolation=cv2.INTER_AREA)
+
+def ocr_text(bin_img, timeout: float = 0) -> str:
+    """Tesseract text; raises OcrTimeout when it runs past timeout seconds (0 = no limit)."""
     if bin_img is None:
         return ""
     try:
-        return pytesseract.image_to_string(bin_img)
+        return pytesseract.image_to_string(bin_img, timeout=timeout)
+    except RuntimeError as e:
+        if "timeout" in str(e).lower():
+            raise OcrTimeout() from e
+        return ""
     except Exception:
         return ""
@@ -0,0 +1,277 @@
+"""
+Opt-in request profiling (PROFILING_ENABLED=1).
+
+ProfilingMiddleware profiles a PROFILE_SAMPLE_RATE fraction of requests, plus
+any request from a staff user that carries the PROFILE_HEADER header
+(`X-Profile: 1`, or `X-Profile: cprofile` to pick the profiler). Profiles are
+stored under PROFILE_DIR, keyed by request ID (returned as X-Profile-ID), and
+served to staff by GET /api/v1/profiles[/<id>].
+
+  sampling  a background thread snapshots every thread's Python stack each
+            PROFILE_INTERVAL_MS; stored as collapsed stacks (`<id>.folded`,
+            "root;caller;callee count" lines, ready for flamegraph.pl or
+            speedscope). Every thread is sampled, so in threaded/async workers
+            concurrent requests show up under their own thread names.
+  cprofile  deterministic cProfile of the request thread (the event-loop
+            thread in async chains); stored as pstats (`<id>.prof`, for
+            snakeviz/gprof2dot) plus a text summary.
+
+One request per process is profiled at a time; others run unprofiled. With
+PROFILING_ENABLED off the middleware removes itself (MiddlewareNotUsed), so
+it costs nothing. Streaming bodies are produced after the profile stops.
+"""
+from __future__ import annotations
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+log = logging.getLogger(__name__)
+
+FORMATS = {"folded": "text/plain; charset=utf-8", "prof": "application/octet-stream",
+           "txt": "text/plain; charset=utf-8", "json": "application/json"}
+_KEY = re.compile(r"^[A-Za-z0-9_-]{1,100}$")
+_busy = threading.Lock()
+
+
+def profile_dir() -> str:
+    return getattr(settings, "PROFILE_DIR", "") or os.path.join(settings.BASE_DIR, "profiles")
+
+
+def _frame_name(code) -> str:
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{os.path.basename(code.co_filename)}:{name}:{code.co_firstlineno}".replace(";", ":")
+
+
+class StackSampler(threading.Thread):
+    """Counts the Python stacks of all other threads every `interval` seconds."""
+
+    def __init__(self, interval: float):
+        super().__init__(name="fk-profiler", daemon=True)
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop_evt = threading.Event()
+
+    def run(self):
+        me = threading.get_ident()
+        while not self._stop_evt.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}"))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self) -> None:
+        self._stop_evt.set()
+        self.join()
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common())
+
+
+def _staff_requested(request) -> bool:
+    header = getattr(settings, "PROFILE_HEADER", "X-Profile")
+    if not request.headers.get(header):
+        return False
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        return user.is_staff
+    try:
+        # API clients authenticate in the DRF view; check their bearer token here
+        from rest_framework_simplejwt.authentication import JWTAuthentication
+        result = JWTAuthentication().authenticate(request)
+        return bool(result and result[0].is_staff)
+    except Exception:
+        return False
+
+
+def _unique_key(request, directory: str) -> str:
+    rid = getattr(request, "request_id", "") or ""
+    key = rid if len(rid) <= 64 and _KEY.match(rid) else f"req-{time.time_ns()}"
+    if os.path.exists(os.path.join(directory, f"{key}.json")):
+        key = f"{key}-{time.time_ns()}"
+    return key
+
+
+def _write(path: str, data) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb" if isinstance(data, bytes) else "w") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _prune(directory: str) -> None:
+    keep = int(getattr(settings, "PROFILE_MAX_FILES", 200))
+    metas = sorted(
+        (e for e in os.scandir(directory) if e.name.endswith(".json")), key=lambda e: e.stat().st_mtime, reverse=True,
+    )
+    for e in metas[keep:]:
+        key = e.name[:-5]
+        for fmt in FORMATS:
+            try:
+                os.unlink(os.path.join(directory, f"{key}.{fmt}"))
+            except FileNotFoundError:
+                pass
+
+
+class ProfilingMiddleware:
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "PROFILING_ENABLED", False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        forced = _staff_requested(request)
+        if not self._sampled(forced) or not _busy.acquire(blocking=False):
+            return self.get_response(request)
+        try:
+            mode = self._mode(request, forced)
+            profiler = self._start(mode)
+            try:
+                response = self.get_response(request)
+            finally:
+                duration_ms = self._stop(profiler)
+            return self._finish(request, response, mode, forced, profiler, duration_ms)
+        finally:
+            _busy.release()
+
+    async def __acall__(self, request):
+        header = getattr(settings, "PROFILE_HEADER", "X-Profile")
+        # request.user (and the JWT check) hit the DB: resolve them off the event loop
+        forced = bool(request.headers.get(header)) and await sync_to_async(_staff_requested)(request)
+        if not self._sampled(forced) or not _busy.acquire(blocking=False):
+            return await self.get_response(request)
+        try:
+            mode = self._mode(request, forced)
+            profiler = self._start(mode)
+            try:
+                response = await self.get_response(request)
+            finally:
+                duration_ms = self._stop(profiler)
+            return await sync_to_async(self._finish, thread_sensitive=False)(
+                request, response, mode, forced, profiler, duration_ms)
+        finally:
+            _busy.release()
+
+    @staticmethod
+    def _sampled(forced: bool) -> bool:
+        rate = float(getattr(settings, "PROFILE_SAMPLE_RATE", 0.0))
+        return forced or (rate > 0 and random.random() < rate)
+
+    @staticmethod
+    def _mode(request, forced: bool) -> str:
+        mode = request.headers.get(getattr(settings, "PROFILE_HEADER", "X-Profile"), "") if forced else ""
+        return mode if mode in ("sampling", "cprofile") else getattr(settings, "PROFILE_MODE", "sampling")
+
+    @staticmethod
+    def _start(mode: str) -> tuple:
+        sampler = prof = None
+        if mode == "cprofile":
+            prof = cProfile.Profile()
+            prof.enable()
+        else:
+            sampler = StackSampler(float(getattr(settings, "PROFILE_INTERVAL_MS", 5)) / 1000.0)
+            sampler.start()
+        return sampler, prof, time.time(), time.perf_counter()
+
+    @staticmethod
+    def _stop(profiler: tuple) -> float:
+        sampler, prof, _, t0 = profiler
+        if prof is not None:
+            prof.disable()
+        else:
+            sampler.stop()
+        return (time.perf_counter() - t0) * 1000.0
+
+    def _finish(self, request, response, mode, forced, profiler, duration_ms):
+        sampler, prof, started, _ = profiler
+        try:
+            key = self._store(request, response, mode, forced, started, duration_ms, sampler, prof)
+            response["X-Profile-ID"] = key
+        except Exception:
+            log.warning("storing request profile failed", exc_info=True)
+        return response
+
+    @staticmethod
+    def _store(request, response, mode, forced, started, duration_ms, sampler, prof) -> str:
+        directory = profile_dir()
+        os.makedirs(directory, exist_ok=True)
+        key = _unique_key(request, directory)
+        if prof is not None:
+            prof.dump_stats(os.path.join(directory, f"{key}.prof"))
+            out = io.StringIO()
+            pstats.Stats(prof, stream=out).sort_stats("cumulative").print_stats(40)
+            _write(os.path.join(directory, f"{key}.txt"), out.getvalue())
+            files = ["prof", "txt"]
+        else:
+            _write(os.path.join(directory, f"{key}.folded"), sampler.folded())
+            files = ["folded"]
+        meta = {
+            "id": key,
+            "request_id": getattr(request, "request_id", ""),
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "duration_ms": round(duration_ms, 3),
+            "mode": mode,
+            "trigger": "header" if forced else "sample",
+            "samples": sampler.samples if sampler is not None else None,
+            "pid": os.getpid(),
+            "created_at": started,
+            "formats": files + ["json"],
+        }
+        _write(os.path.join(directory, f"{key}.json"), json.dumps(meta))
+        _prune(directory)
+        return key
+
+
+# ----- Staff access ------------------------------------------------------------
+
+def list_profiles(limit: int = 100) -> list[dict]:
+    directory = profile_dir()
+    if not os.path.isdir(directory):
+        return []
+    metas = sorted((e for e in os.scandir(directory) if e.name.endswith(".json")),
+                   key=lambda e: e.stat().st_mtime, reverse=True)[:limit]
+    out = []
+    for e in metas:
+        try:
+            with open(e.path) as f:
+                out.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return out
+
+
+def profile_path(key: str, fmt: str) -> str | None:
+    """Path of a stored profile file, or None (unknown key/format)."""
+    if not _KEY.match(key) or fmt not in FORMATS:
+        return None
+    path = os.path.join(profile_dir(), f"{key}.{fmt}")
+    return path if os.path.exists(path) else None
@@ -0,0 +1,183 @@
+"""
+Per-request SQL accounting (QUERYLOG_ENABLED, on by default).
+
+QueryLogMiddleware (sync or async chain) feeds every query of a request,
+through a connection.execute_wrapper added once per thread, into a QueryLog
+that:
+  - counts and times queries, observed per route in financekit_request_queries;
+  - logs queries slower than SLOW_QUERY_MS, with the EXPLAIN plan for a
+    SLOW_QUERY_EXPLAIN_RATE sample (plain EXPLAIN: the query is not re-run);
+  - flags N+1 patterns: a query shape (SQL with IN-lists collapsed) seen
+    NPLUSONE_THRESHOLD or more times in one request is logged and counted.
+
+query_budget() applies the same accounting to a block and raises
+AssertionError when it issues too many queries or repeats a shape, for
+tests that pin an endpoint's query cost.
+"""
+from __future__ import annotations
+import logging
+import random
+import re
+import time
+from collections import Counter
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from .metrics import DB_QUERIES, NPLUSONE
+
+log = logging.getLogger(__name__)
+
+_explaining: ContextVar[bool] = ContextVar("fk_explaining", default=False)
+_active: ContextVar[tuple] = ContextVar("fk_querylogs", default=())
+_IN_LIST = re.compile(r"\(\s*%s(?:\s*,\s*%s)*\s*\)")
+_SPACE = re.compile(r"\s+")
+
+
+def shape(sql: str) -> str:
+    """SQL with whitespace normalised and `IN (%s, %s, ...)` collapsed, so batch sizes don't split shapes."""
+    return _IN_LIST.sub("(%s...)", _SPACE.sub(" ", sql).strip())
+
+
+class QueryLog:
+    def __init__(self, report: bool = False, context: str = ""):
+        self.report = report      # slow-query logging + EXPLAIN (the request middleware)
+        self.context = context
+        self.count = 0
+        self.time_ms = 0.0
+        self.shapes: Counter = Counter()
+        self.queries: list[tuple[str, float]] = []
+
+    def record(self, sql, params, many, ms: float, connection) -> None:
+        self.count += 1
+        self.time_ms += ms
+        self.shapes[shape(sql)] += 1
+        self.queries.append((sql, ms))
+        if self.report and ms >= getattr(settings, "SLOW_QUERY_MS", 200):
+            self._slow(sql, params, many, ms, connection)
+
+    def _slow(self, sql, params, many, ms, connection) -> None:
+        plan = None
+        if (not many and sql.lstrip()[:6].upper() == "SELECT"
+                and random.random() < getattr(settings, "SLOW_QUERY_EXPLAIN_RATE", 0.1)):
+            plan = explain(connection, sql, params)
+        log.warning("slow query %.1fms %s: %s%s", ms, self.context, sql, f"\nplan:\n{plan}" if plan else "")
+
+    def repeated(self, threshold: int) -> list[tuple[str, int]]:
+        return [(s, n) for s, n in self.shapes.most_common() if n >= threshold]
+
+    @contextmanager
+    def installed(self):
+        _install()
+        token = _active.set(_active.get() + (self,))
+        try:
+            yield self
+        finally:
+            _active.reset(token)
+
+    @asynccontextmanager
+    async def ainstalled(self):
+        """installed() for async code: the ORM runs on sync_to_async's thread, so the wrapper goes there."""
+        await sync_to_async(_install)()
+        token = _active.set(_active.get() + (self,))
+        try:
+            yield self
+        finally:
+            _active.reset(token)
+
+
+def _record(execute, sql, params, many, ctx):
+    logs = _active.get()
+    if not logs or _explaining.get():
+        return execute(sql, params, many, ctx)
+    t0 = time.perf_counter()
+    try:
+        return execute(sql, params, many, ctx)
+    finally:
+        ms = (time.perf_counter() - t0) * 1000.0
+        for ql in logs:
+            ql.record(sql, params, many, ms, ctx["connection"])
+
+
+def _install() -> None:
+    """Add _record once to this thread's connections; it feeds the QueryLogs active in the current context."""
+    for conn in connections.all():
+        if _record not in conn.execute_wrappers:
+            conn.execute_wrappers.append(_record)
+
+
+def explain(connection, sql: str, params) -> str | None:
+    """EXPLAIN text for a SELECT (not executed); None when the plan cannot be read."""
+    prefix = "EXPLAIN QUERY PLAN " if connection.vendor == "sqlite" else "EXPLAIN "
+    token = _explaining.set(True)
+    try:
+        with connection.cursor() as cur:
+            cur.execute(prefix + sql, params)
+            return "\n".join(" ".join(str(c) for c in row) for row in cur.fetchall())
+    except Exception:
+        return None
+    finally:
+        _explaining.reset(token)
+
+
+class QueryLogMiddleware:
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "QUERYLOG_ENABLED", True):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        ql = self._log(request)
+        with ql.installed():
+            response = self.get_response(request)
+        self._report(request, ql)
+        return response
+
+    async def __acall__(self, request):
+        ql = self._log(request)
+        async with ql.ainstalled():
+            response = await self.get_response(request)
+        self._report(request, ql)
+        return response
+
+    @staticmethod
+    def _log(request) -> QueryLog:
+        return QueryLog(report=True, context=f"{request.method} {request.path} request_id={getattr(request, 'request_id', '')}")
+
+    @staticmethod
+    def _report(request, ql: QueryLog) -> None:
+        match = getattr(request, "resolver_match", None)
+        route = getattr(match, "route", None) or "unmatched"
+        DB_QUERIES.observe(ql.count, route=route)
+        repeated = ql.repeated(getattr(settings, "NPLUSONE_THRESHOLD", 5))
+        if repeated:
+            NPLUSONE.inc(route=route)
+        for sql, n in repeated:
+            log.warning("possible N+1: %d x same query in %s: %s", n, ql.context, sql)
+
+
+@contextmanager
+def query_budget(max_queries: int, max_repeats: int = 2):
+    """Fail (AssertionError) if the block runs more than max_queries queries or any shape more than max_repeats times."""
+    ql = QueryLog()
+    with ql.installed():
+        yield ql
+    problems = []
+    if ql.count > max_queries:
+        problems.append(f"{ql.count} queries > budget of {max_queries}")
+    for sql, n in ql.repeated(max_repeats + 1):
+        problems.append(f"shape repeated {n}x: {sql}")
+    if problems:
+        listing = "\n".join(f"  {ms:7.2f}ms  {sql}" for sql, ms in ql.queries)
+        raise AssertionError("; ".join(problems) + f"\nqueries:\n{listing}")
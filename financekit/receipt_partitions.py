@@ -0,0 +1,300 @@
+"""
+Hash partitioning of Receipt / ReceiptItem by user_id (Postgres, optional).
+
+Every receipt query is scoped to one user, so with PARTITION BY HASH (user_id)
+the planner prunes to a single partition and only touches that partition's
+(much smaller) indexes. ReceiptItem carries a denormalized user_id so item
+lookups prune the same way.
+
+Online conversion (convert()):
+  1. backfill ReceiptItem.user_id in batches (also the only step on SQLite);
+  2. create <table>_hashed partitioned copies and install triggers that mirror
+     every INSERT/UPDATE/DELETE on the live tables into them;
+  3. copy existing rows in id-ordered batches, each in its own short
+     transaction (safe to re-run after an interruption);
+  4. swap: one brief ACCESS EXCLUSIVE lock renames live -> <table>_legacy and
+     hashed -> live and moves the id identity over.
+The item and image -> receipt foreign keys become (receipt_id, user_id) -> (id, user_id).
+Legacy tables are kept until drop_legacy().
+"""
+from __future__ import annotations
+
+from django.db import connection, transaction
+from django.db.models import OuterRef, Q, Subquery
+
+from .models import Receipt, ReceiptImage, ReceiptItem
+
+RECEIPT = Receipt._meta.db_table
+ITEM = ReceiptItem._meta.db_table
+IMAGE = ReceiptImage._meta.db_table
+HASHED = "_hashed"
+LEGACY = "_legacy"
+
+
+def _q(name: str) -> str:
+    return connection.ops.quote_name(name)
+
+
+def is_partitioned(table: str = RECEIPT) -> bool:
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cur:
+        cur.execute(
+            "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+            "WHERE c.relname = %s AND c.relnamespace = current_schema()::regnamespace",
+            [table],
+        )
+        return cur.fetchone() is not None
+
+
+def owned_items(user):
+    """
+    Items to prefetch for user's receipts, filtered on the denormalized user_id so
+    Postgres prunes to the user's partition. Rows written before the column
+    existed keep user_id NULL until backfill_item_users() reaches them, so those
+    are included too; the prefetch's receipt_id filter still scopes them to user.
+    """
+    return ReceiptItem.objects.filter(Q(user=user) | Q(user__isnull=True))
+
+
+def backfill_item_users(batch_size: int = 5000) -> int:
+    """Fill ReceiptItem.user_id from its receipt for rows written before the column existed."""
+    owner = Receipt.objects.filter(pk=OuterRef("receipt_id")).values("user_id")[:1]
+    done = 0
+    while True:
+        ids = list(ReceiptItem.objects.filter(user__isnull=True).order_by("id").values_list("id", flat=True)[:batch_size])
+        if not ids:
+            return done
+        done += ReceiptItem.objects.filter(id__in=ids).update(user_id=Subquery(owner))
+
+
+# ----- Postgres --------------------------------------------------------------
+
+def _add_constraint(cur, table: str, name: str, ddl: str) -> None:
+    cur.execute("SELECT 1 FROM pg_constraint WHERE conname = %s AND conrelid = %s::regclass", [name, table])
+    if cur.fetchone() is None:
+        cur.execute(f"ALTER TABLE {_q(table)} ADD CONSTRAINT {_q(name)} {ddl}")
+
+
+def _create_hashed(partitions: int) -> None:
+    """Empty partitioned copies; constraints are added now so they never need a validating scan."""
+    r, i = RECEIPT + HASHED, ITEM + HASHED
+    with transaction.atomic(), connection.cursor() as cur:
+        for live, hashed in ((RECEIPT, r), (ITEM, i)):
+            cur.execute(
+                f"CREATE TABLE IF NOT EXISTS {_q(hashed)} (LIKE {_q(live)} INCLUDING DEFAULTS) "
+                f"PARTITION BY HASH (user_id)"
+            )
+            cur.execute(f"ALTER TABLE {_q(hashed)} ALTER COLUMN user_id SET NOT NULL")
+            for n in range(partitions):
+                cur.execute(
+                    f"CREATE TABLE IF NOT EXISTS {_q(f'{hashed}_p{n}')} PARTITION OF {_q(hashed)} "
+                    f"FOR VALUES WITH (MODULUS {int(partitions)}, REMAINDER {n})"
+                )
+            # The partition key must be part of every unique constraint
+            _add_constraint(cur, hashed, f"{live}_pk", "PRIMARY KEY (id, user_id)")
+            _add_constraint(cur, hashed, f"{live}_user_fk",
+                            "FOREIGN KEY (user_id) REFERENCES auth_user (id) DEFERRABLE INITIALLY DEFERRED")
+        _add_constraint(cur, i, f"{ITEM}_receipt_fk",
+                        f"FOREIGN KEY (receipt_id, user_id) REFERENCES {_q(r)} (id, user_id) "
+                        f"ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED")
+        # LIKE copies no indexes: rebuild every Meta index (e.g. receipt_body_ref, which
+        # blobstore.release() relies on) under a temporary name that _swap() takes back
+        for model in (Receipt, ReceiptItem):
+            for sql in _meta_index_sql(cur, model):
+                cur.execute(sql)
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {_q(RECEIPT + '_user_ym')} ON {_q(r)} (user_id, year, month)")
+
+
+def _meta_index_sql(cur, model) -> list[str]:
+    """CREATE INDEX for model's Meta.indexes on its _hashed copy, skipping ones already built."""
+    table = model._meta.db_table
+    editor = connection.schema_editor()
+    out = []
+    for index in model._meta.indexes:
+        name = index.name + HASHED
+        cur.execute("SELECT 1 FROM pg_class WHERE relname = %s AND relnamespace = current_schema()::regnamespace", [name])
+        if cur.fetchone():
+            continue
+        statement = index.create_sql(model, editor)
+        statement.rename_table_references(table, table + HASHED)
+        statement.parts["name"] = _q(name)
+        out.append(str(statement))
+    return out
+
+
+def _install_mirror(table: str) -> None:
+    hashed = table + HASHED
+    fn = _q(f"{hashed}_mirror")
+    with transaction.atomic(), connection.cursor() as cur:
+        cols = [c.name for c in connection.introspection.get_table_description(cur, table)]
+        targets = ", ".join(_q(c) for c in cols)
+        values = ", ".join(f"NEW.{_q(c)}" for c in cols)
+        # In-place UPDATE when the key is unchanged: delete+insert would cascade to the items
+        cur.execute(f"""
+            CREATE OR REPLACE FUNCTION {fn}() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP = 'UPDATE' AND OLD.id = NEW.id AND OLD.user_id IS NOT DISTINCT FROM NEW.user_id THEN
+                    UPDATE {_q(hashed)} SET ({targets}) = ROW({values})
+                    WHERE id = OLD.id AND user_id = OLD.user_id;
+                    IF FOUND THEN
+                        RETURN NULL;
+                    END IF;
+                ELSIF TG_OP IN ('UPDATE', 'DELETE') THEN
+                    DELETE FROM {_q(hashed)} WHERE id = OLD.id AND user_id = OLD.user_id;
+                END IF;
+                IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.user_id IS NOT NULL THEN
+                    INSERT INTO {_q(hashed)} SELECT (NEW).* ON CONFLICT DO NOTHING;
+                END IF;
+                RETURN NULL;
+            END $$ LANGUAGE plpgsql
+        """)
+        cur.execute(f"DROP TRIGGER IF EXISTS {_q(hashed + '_mirror')} ON {_q(table)}")
+        cur.execute(
+            f"CREATE TRIGGER {_q(hashed + '_mirror')} AFTER INSERT OR UPDATE OR DELETE ON {_q(table)} "
+            f"FOR EACH ROW EXECUTE FUNCTION {fn}()"
+        )
+
+
+def _install_item_owner_fill() -> None:
+    # Writers that predate ReceiptItem.user still insert items without user_id
+    fn = _q(f"{ITEM}_fill_user")
+    with transaction.atomic(), connection.cursor() as cur:
+        cur.execute(f"ALTER TABLE {_q(ITEM)} ADD COLUMN IF NOT EXISTS user_id integer")
+        cur.execute(f"""
+            CREATE OR REPLACE FUNCTION {fn}() RETURNS trigger AS $$
+            BEGIN
+                IF NEW.user_id IS NULL THEN
+                    SELECT user_id INTO NEW.user_id FROM {_q(RECEIPT)} WHERE id = NEW.receipt_id;
+                END IF;
+                RETURN NEW;
+            END $$ LANGUAGE plpgsql
+        """)
+        cur.execute(f"DROP TRIGGER IF EXISTS {_q(ITEM + '_fill_user')} ON {_q(ITEM)}")
+        cur.execute(
+            f"CREATE TRIGGER {_q(ITEM + '_fill_user')} BEFORE INSERT OR UPDATE ON {_q(ITEM)} "
+            f"FOR EACH ROW EXECUTE FUNCTION {fn}()"
+        )
+
+
+def _copy(table: str, batch_size: int) -> int:
+    """
+    Copy existing rows in id batches. FOR SHARE makes a concurrent UPDATE/DELETE
+    wait for the batch to commit, after which its mirror trigger corrects the copy;
+    ON CONFLICT skips rows the mirror already wrote, so a re-run is safe.
+    """
+    hashed = table + HASHED
+    copied = 0
+    with connection.cursor() as cur:
+        cur.execute(f"SELECT COALESCE(MIN(id), 1) - 1, COALESCE(MAX(id), 0) FROM {_q(table)}")
+        last, high = cur.fetchone()
+        while last < high:
+            with transaction.atomic():
+                cur.execute(
+                    f"INSERT INTO {_q(hashed)} SELECT * FROM {_q(table)} "
+                    f"WHERE id > %s AND id <= %s AND user_id IS NOT NULL FOR SHARE ON CONFLICT DO NOTHING",
+                    [last, last + batch_size],
+                )
+                copied += max(cur.rowcount, 0)
+            last += batch_size
+    return copied
+
+
+def _swap() -> None:
+    """Brief exclusive lock: retire the mirrors, rename tables, move the id identity."""
+    with transaction.atomic(), connection.cursor() as cur:
+        cur.execute("SET LOCAL lock_timeout = '5s'")
+        cur.execute(f"LOCK TABLE {_q(RECEIPT)}, {_q(ITEM)} IN ACCESS EXCLUSIVE MODE")
+        cur.execute(f"DROP TRIGGER IF EXISTS {_q(ITEM + '_fill_user')} ON {_q(ITEM)}")
+        # Other tables' FKs would follow the renamed legacy table: drop them (receiptimage's is re-added below)
+        cur.execute(
+            "SELECT conrelid::regclass::text, conname FROM pg_constraint "
+            "WHERE contype = 'f' AND confrelid = %s::regclass AND conrelid <> %s::regclass",
+            [RECEIPT, ITEM],
+        )
+        referencing = cur.fetchall()
+        for table, name in referencing:
+            cur.execute(f"ALTER TABLE {table} DROP CONSTRAINT {_q(name)}")
+        for model in (Receipt, ReceiptItem):
+            # Meta index names belong to the live table (migrations refer to them by name)
+            for index in model._meta.indexes:
+                cur.execute(f"ALTER INDEX IF EXISTS {_q(index.name)} RENAME TO {_q(index.name + LEGACY)}")
+                cur.execute(f"ALTER INDEX {_q(index.name + HASHED)} RENAME TO {_q(index.name)}")
+        for live in (RECEIPT, ITEM):
+            hashed = live + HASHED
+            cur.execute(f"DROP TRIGGER IF EXISTS {_q(hashed + '_mirror')} ON {_q(live)}")
+            cur.execute(f"DROP FUNCTION IF EXISTS {_q(hashed + '_mirror')}()")
+            cur.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {_q(live)}")
+            next_id = cur.fetchone()[0]
+            cur.execute(f"ALTER TABLE {_q(live)} RENAME TO {_q(live + LEGACY)}")
+            cur.execute(f"ALTER TABLE {_q(live + LEGACY)} ALTER COLUMN id DROP IDENTITY IF EXISTS")
+            cur.execute(f"ALTER TABLE {_q(live + LEGACY)} ALTER COLUMN id DROP DEFAULT")
+            cur.execute(f"ALTER TABLE {_q(hashed)} RENAME TO {_q(live)}")
+            cur.execute(
+                f"ALTER TABLE {_q(live)} ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY "
+                f"(START WITH {int(next_id)})"
+            )
+            cur.execute(
+                "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE i.inhparent = %s::regclass", [live],
+            )
+            for (part,) in cur.fetchall():
+                cur.execute(f"ALTER TABLE {_q(part)} RENAME TO {_q(part.replace(hashed, live, 1))}")
+        cur.execute(
+            f"ALTER TABLE {_q(IMAGE)} ADD CONSTRAINT {_q(IMAGE + '_receipt_fk')} "
+            f"FOREIGN KEY (receipt_id, user_id) REFERENCES {_q(RECEIPT)} (id, user_id) "
+            f"ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED NOT VALID"
+        )
+    with connection.cursor() as cur:
+        # receiptimage is a plain table: validated without blocking writes
+        cur.execute(f"ALTER TABLE {_q(IMAGE)} VALIDATE CONSTRAINT {_q(IMAGE + '_receipt_fk')}")
+
+
+def convert(partitions: int = 16, batch_size: int = 5000, log=lambda msg: None) -> bool:
+    """Run the online conversion (re-runnable after an interruption); False when there is nothing to do."""
+    if connection.vendor != "postgresql":
+        log(f"backfilled user_id on {backfill_item_users(batch_size)} item(s)")
+        return False
+    if is_partitioned(RECEIPT):
+        return False
+    _install_item_owner_fill()
+    log(f"backfilled user_id on {backfill_item_users(batch_size)} item(s)")
+    _create_hashed(partitions)
+    for table in (RECEIPT, ITEM):
+        _install_mirror(table)
+    for table in (RECEIPT, ITEM):
+        log(f"copied {_copy(table, batch_size)} row(s) into {table}{HASHED}")
+    # Items that raced the fill trigger's install; the UPDATE is mirrored
+    backfill_item_users(batch_size)
+    with connection.cursor() as cur:
+        for table in (RECEIPT, ITEM):
+            cur.execute(f"ANALYZE {_q(table + HASHED)}")
+    _swap()
+    log(f"swapped in {partitions} hash partitions")
+    return True
+
+
+def drop_legacy() -> list[str]:
+    dropped = []
+    existing = set(connection.introspection.table_names())
+    with connection.cursor() as cur:
+        for table in (ITEM + LEGACY, RECEIPT + LEGACY):
+            if table in existing:
+                cur.execute(f"DROP TABLE {_q(table)}")
+                dropped.append(table)
+        cur.execute(f"DROP FUNCTION IF EXISTS {_q(ITEM + '_fill_user')}()")
+    return dropped
+
+
+def partition_sizes() -> dict[str, int]:
+    """Estimated rows per partition (pg_class.reltuples), for spotting hot tenants."""
+    if not is_partitioned(RECEIPT):
+        return {}
+    with connection.cursor() as cur:
+        cur.execute(
+            "SELECT c.relname, c.reltuples::bigint FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname IN (%s, %s) ORDER BY c.relname",
+            [RECEIPT, ITEM],
+        )
+        return {name: max(int(n), 0) for name, n in cur.fetchall()}
@@ -0,0 +1,123 @@
+"""
+Recurring-charge detection over the derived Receipt columns.
+
+Charges are grouped by merchant, clustered by amount (within tolerance), and a
+cluster is recurring when the gaps between its dates sit around a known period.
+Results are materialized in RecurringCharge:
+  - refresh_merchant(): incremental, after an ingest/delete touches one merchant
+  - recompute_user():   full rebuild for one user (see recompute_recurring command)
+"""
+from __future__ import annotations
+import datetime
+import statistics
+from decimal import Decimal
+from itertools import groupby
+from typing import Iterable
+
+from django.db import transaction
+
+from .analytics import receipt_date_expr
+from .models import Receipt, RecurringCharge
+
+# (name, period in days, tolerance in days, min occurrences)
+PERIODS = (
+    ("weekly", 7.0, 2.0, 4),
+    ("monthly", 30.44, 4.0, 3),
+    ("annual", 365.25, 15.0, 2),
+)
+AMOUNT_REL_TOLERANCE = Decimal("0.10")
+AMOUNT_ABS_TOLERANCE = Decimal("0.50")
+MIN_CONFIDENCE = 0.6
+IGNORED_MERCHANTS = {"", "unknown"}
+
+
+def _cluster_by_amount(charges: list[tuple[datetime.date, Decimal]]) -> list[list[tuple[datetime.date, Decimal]]]:
+    clusters: list[list[tuple[datetime.date, Decimal]]] = []
+    for d, amt in sorted(charges, key=lambda c: c[1]):
+        if clusters:
+            anchor = clusters[-1][0][1]
+            if amt - anchor <= max(AMOUNT_ABS_TOLERANCE, anchor * AMOUNT_REL_TOLERANCE):
+                clusters[-1].append((d, amt))
+                continue
+        clusters.append([(d, amt)])
+    return clusters
+
+
+def detect(charges: Iterable[tuple[datetime.date, Decimal]]) -> list[dict]:
+    """Find periodic (date, amount) patterns for a single merchant."""
+    charges = [(d, amt) for d, amt in charges if d is not None and amt and amt > 0]
+    found = []
+    for cluster in _cluster_by_amount(charges):
+        dates = sorted({d for d, _ in cluster})  # same-day repeats count once
+        if len(dates) < 2:
+            continue
+        gaps = [(b - a).days for a, b in zip(dates, dates[1:])]
+        med = statistics.median(gaps)
+        for name, period, tol, min_occ in PERIODS:
+            if len(dates) < min_occ or abs(med - period) > tol:
+                continue
+            confidence = sum(1 for g in gaps if abs(g - period) <= tol) / len(gaps)
+            if confidence < MIN_CONFIDENCE:
+                continue
+            found.append({
+                "period": name,
+                "interval_days": float(med),
+                "amount": statistics.median(amt for _, amt in cluster).quantize(Decimal("0.01")),
+                "occurrences": len(dates),
+                "first_seen": dates[0],
+                "last_seen": dates[-1],
+                "next_expected": dates[-1] + datetime.timedelta(days=round(med)),
+                "confidence": round(confidence, 2),
+            })
+            break
+    return found
+
+
+def _charges_qs(user_id):
+    return (
+        Receipt.objects.filter(user_id=user_id)
+        .annotate(d=receipt_date_expr())
+        .values_list("merchant", "d", "total", "currency")
+    )
+
+
+def _rows_for(user_id, merchant: str, charges: list) -> list[RecurringCharge]:
+    if merchant.strip().lower() in IGNORED_MERCHANTS:
+        return []
+    currency = (charges[-1][2] or "USD") if charges else "USD"
+    return [
+        RecurringCharge(user_id=user_id, merchant=merchant, currency=currency, **hit)
+        for hit in detect((d, total) for d, total, _ in charges if d is not None)
+    ]
+
+
+def refresh_merchant(user_id, merchant: str) -> int:
+    """Incremental update: re-detect a single (user, merchant) and replace its rows."""
+    charges = [(d, total, cur) for _, d, total, cur in _charges_qs(user_id).filter(merchant=merchant)]
+    rows = _rows_for(user_id, merchant, charges)
+    with transaction.atomic():
+        RecurringCharge.objects.filter(user_id=user_id, merchant=merchant).delete()
+        RecurringCharge.objects.bulk_create(rows)
+    return len(rows)
+
+
+def recompute_user(user_id) -> int:
+    """Full rebuild of a user's RecurringCharge rows (one ordered scan of their receipts)."""
+    rows: list[RecurringCharge] = []
+    scan = _charges_qs(user_id).order_by("merchant").iterator(chunk_size=2000)
+    for merchant, group in groupby(scan, key=lambda r: r[0]):
+        rows.extend(_rows_for(user_id, merchant or "", [(d, total, cur) for _, d, total, cur in group]))
+    with transaction.atomic():
+        RecurringCharge.objects.filter(user_id=user_id).delete()
+        RecurringCharge.objects.bulk_create(rows)
+    return len(rows)
+
+
+def schedule_refresh(user_id, merchant: str) -> None:
+    """Refresh after the surrounding transaction commits; never fails the caller."""
+    def _run():
+        try:
+            refresh_merchant(user_id, merchant)
+        except Exception:
+            pass
+    transaction.on_commit(_run)
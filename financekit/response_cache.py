@@ -0,0 +1,253 @@
+"""
+Per-user versioned response cache for read endpoints.
+
+Every write to Receipt/ReceiptItem bumps a per-user data version (see signals.py).
+Cached payloads and ETags are derived from that version, so invalidation is
+implicit: stale entries are simply never addressed again and age out by TTL.
+
+The version counter must be visible to every worker, so caching is bypassed
+when the default cache is process-local (LocMem/Dummy) unless
+RESPONSE_CACHE_LOCAL allows it (single-process servers and tests).
+
+A request whose reads were routed to a replica may see data older than the
+version it is keyed by, so it can be served a cached payload but never stores
+what it computed (and sends no ETag for it).
+"""
+from __future__ import annotations
+import asyncio
+import hashlib
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+from .db_router import PRIMARY, current_read_db
+from .metrics import RESPONSE_CACHE
+
+
+_PROCESS_LOCAL_BACKENDS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+def cache_is_shared() -> bool:
+    """True when every worker sees the same version counters (or RESPONSE_CACHE_LOCAL says one process is fine)."""
+    if getattr(settings, "RESPONSE_CACHE_LOCAL", False):
+        return True
+    backend = settings.CACHES.get("default", {}).get("BACKEND", "")
+    return backend not in _PROCESS_LOCAL_BACKENDS
+
+
+def _version_key(user_id) -> str:
+    return f"dv:user:{user_id}"
+
+
+def _seed() -> int:
+    # Time-based seed: if the counter is evicted, a re-seeded value never
+    # collides with a version that already has cached payloads.
+    return time.time_ns() // 1000
+
+
+def data_version(user_id) -> int:
+    """Current data version for a user; 0 when the cache is unavailable."""
+    key = _version_key(user_id)
+    # A tiered cache's L1 may hold a version another worker has already bumped
+    get = getattr(cache, "get_l2", cache.get)
+    try:
+        v = get(key)
+        if v is None:
+            cache.add(key, _seed(), timeout=None)
+            v = get(key)
+        return int(v or 0)
+    except Exception:
+        return 0
+
+
+def bump_data_version(user_id) -> None:
+    key = _version_key(user_id)
+    try:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _seed(), timeout=None)
+    except Exception:
+        # Cache down: data_version() returns 0 and callers bypass caching
+        pass
+
+
+def _record(key_or_namespace: str, result: str) -> None:
+    """Count a lookup: hit, coalesced (served by another caller's compute), miss, not_modified, bypass,
+    replica (computed from a replica, not stored)."""
+    parts = key_or_namespace.split(":")
+    namespace = parts[1] if len(parts) > 2 and parts[0] == "rc" else key_or_namespace
+    RESPONSE_CACHE.inc(namespace=namespace, result=result)
+
+
+# ----- Miss coalescing -----------------------------------------------------
+
+_inflight: dict[str, list] = {}   # key -> [lock, waiters]
+_inflight_guard = threading.Lock()
+
+
+@contextmanager
+def _local_lock(key: str):
+    with _inflight_guard:
+        entry = _inflight.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _inflight_guard:
+            entry[1] -= 1
+            if entry[1] == 0:
+                _inflight.pop(key, None)
+
+
+def get_or_compute(key: str, compute: Callable[[], Any], timeout: int) -> Any:
+    """
+    Return the cached value for key, computing it at most once across
+    concurrent callers: threads in this process queue on a local lock, other
+    processes wait (bounded) on a short-lived cache lock for the owner's result.
+    """
+    hit = cache.get(key)
+    if hit is not None:
+        _record(key, "hit")
+        return hit
+    with _local_lock(key):
+        hit = cache.get(key)
+        if hit is not None:
+            _record(key, "coalesced")
+            return hit
+        lock_key = f"{key}:lock"
+        wait_s = getattr(settings, "RESPONSE_CACHE_LOCK_WAIT", 5)
+        owner = cache.add(lock_key, 1, timeout=max(1, int(wait_s) * 2))
+        if not owner:
+            deadline = time.monotonic() + wait_s
+            while time.monotonic() < deadline:
+                time.sleep(0.05)
+                hit = cache.get(key)
+                if hit is not None:
+                    _record(key, "coalesced")
+                    return hit
+            # Owner is slow or died; compute ourselves rather than fail
+        _record(key, "miss")
+        try:
+            value = compute()
+            cache.set(key, value, timeout=timeout)
+        finally:
+            if owner:
+                cache.delete(lock_key)
+        return value
+
+
+# ----- View helper -----------------------------------------------------------
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    tags = [t.strip() for t in header.split(",")]
+    return etag in tags or f"W/{etag}" in tags
+
+
+def _prepare(request, namespace: str):
+    """(key, headers, not_modified) for this request, or None when the cache is unavailable or per-process."""
+    if not cache_is_shared():
+        return None
+    user_id = request.user.pk
+    version = data_version(user_id)
+    if not version:
+        return None
+    digest = hashlib.sha1(request.build_absolute_uri().encode("utf-8")).hexdigest()
+    key = f"rc:{namespace}:{user_id}:{version}:{digest}"
+    etag = '"%s"' % hashlib.sha1(key.encode("utf-8")).hexdigest()[:24]
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    return key, headers, _etag_matches(request.META.get("HTTP_IF_NONE_MATCH", ""), etag)
+
+
+def cached_response(request, namespace: str, compute: Callable[[], Any]) -> Response:
+    """
+    Serve a GET payload from the per-user versioned cache.
+    If-None-Match is answered from the version counter alone (no DB work).
+    """
+    prep = _prepare(request, namespace)
+    if prep is None:
+        _record(namespace, "bypass")
+        return Response(compute())
+    key, headers, not_modified = prep
+    if not_modified:
+        _record(namespace, "not_modified")
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    if current_read_db() != PRIMARY:
+        hit = cache.get(key)
+        if hit is not None:
+            _record(key, "hit")
+            return Response(hit, headers=headers)
+        _record(namespace, "replica")
+        return Response(compute())
+
+    ttl = getattr(settings, "RESPONSE_CACHE_TTL", 300)
+    data = get_or_compute(key, compute, timeout=ttl)
+    return Response(data, headers=headers)
+
+
+# ----- Async variant (ASGI views) --------------------------------------------
+
+_ainflight: dict[str, asyncio.Future] = {}
+
+
+async def aget_or_compute(key: str, acompute: Callable[[], Awaitable[Any]], timeout: int) -> Any:
+    """get_or_compute for coroutines: concurrent misses in this process await one computation."""
+    hit = await cache.aget(key)
+    if hit is not None:
+        _record(key, "hit")
+        return hit
+    fut = _ainflight.get(key)
+    if fut is not None and fut.get_loop() is asyncio.get_running_loop():
+        _record(key, "coalesced")
+        return await asyncio.shield(fut)
+    _record(key, "miss")
+    fut = asyncio.get_running_loop().create_future()
+    _ainflight[key] = fut
+    try:
+        value = await acompute()
+        await cache.aset(key, value, timeout=timeout)
+        fut.set_result(value)
+        return value
+    except BaseException as e:
+        fut.set_exception(e)
+        fut.exception()  # mark retrieved when nobody else was waiting
+        raise
+    finally:
+        if _ainflight.get(key) is fut:
+            del _ainflight[key]
+
+
+async def acached_response(request, namespace: str, acompute: Callable[[], Awaitable[Any]]) -> Response:
+    prep = await sync_to_async(_prepare)(request, namespace)
+    if prep is None:
+        _record(namespace, "bypass")
+        return Response(await acompute())
+    key, headers, not_modified = prep
+    if not_modified:
+        _record(namespace, "not_modified")
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    if current_read_db() != PRIMARY:
+        hit = await cache.aget(key)
+        if hit is not None:
+            _record(key, "hit")
+            return Response(hit, headers=headers)
+        _record(namespace, "replica")
+        return Response(await acompute())
+    data = await aget_or_compute(key, acompute, timeout=getattr(settings, "RESPONSE_CACHE_TTL", 300))
+    return Response(data, headers=headers)
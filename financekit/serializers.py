@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Receipt, ReceiptItem
+from .models import AuditEvent, Receipt, ReceiptItem, RecurringCharge
 
 class DeviceRegisterSerializer(serializers.Serializer):
     device_id = serializers.CharField()
@@ -10,6 +10,10 @@ class ProcessGrantSerializer(serializers.Serializer):
     dek_wrap_srv = serializers.CharField()
     targets = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
 
+class ImageGrantSerializer(serializers.Serializer):
+    token = serializers.CharField()
+    dek_wrap_srv = serializers.CharField()
+
 class DevCreateReceiptSerializer(serializers.Serializer):
     # dev helper: insert an already-encrypted receipt row for testing
     user_id = serializers.IntegerField()
@@ -56,6 +60,42 @@ class ReceiptSerializer(serializers.ModelSerializer):
         )
 
 
+class RecurringChargeSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RecurringCharge
+        fields = (
+            "id",
+            "merchant",
+            "period",
+            "interval_days",
+            "amount",
+            "currency",
+            "occurrences",
+            "first_seen",
+            "last_seen",
+            "next_expected",
+            "confidence",
+        )
+
+
+class AuditEventSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AuditEvent
+        fields = (
+            "id",
+            "created_at",
+            "user",
+            "device_id",
+            "jti",
+            "endpoint",
+            "outcome",
+            "targets",
+            "ip",
+            "request_id",
+            "extra",
+        )
+
+
 class DevMintTokenSerializer(serializers.Serializer):
     device_id = serializers.CharField(max_length=128)
     scope = serializers.ListField(
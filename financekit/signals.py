@@ -0,0 +1,49 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Receipt, ReceiptImage, ReceiptItem
+from .db_router import mark_recent_write
+from .response_cache import bump_data_version
+
+
+def _bump(user_id):
+    if not user_id:
+        return
+    # Bump now so the writer's own follow-up reads miss, and again on commit so a
+    # concurrent reader that cached pre-commit state under the first bump is dropped.
+    bump_data_version(user_id)
+    mark_recent_write(user_id)  # read-your-writes: keep this user's reads on the primary
+    transaction.on_commit(lambda: (bump_data_version(user_id), mark_recent_write(user_id)))
+
+
+@receiver(post_save, sender=Receipt)
+@receiver(post_delete, sender=Receipt)
+def receipt_changed(sender, instance: Receipt, **kwargs):
+    _bump(instance.user_id)
+
+
+@receiver(post_delete, sender=Receipt)
+def receipt_blob_released(sender, instance: Receipt, **kwargs):
+    if instance.body_ref:
+        from .blobstore import release
+        ref = instance.body_ref
+        transaction.on_commit(lambda: release(ref))
+
+
+@receiver(post_delete, sender=ReceiptImage)
+def receipt_image_released(sender, instance: ReceiptImage, **kwargs):
+    from .blobstore import release
+    ref = instance.blob_ref
+    transaction.on_commit(lambda: release(ref))
+
+
+@receiver(post_save, sender=ReceiptItem)
+@receiver(post_delete, sender=ReceiptItem)
+def receipt_item_changed(sender, instance: ReceiptItem, **kwargs):
+    rcp = instance._state.fields_cache.get("receipt")
+    if rcp is not None:
+        user_id = rcp.user_id
+    else:
+        user_id = Receipt.objects.filter(pk=instance.receipt_id).values_list("user_id", flat=True).first()
+    _bump(user_id)
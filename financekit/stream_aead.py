@@ -0,0 +1,104 @@
+"""
+Chunked streaming AEAD (STREAM construction) for large payloads such as the
+archived receipt images.
+
+  header  = b"FKS1" | segment_size:u32 | salt[16] | nonce_prefix[7]
+  key     = HKDF-SHA256(DEK, salt, info=b"financekit/stream/v1")   per stream
+  segment = AES-GCM(key, nonce_prefix | index:u32 | last:u8, chunk, aad=header)
+
+Each plaintext segment is segment_size bytes (the last one may be shorter or
+empty). The index in the nonce rejects reordering, the last-flag rejects
+truncation and extension, and the per-stream HKDF salt keeps nonces unique
+under a long-lived DEK. Encryption and decryption hold at most two segments.
+"""
+from __future__ import annotations
+import os
+import struct
+from typing import Iterable, Iterator
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+MAGIC = b"FKS1"
+HEADER_LEN = 4 + 4 + 16 + 7
+TAG_LEN = 16
+DEFAULT_SEGMENT = 64 * 1024
+MAX_SEGMENT = 8 * 1024 * 1024
+
+
+class StreamError(ValueError):
+    """Malformed, truncated or tampered stream."""
+
+
+def _key(dek: bytes, salt: bytes) -> AESGCM:
+    return AESGCM(HKDF(algorithm=hashes.SHA256(), length=32, salt=salt, info=b"financekit/stream/v1").derive(bytes(dek)))
+
+
+def _nonce(prefix: bytes, index: int, last: bool) -> bytes:
+    if index >= 2**32:
+        raise StreamError("stream too long")
+    return prefix + struct.pack(">I?", index, last)
+
+
+def _rechunk(chunks: Iterable[bytes], size: int) -> Iterator[bytes]:
+    buf = bytearray()
+    for chunk in chunks:
+        buf += chunk
+        while len(buf) >= size:
+            yield bytes(buf[:size])
+            del buf[:size]
+    yield bytes(buf)  # final (possibly empty) segment
+
+
+def encrypt_stream(dek: bytes, chunks: Iterable[bytes], segment_size: int = DEFAULT_SEGMENT) -> Iterator[bytes]:
+    """Yield the header, then one sealed segment per segment_size bytes of plaintext."""
+    if not 0 < segment_size <= MAX_SEGMENT:
+        raise ValueError("invalid segment size")
+    salt, prefix = os.urandom(16), os.urandom(7)
+    header = MAGIC + struct.pack(">I", segment_size) + salt + prefix
+    aead = _key(dek, salt)
+    yield header
+    segments = _rechunk(chunks, segment_size)
+    cur = next(segments)
+    index = 0
+    for nxt in segments:
+        yield aead.encrypt(_nonce(prefix, index, False), cur, header)
+        cur, index = nxt, index + 1
+    yield aead.encrypt(_nonce(prefix, index, True), cur, header)
+
+
+def _read_full(f, n: int) -> bytes:
+    parts, got = [], 0
+    while got < n:
+        b = f.read(n - got)
+        if not b:
+            break
+        parts.append(b)
+        got += len(b)
+    return b"".join(parts)
+
+
+def decrypt_stream(dek: bytes, f) -> Iterator[bytes]:
+    """Yield plaintext segments from a binary file-like object; raises StreamError on tampering."""
+    header = _read_full(f, HEADER_LEN)
+    if len(header) != HEADER_LEN or header[:4] != MAGIC:
+        raise StreamError("not a stream")
+    (segment_size,) = struct.unpack(">I", header[4:8])
+    if not 0 < segment_size <= MAX_SEGMENT:
+        raise StreamError("invalid segment size")
+    salt, prefix = header[8:24], header[24:31]
+    aead = _key(dek, salt)
+    ct_len = segment_size + TAG_LEN
+    cur = _read_full(f, ct_len)
+    index = 0
+    while True:
+        nxt = _read_full(f, ct_len) if len(cur) == ct_len else b""
+        last = not nxt
+        try:
+            yield aead.decrypt(_nonce(prefix, index, last), cur, header)
+        except Exception:
+            raise StreamError(f"segment {index} failed authentication")
+        if last:
+            return
+        cur, index = nxt, index + 1
@@ -0,0 +1,98 @@
+"""
+Delta sync for mobile clients, backed by the ReceiptChange log.
+
+A cursor is "<seq>.<issued_unix_ts>". seq is the last log id the client has
+seen; the issue time lets the server detect cursors that predate compaction
+(older than SYNC_LOG_RETENTION_DAYS) and ask the client for a full reset.
+"""
+from __future__ import annotations
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Max, Prefetch
+from django.utils import timezone
+
+from .models import Receipt, ReceiptChange
+from .receipt_partitions import owned_items
+
+# Cursors issued this close to the retention cutoff are also reset, covering
+# entries whose created_at slightly precedes the cursor's issue time.
+RETENTION_MARGIN_S = 3600
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def record_change(user_id, receipt_id, op: str) -> None:
+    ReceiptChange.objects.create(user_id=user_id, receipt_id=receipt_id, op=op)
+
+
+def make_cursor(seq: int) -> str:
+    return f"{int(seq)}.{int(time.time())}"
+
+
+def parse_cursor(cursor: str) -> tuple[int, int]:
+    try:
+        seq, ts = cursor.split(".", 1)
+        return int(seq), int(ts)
+    except (ValueError, AttributeError):
+        raise InvalidCursor("invalid sync cursor")
+
+
+def head_seq(user) -> int:
+    return ReceiptChange.objects.filter(user=user).aggregate(m=Max("id"))["m"] or 0
+
+
+def changes_since(user, cursor: str | None, limit: int = 500) -> dict:
+    """
+    Changes after cursor: live rows for upserts plus tombstones for deletes.
+    Without a cursor (or with an expired one) the client must re-list and then
+    continue from the returned cursor ({"reset": true}).
+    """
+    retention_s = getattr(settings, "SYNC_LOG_RETENTION_DAYS", 30) * 86400
+    if not cursor:
+        return {"reset": True, "cursor": make_cursor(head_seq(user)), "has_more": False, "upserts": [], "deletes": []}
+    since, issued = parse_cursor(cursor)
+    if issued < time.time() - retention_s + RETENTION_MARGIN_S:
+        return {"reset": True, "cursor": make_cursor(head_seq(user)), "has_more": False, "upserts": [], "deletes": []}
+
+    log = ReceiptChange.objects.filter(user=user, id__gt=since)
+    settle = getattr(settings, "SYNC_SETTLE_SECONDS", 1)
+    if settle:
+        # Skip the newest entries so a slower concurrent commit with a lower id is not jumped over
+        log = log.filter(created_at__lte=timezone.now() - timedelta(seconds=settle))
+    entries = list(log.order_by("id").values_list("id", "receipt_id", "op")[: limit + 1])
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    latest: dict[int, str] = {}
+    for _, rid, op in entries:
+        latest[rid] = op  # later entries win
+    upsert_ids = [rid for rid, op in latest.items() if op == ReceiptChange.OP_UPSERT]
+    # Same shape as the receipt list: ciphertext stays in the row, items come from the user's partition
+    qs = Receipt.objects.filter(user=user, id__in=upsert_ids).defer(*Receipt.CIPHERTEXT_FIELDS)
+    rows = list(qs.prefetch_related(Prefetch("items", queryset=owned_items(user))).order_by("id"))
+    found = {r.id for r in rows}
+    deletes = sorted(rid for rid, op in latest.items() if op == ReceiptChange.OP_DELETE or rid not in found)
+
+    return {
+        "reset": False,
+        "cursor": make_cursor(entries[-1][0] if entries else since),
+        "has_more": has_more,
+        "upserts": rows,
+        "deletes": deletes,
+    }
+
+
+def compact(retention_days: int | None = None, batch: int = 5000) -> int:
+    """Drop log entries older than retention; cursors that old are forced to reset."""
+    days = retention_days if retention_days is not None else getattr(settings, "SYNC_LOG_RETENTION_DAYS", 30)
+    cutoff = timezone.now() - timedelta(days=days)
+    removed = 0
+    while True:
+        ids = list(ReceiptChange.objects.filter(created_at__lt=cutoff).order_by("id").values_list("id", flat=True)[:batch])
+        if not ids:
+            return removed
+        removed += ReceiptChange.objects.filter(id__in=ids).delete()[0]
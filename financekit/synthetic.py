@@ -0,0 +1,216 @@
+"""
+Synthetic receipts/items at benchmark scale (`manage.py generate_receipts`).
+
+Distributions are skewed the way real spending is: merchants follow a Zipf
+law (a few merchants get most receipts), each merchant belongs to one
+category drawn from a skewed category mix, amounts are log-normal per
+category, and items split the subtotal. Dates spread over the last N months
+with a December bump. Output is deterministic for a given seed.
+
+Rows are written in batches with explicit ids: COPY FROM STDIN on Postgres,
+executemany on SQLite. Ciphertext columns hold random bytes of realistic size
+so row widths (and TOAST/page counts) match production; those rows cannot be
+decrypted. Only derived columns are generated: no sync log or recurring rows.
+"""
+from __future__ import annotations
+import bisect
+import datetime
+import io
+import math
+import random
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Receipt, ReceiptItem
+
+CATEGORIES = {  # weight, median receipt total
+    "Groceries": (30, 48.0), "Food": (25, 17.0), "Transport": (12, 23.0), "Shopping": (12, 60.0),
+    "Bills": (8, 95.0), "Health": (5, 35.0), "Fun": (5, 28.0), "Other": (3, 20.0),
+}
+_ITEM_WORDS = ("MILK", "BREAD", "EGGS", "COFFEE", "RICE", "APPLES", "CHICKEN", "SOAP", "TICKET", "FEE",
+               "SANDWICH", "SALAD", "SHIRT", "BATTERY", "PASTA", "CHEESE", "WATER", "TEA", "JUICE", "SNACK")
+
+RECEIPT_COLUMNS = ("id", "user_id", "year", "month", "category", "body_nonce", "body_ct", "body_tag", "body_ref",
+                   "merchant", "date_str", "currency", "total", "subtotal", "tax_total", "discount_total",
+                   "fees_total", "tip_total", "raw_text", "ocr_json", "created_at")
+ITEM_COLUMNS = ("id", "receipt_id", "user_id", "desc", "qty", "price")
+_CENT = Decimal("0.01")
+
+
+class Distributions:
+    def __init__(self, rng: random.Random, merchants: int = 2000, zipf_s: float = 1.1):
+        cats = list(CATEGORIES)
+        self.merchants = []
+        for i in range(merchants):
+            cat = rng.choices(cats, weights=[CATEGORIES[c][0] for c in cats])[0]
+            self.merchants.append((f"Merchant {i:04d}", cat))
+        acc, self._cum = 0.0, []
+        for rank in range(1, merchants + 1):
+            acc += 1.0 / rank ** zipf_s
+            self._cum.append(acc)
+
+    def merchant(self, rng: random.Random) -> tuple[str, str]:
+        return self.merchants[bisect.bisect_left(self._cum, rng.random() * self._cum[-1])]
+
+
+def _money(x: float) -> Decimal:
+    return Decimal(str(max(0.0, x))).quantize(_CENT)
+
+
+def _receipt(rng: random.Random, dist: Distributions, user_id: int, months: int, today: datetime.date):
+    merchant, category = dist.merchant(rng)
+    # Dates: uniform over the window, rejection-sampled so December is ~1.3x as busy
+    while True:
+        day = today - datetime.timedelta(days=rng.randrange(max(1, months * 30)))
+        if day.month == 12 or rng.random() < 1 / 1.3:
+            break
+    subtotal = _money(rng.lognormvariate(math.log(CATEGORIES[category][1]), 0.7))
+    tax = _money(float(subtotal) * rng.choice((0, 0.05, 0.0725, 0.08, 0.1)))
+    discount = _money(float(subtotal) * rng.uniform(0.05, 0.2)) if rng.random() < 0.1 else Decimal("0.00")
+    fees = _money(rng.uniform(1, 6)) if category in ("Food", "Transport") and rng.random() < 0.15 else Decimal("0.00")
+    tip = _money(float(subtotal) * rng.choice((0.15, 0.18, 0.2))) if category == "Food" and rng.random() < 0.3 else Decimal("0.00")
+    n_items = min(30, 1 + int(rng.expovariate(1 / 3.0)))
+    weights = [rng.random() + 0.05 for _ in range(n_items)]
+    scale = sum(weights)
+    prices = [_money(float(subtotal) * w / scale) for w in weights]
+    prices[-1] = max(Decimal("0.00"), subtotal - sum(prices[:-1]))
+    items = [(f"{rng.choice(_ITEM_WORDS)} {rng.randrange(100)}", Decimal(rng.choice((1, 1, 1, 2, 3))), p) for p in prices]
+    created = timezone.make_aware(datetime.datetime.combine(day, datetime.time(rng.randrange(7, 22), rng.randrange(60))),
+                                  datetime.timezone.utc)
+    currency = "USD" if rng.random() < 0.97 else rng.choice(("EUR", "GBP"))
+    ct_len = 160 + 48 * n_items
+    row = {
+        "user_id": user_id, "year": day.year, "month": day.month, "category": category,
+        "body_nonce": rng.randbytes(12), "body_ct": rng.randbytes(ct_len), "body_tag": rng.randbytes(16), "body_ref": "",
+        "merchant": merchant, "date_str": day.isoformat(), "currency": currency,
+        "total": subtotal + tax + fees + tip - discount, "subtotal": subtotal, "tax_total": tax,
+        "discount_total": discount, "fees_total": fees, "tip_total": tip,
+        "raw_text": "", "ocr_json": "{}", "created_at": created,
+    }
+    return row, items
+
+
+# ----- Writers -----------------------------------------------------------------
+
+def _reserve_ids(model, n: int) -> list[int]:
+    table = model._meta.db_table
+    with connection.cursor() as cur:
+        if connection.vendor == "postgresql":
+            cur.execute("SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s)", [table, n])
+            return [r[0] for r in cur.fetchall()]
+        cur.execute(f"SELECT COALESCE(MAX(id), 0) FROM {connection.ops.quote_name(table)}")
+        start = cur.fetchone()[0] + 1
+        return list(range(start, start + n))
+
+
+def _copy_value(v) -> str:
+    if v is None:
+        return r"\N"
+    if isinstance(v, (bytes, bytearray)):
+        return "\\\\x" + v.hex()
+    if isinstance(v, datetime.datetime):
+        return v.isoformat()
+    return str(v).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def _copy(table: str, columns, rows) -> None:
+    buf = io.StringIO()
+    for r in rows:
+        buf.write("\t".join(_copy_value(v) for v in r))
+        buf.write("\n")
+    buf.seek(0)
+    cols = ", ".join(connection.ops.quote_name(c) for c in columns)
+    sql = f"COPY {connection.ops.quote_name(table)} ({cols}) FROM STDIN"
+    with connection.cursor() as cur:
+        raw = cur.cursor
+        if hasattr(raw, "copy_expert"):    # psycopg2
+            raw.copy_expert(sql, buf)
+        else:                              # psycopg 3
+            with raw.copy(sql) as cp:
+                cp.write(buf.getvalue())
+
+
+def _insert(table: str, columns, rows) -> None:
+    ops = connection.ops
+    cols = ", ".join(ops.quote_name(c) for c in columns)
+    marks = ", ".join(["%s"] * len(columns))
+
+    def adapt(v):
+        if isinstance(v, datetime.datetime):
+            return ops.adapt_datetimefield_value(v)
+        if isinstance(v, Decimal):
+            return str(v)
+        return v
+
+    with connection.cursor() as cur:
+        cur.executemany(f"INSERT INTO {ops.quote_name(table)} ({cols}) VALUES ({marks})",
+                        [[adapt(v) for v in r] for r in rows])
+
+
+def _write_batch(receipts: list, items: list) -> None:
+    ids = _reserve_ids(Receipt, len(receipts))
+    item_ids = _reserve_ids(ReceiptItem, sum(len(i) for i in items))
+    r_rows, i_rows, k = [], [], 0
+    for rid, row, its in zip(ids, receipts, items):
+        r_rows.append([rid] + [row[c] for c in RECEIPT_COLUMNS[1:]])
+        for desc, qty, price in its:
+            i_rows.append((item_ids[k], rid, row["user_id"], desc, qty, price))
+            k += 1
+    write = _copy if connection.vendor == "postgresql" else _insert
+    with transaction.atomic():
+        write(Receipt._meta.db_table, RECEIPT_COLUMNS, r_rows)
+        write(ReceiptItem._meta.db_table, ITEM_COLUMNS, i_rows)
+
+
+def synth_users(n: int, prefix: str = "synth_") -> list[User]:
+    """Get or create n users named <prefix>0..n-1 (unusable passwords)."""
+    names = [f"{prefix}{i}" for i in range(n)]
+    existing = set(User.objects.filter(username__in=names).values_list("username", flat=True))
+    new = [User(username=u) for u in names if u not in existing]
+    for u in new:
+        u.set_unusable_password()
+    User.objects.bulk_create(new, batch_size=1000)
+    return list(User.objects.filter(username__in=names).order_by("id"))
+
+
+def generate(users: list[User], per_user: int, *, months: int = 24, merchants: int = 2000, seed: int = 42,
+             batch_size: int = 20000, top_up: bool = True, progress=None) -> int:
+    """
+    Write receipts (and items) until each user has per_user receipts (or add
+    per_user each when top_up=False). Returns the number of receipts written.
+    """
+    from .response_cache import bump_data_version
+    dist = Distributions(random.Random(seed), merchants)
+    today = timezone.now().date()
+    written = 0
+    for user in users:
+        have = Receipt.objects.filter(user=user).count() if top_up else 0
+        need = per_user - have if top_up else per_user
+        # Seeded per user and offset, so topping up continues the same sequence
+        rng = random.Random(f"{seed}:{user.pk}:{have}")
+        batch_r, batch_i = [], []
+        for _ in range(max(0, need)):
+            row, its = _receipt(rng, dist, user.pk, months, today)
+            batch_r.append(row)
+            batch_i.append(its)
+            if len(batch_r) >= batch_size:
+                _write_batch(batch_r, batch_i)
+                written += len(batch_r)
+                batch_r, batch_i = [], []
+                if progress:
+                    progress(written)
+        if batch_r:
+            _write_batch(batch_r, batch_i)
+            written += len(batch_r)
+            if progress:
+                progress(written)
+        if need > 0:
+            bump_data_version(user.pk)  # cached list/analytics responses are stale now
+    if written and connection.vendor == "postgresql":
+        with connection.cursor() as cur:
+            cur.execute(f"ANALYZE {connection.ops.quote_name(Receipt._meta.db_table)}")
+            cur.execute(f"ANALYZE {connection.ops.quote_name(ReceiptItem._meta.db_table)}")
+    return written
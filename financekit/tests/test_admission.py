@@ -0,0 +1,76 @@
+import threading
+import time
+from unittest import mock
+from django.test import SimpleTestCase, TestCase, override_settings
+from financekit.admission import Limiter, OCR
+from financekit.exceptions import Overloaded
+from financekit.tests import test_ingest
+
+
+@override_settings(REDIS_URL=None, T_MAX_INFLIGHT=1, T_QUEUE_MAX=1, T_QUEUE_TIMEOUT_MS=2000, T_RETRY_AFTER=7)
+class LimiterTest(SimpleTestCase):
+    def test_waiter_gets_slot_and_full_queue_is_shed(self):
+        lim = Limiter("t", "T")
+        admitted = []
+
+        def waiter():
+            with lim.admit():
+                admitted.append(True)
+
+        with lim.admit():
+            t = threading.Thread(target=waiter)
+            t.start()
+            while lim.waiting == 0:
+                time.sleep(0.001)
+            with self.assertRaises(Overloaded) as cm:  # queue (1) is full: shed immediately
+                with lim.admit():
+                    pass
+            self.assertEqual(cm.exception.wait, 7)
+        t.join(2)
+        self.assertEqual(admitted, [True])
+        self.assertEqual((lim.active, lim.waiting), (0, 0))
+
+    @override_settings(T_QUEUE_TIMEOUT_MS=30)
+    def test_queue_wait_times_out(self):
+        lim = Limiter("t", "T")
+        with lim.admit():
+            with self.assertRaises(Overloaded):
+                with lim.admit():
+                    pass
+        self.assertEqual(lim.active, 0)
+
+    @override_settings(T_MAX_INFLIGHT_HOST=1, T_QUEUE_TIMEOUT_MS=30)
+    async def test_async_admit_uses_the_async_host_semaphore(self):
+        lim = Limiter("t", "T")
+        with mock.patch.object(lim.host, "acquire", side_effect=AssertionError("blocking Redis call on the loop")), \
+                mock.patch.object(lim.host, "aacquire", mock.AsyncMock(return_value=True)) as aacquire, \
+                mock.patch.object(lim.host, "arelease", mock.AsyncMock()) as arelease:
+            async with lim.aadmit():
+                self.assertEqual(lim.active, 1)
+            arelease.assert_awaited_once()
+            aacquire.return_value = False  # host full: queue, then time out
+            with self.assertRaises(Overloaded):
+                async with lim.aadmit():
+                    pass
+        self.assertEqual((lim.active, lim.waiting), (0, 0))
+
+
+class IngestSheddingTest(TestCase):
+    setUp = test_ingest.IngestTest.setUp
+    _jwt_ingest = test_ingest.IngestTest._jwt_ingest
+    _wrap_dek = test_ingest.IngestTest._wrap_dek
+
+    @override_settings(OCR_MAX_INFLIGHT=1, OCR_QUEUE_MAX=0, OCR_RETRY_AFTER=3, REDIS_URL=None)
+    def test_ingest_returns_503_when_ocr_is_saturated(self):
+        _, wrap = self._wrap_dek()
+        data = {"token": self._jwt_ingest(), "dek_wrap_srv": wrap, "year": 2025, "month": 10,
+                "category": "Food", "image": test_ingest._tiny_png()}
+        with OCR.admit():  # another request is in OCR
+            resp = self.c.post("/api/v1/ingest/receipt", data=data)
+            self.assertEqual(resp.status_code, 503)
+            self.assertEqual(resp["Retry-After"], "3")
+            self.assertEqual(resp.json()["code"], "overloaded")
+            self.assertEqual(self.c.get("/api/v1/receipts").status_code, 200)  # cheap reads unaffected
+        data["image"].seek(0)
+        resp = self.c.post("/api/v1/ingest/receipt", data=data)  # the Retry-After retry, same grant
+        self.assertEqual(resp.status_code, 200, resp.content)
@@ -1,6 +1,9 @@
 import json
+from unittest import skipUnless
+from django.db import connection
 from django.test import TestCase, Client
 from django.contrib.auth.models import User
+from financekit.analytics import _summary_grouping_sets, _summary_portable, spend_summary
 from financekit.models import Receipt
 from decimal import Decimal
 
@@ -41,3 +44,31 @@ class AnalyticsSpendTest(TestCase):
         data = r.json()
         # total in Food for October: 12.50 + 7.25 = 19.75
         self.assertEqual(data["total"], "19.75")
+
+
+@skipUnless(connection.vendor == "postgresql", "GROUPING SETS path is Postgres-only")
+class SpendSummaryGroupingSetsTest(TestCase):
+    def setUp(self):
+        self.u = User.objects.create_user("bea", password="pass1234")
+        rows = [
+            ("Food", "Cafe A", "12.50"), ("Food", "Cafe A", "7.25"), ("Food", "Deli", "3.10"),
+            ("Grocery", "Market B", "40.00"), ("Grocery", "Cafe A", "1.15"), (None, "Shop C", "20.00"),
+            ("Other", "Kiosk", "0.40"), ("Other", "", "5.55"),
+        ]
+        for cat, merch, amt in rows:
+            Receipt.objects.create(user=self.u, year=2025, month=10, category=cat, merchant=merch, total=Decimal(amt))
+
+    def test_matches_portable_path(self):
+        for qs in (
+            Receipt.objects.filter(user=self.u),
+            Receipt.objects.filter(user=self.u, category__iexact="food"),
+            Receipt.objects.filter(user=self.u, month=1),
+        ):
+            for top in (1, 3, 10):
+                total, cats, merchs = _summary_grouping_sets(qs, top)
+                p_total, p_cats, p_merchs = _summary_portable(qs, top)
+                self.assertEqual(total, p_total)
+                self.assertEqual(sorted(cats, key=str), sorted(p_cats, key=str))
+                ranked = sorted(p_merchs, key=lambda kv: kv[1], reverse=True)[:top]
+                self.assertEqual(sorted(merchs, key=str), sorted(ranked, key=str))
+                self.assertEqual(spend_summary(qs, top)["top_merchants"], ranked)
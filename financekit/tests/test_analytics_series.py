@@ -0,0 +1,59 @@
+import datetime
+from decimal import Decimal
+from django.test import TestCase, Client
+from django.core.cache import cache
+from django.contrib.auth.models import User
+from financekit.models import Receipt
+
+
+class AnalyticsSeriesTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.u = User.objects.create_user("dana", password="pass1234")
+        self.c = Client()
+        self.c.login(username="dana", password="pass1234")
+        def mk(date_str, cat, merch, amt):
+            Receipt.objects.create(
+                user=self.u, year=int(date_str[:4]), month=int(date_str[5:7]),
+                category=cat, merchant=merch, date_str=date_str, total=Decimal(str(amt)),
+            )
+        mk("2025-01-15", "Food", "Cafe A", 10)
+        mk("2025-01-20", "Grocery", "Market B", 30)
+        mk("2025-03-02", "Food", "Cafe A", 5.5)
+
+    def test_monthly_dense(self):
+        r = self.c.get("/api/v1/analytics/spend/series?from=2025-01&to=2025-04&granularity=month")
+        self.assertEqual(r.status_code, 200, r.content)
+        data = r.json()
+        self.assertEqual(data["buckets"], ["2025-01-01", "2025-02-01", "2025-03-01", "2025-04-01"])
+        self.assertEqual(data["total"], [40.0, 0.0, 5.5, 0.0])
+        self.assertEqual(data["count"], [2, 0, 1, 0])
+
+    def test_group_by_category(self):
+        r = self.c.get("/api/v1/analytics/spend/series?from=2025-01-01&to=2025-03-31&granularity=month&group_by=category")
+        self.assertEqual(r.status_code, 200, r.content)
+        data = r.json()
+        self.assertEqual(data["groups"], ["Grocery", "Food"])
+        self.assertEqual(data["series"][1], [10.0, 0.0, 5.5])
+
+    def test_weekly_buckets_start_monday(self):
+        r = self.c.get("/api/v1/analytics/spend/series?from=2025-01-15&to=2025-01-31&granularity=week")
+        self.assertEqual(r.status_code, 200, r.content)
+        data = r.json()
+        self.assertEqual(data["buckets"][0], "2025-01-13")
+        self.assertEqual(data["total"][0], 10.0)
+        self.assertEqual(data["total"][1], 30.0)
+
+    def test_bad_params(self):
+        r = self.c.get("/api/v1/analytics/spend/series?from=2025-01&to=2025-02&granularity=hour")
+        self.assertEqual(r.status_code, 400)
+        r = self.c.get("/api/v1/analytics/spend/series?from=2020-01-01&to=2025-01-01&granularity=day")
+        self.assertEqual(r.status_code, 400)
+
+    def test_impossible_date_str_falls_back_to_created_at(self):
+        """An ISO-shaped but invalid date_str ("2025-02-30") must not be cast; created_at decides."""
+        r = Receipt.objects.create(user=self.u, year=2025, month=2, date_str="2025-02-30", total=Decimal("4"))
+        Receipt.objects.filter(pk=r.pk).update(created_at=datetime.datetime(2025, 2, 27, 12, tzinfo=datetime.timezone.utc))
+        r = self.c.get("/api/v1/analytics/spend/series?from=2025-01&to=2025-03&granularity=month")
+        self.assertEqual(r.status_code, 200, r.content)
+        self.assertEqual(r.json()["total"], [40.0, 4.0, 5.5])
@@ -0,0 +1,104 @@
+import json
+import tempfile
+from decimal import Decimal
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIHandler
+from django.test import AsyncClient, TestCase, Client, override_settings
+from django.urls import include, path
+from django.contrib.auth.models import User
+from financekit.async_views import (
+    AsyncAnalyticsSpendView, AsyncIngestReceiptView, AsyncProcessDecryptView, AsyncReceiptListView,
+)
+from financekit.models import AuditEvent, Receipt, ReceiptItem
+from financekit.tests import test_e2e, test_ingest
+
+# Same API with the ASGI views mounted in front (what ASYNC_VIEWS=1 selects)
+urlpatterns = [
+    path("api/v1/decrypt/process", AsyncProcessDecryptView.as_view()),
+    path("api/v1/ingest/receipt", AsyncIngestReceiptView.as_view()),
+    path("api/v1/receipts", AsyncReceiptListView.as_view(), name="async-receipts"),
+    path("api/v1/analytics/spend", AsyncAnalyticsSpendView.as_view()),
+    path("api/v1/", include("financekit.api_urls")),
+]
+ASYNC_URLS = override_settings(ROOT_URLCONF=__name__)
+
+
+@ASYNC_URLS
+class AsyncIngestTest(test_ingest.IngestTest):
+    """Re-runs the ingest flow against AsyncIngestReceiptView."""
+
+
+@ASYNC_URLS
+class AsyncDecryptTest(test_e2e.E2E):
+    """Re-runs decrypt + replay detection against AsyncProcessDecryptView."""
+
+    def test_unknown_device_is_audited(self):
+        rid = self._insert_receipt()
+        self.c.defaults["REMOTE_ADDR"] = "10.9.9.9"
+        _, p, sig = self._jwt(rid).split(".")
+        token = ".".join([test_e2e.b64url(json.dumps({"alg": "EdDSA", "kid": "nope"}).encode()), p, sig])
+        r = self.c.post("/api/v1/decrypt/process", data={"token": token, "dek_wrap_srv": "x", "targets": [rid]},
+                        content_type="application/json")
+        self.assertEqual(r.status_code, 403, r.content)
+        self.assertTrue(AuditEvent.objects.filter(endpoint="decrypt/process", outcome="unknown_device").exists())
+
+
+class AsyncReadViewsMatchSyncTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.u = User.objects.create_user("lou", password="pass1234")
+        self.c = Client()
+        self.c.login(username="lou", password="pass1234")
+        for i in range(25):
+            r = Receipt.objects.create(
+                user=self.u, year=2025, month=1 + i % 2, category="Food" if i % 3 else "Fun",
+                merchant=f"M{i % 4}", date_str=f"2025-0{1 + i % 2}-1{i % 9}", total=Decimal("2.50") + i,
+            )
+            ReceiptItem.objects.create(receipt=r, desc="thing", price=Decimal("1.00"))
+
+    def _both(self, url):
+        sync = self.c.get(url)
+        cache.clear()  # make the async view compute rather than reuse the cached payload
+        with ASYNC_URLS:
+            asy = self.c.get(url)
+        self.assertEqual(sync.status_code, asy.status_code)
+        return sync.json(), asy.json()
+
+    def test_receipt_list_pages(self):
+        for url in ("/api/v1/receipts", "/api/v1/receipts?page=2", "/api/v1/receipts?category=fun"):
+            sync, asy = self._both(url)
+            self.assertEqual(sync, asy)
+        with ASYNC_URLS:
+            self.assertEqual(self.c.get("/api/v1/receipts?page=9").status_code, 404)
+
+    def test_analytics_spend(self):
+        for url in ("/api/v1/analytics/spend", "/api/v1/analytics/spend?month=2025-01&category=Food"):
+            sync, asy = self._both(url)
+            self.assertEqual(sync, asy)
+
+
+class AsyncMiddlewareChainTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.u = User.objects.create_user("ash", password="pass1234", is_staff=True)
+        Receipt.objects.create(user=self.u, year=2025, month=1, category="Food", merchant="M",
+                               date_str="2025-01-01", total=Decimal("1.00"))
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_financekit_middleware_is_not_adapted_under_asgi(self):
+        with override_settings(DEBUG=True, PROFILING_ENABLED=True, ASYNC_VIEWS=True), \
+                self.assertLogs("django.request", "DEBUG") as logs:
+            ASGIHandler()
+            logs.output.append("DEBUG:django.request:sentinel")  # assertLogs needs one record
+        self.assertEqual([m for m in logs.output if "financekit" in m], [])
+
+    async def test_async_chain_traces_and_profiles(self):
+        c = AsyncClient()
+        await c.aforce_login(self.u)
+        with ASYNC_URLS, override_settings(PROFILING_ENABLED=True, PROFILE_DIR=self.tmp.name, SERVER_TIMING=True):
+            r = await c.get("/api/v1/receipts", headers={"X-Request-ID": "async-1", "X-Profile": "1"})
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r["X-Request-ID"], "async-1")
+        self.assertEqual(r["X-Profile-ID"], "async-1")
+        self.assertIn("db;dur=", r["Server-Timing"])
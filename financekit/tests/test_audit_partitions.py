@@ -0,0 +1,110 @@
+from datetime import datetime, timezone as dt_tz
+from io import StringIO
+from django.core.management import call_command
+from django.db import connection
+from unittest import skipIf, skipUnless
+from django.test import TestCase, TransactionTestCase, Client
+from django.contrib.auth.models import User
+from django.utils import timezone
+from django.core.management.base import CommandError
+from financekit.audit_partitions import (
+    DEFAULT, LEGACY, _add_months, _list_tables, _month_start, partition_name, pg_convert, pg_default_rows, pg_ensure,
+    pg_is_partitioned,
+)
+from financekit.models import AuditEvent
+
+
+@skipIf(connection.vendor == "postgresql", "rolling archive tables are the SQLite layout; see AuditConvertPostgresTest")
+class AuditPartitionsTest(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user("ivy", password="pass1234", is_staff=True)
+        self.c = Client()
+        self.c.login(username="ivy", password="pass1234")
+        now = timezone.now()
+        self.this_month = _month_start(now.date())
+        for months_back, n in ((0, 3), (1, 2), (2, 2), (14, 1)):
+            m = _add_months(self.this_month, -months_back)
+            for i in range(n):
+                AuditEvent.objects.create(
+                    created_at=datetime(m.year, m.month, 1 + i, 12, tzinfo=dt_tz.utc)
+                    if months_back else now,
+                    user=self.admin if i % 2 == 0 else None,
+                    endpoint="ingest",
+                    outcome="success" if i else "replay",
+                )
+
+    def test_roll_drop_and_keyset_query_across_partitions(self):
+        call_command("audit_partitions", "--retention-months", "12", stdout=StringIO())
+        tables = set(connection.introspection.table_names())
+        for back in (1, 2):
+            self.assertIn(partition_name(_add_months(self.this_month, -back)), tables)
+        # 14 months old: rolled out of the live table then dropped by retention
+        self.assertNotIn(partition_name(_add_months(self.this_month, -14)), tables)
+        self.assertEqual(AuditEvent.objects.count(), 3)
+
+        seen, cursor = [], ""
+        while True:
+            r = self.c.get(f"/api/v1/audit/events?limit=2&cursor={cursor}").json()
+            seen += r["results"]
+            cursor = r["next_cursor"]
+            if not cursor:
+                break
+        self.assertEqual(len(seen), 7)
+        stamps = [(e["created_at"], e["id"]) for e in seen]
+        self.assertEqual(stamps, sorted(stamps, reverse=True))
+
+        last = _add_months(self.this_month, -1)
+        r = self.c.get(f"/api/v1/audit/events?from={last}&to={last.replace(day=28)}&outcome=success").json()
+        self.assertEqual(len(r["results"]), 1)
+        r = self.c.get(f"/api/v1/audit/events?user={self.admin.id}").json()
+        self.assertEqual(len(r["results"]), 4)
+
+    def test_staff_only_and_bad_cursor(self):
+        User.objects.create_user("joe", password="pass1234")
+        c = Client()
+        c.login(username="joe", password="pass1234")
+        self.assertEqual(c.get("/api/v1/audit/events").status_code, 403)
+        self.assertEqual(self.c.get("/api/v1/audit/events?cursor=!!").status_code, 400)
+
+
+@skipUnless(connection.vendor == "postgresql", "declarative partitioning is Postgres-only")
+class AuditConvertPostgresTest(TransactionTestCase):
+    def test_live_table_keeps_accepting_writes_after_conversion(self):
+        u = User.objects.create_user("kim", password="pass1234")
+        AuditEvent.objects.create(user=u, endpoint="ingest", outcome="success")  # current month, pre-conversion
+        old = _add_months(_month_start(timezone.now().date()), -3)
+        AuditEvent.objects.create(created_at=datetime(old.year, old.month, 2, tzinfo=dt_tz.utc),
+                                  endpoint="ingest", outcome="success")
+        before = self._indexes("financekit_auditevent")
+        self.assertTrue(pg_convert(months_ahead=1))
+        ev = AuditEvent.objects.create(user=u, endpoint="ingest", outcome="replay")
+        self.assertEqual(AuditEvent.objects.count(), 3)
+        self.assertTrue(AuditEvent.objects.filter(pk=ev.pk, outcome="replay").exists())
+        tables = set(_list_tables())
+        self.assertIn(LEGACY, tables)
+        self.assertIn(partition_name(_add_months(_month_start(timezone.now().date()), 1)), tables)
+        # ATTACH adopted existing/pre-built indexes rather than building any on the legacy rows
+        self.assertEqual(self._indexes(LEGACY) - before, {LEGACY + "_pkey", LEGACY + "_created_brin"})
+
+    @staticmethod
+    def _indexes(table):
+        with connection.cursor() as cur:
+            cur.execute("SELECT indexname FROM pg_indexes WHERE tablename = %s", [table])
+            return {r[0] for r in cur.fetchall()}
+
+    def test_month_without_partition_lands_in_default_then_moves(self):
+        pg_convert(months_ahead=0)  # no-op when an earlier test already converted
+        self.assertTrue(pg_is_partitioned())
+        this_month = _month_start(timezone.now().date())
+        later = _add_months(this_month, 4)
+        AuditEvent.objects.create(created_at=datetime(later.year, later.month, 3, tzinfo=dt_tz.utc),
+                                  endpoint="ingest", outcome="success")  # no partition for that month yet
+        self.assertEqual(pg_default_rows(), 1)
+        with self.assertRaises(CommandError):
+            call_command("audit_partitions", "--ahead", "1", stdout=StringIO())
+        self.assertIn(partition_name(later), pg_ensure(months_ahead=4))
+        self.assertEqual(pg_default_rows(), 0)
+        with connection.cursor() as cur:
+            cur.execute(f"SELECT COUNT(*) FROM {partition_name(later)}")
+            self.assertEqual(cur.fetchone()[0], 1)
+        self.assertIn(DEFAULT, _list_tables())
@@ -0,0 +1,45 @@
+import base64, json
+from django.test import TestCase, Client
+from django.contrib.auth.models import User
+from financekit.audit import AuditSink
+from financekit.models import AuditEvent
+from financekit.tests.test_ingest import _tiny_png
+
+
+def _ev(outcome="success"):
+    return dict(user_id=None, device_id="d", jti="", endpoint="decrypt/process", outcome=outcome,
+                targets=[], ip="127.0.0.1", request_id="", extra={})
+
+
+class AuditSinkTest(TestCase):
+    def test_memory_batches_on_size(self):
+        sink = AuditSink(mode="memory", batch_size=3, flush_interval=0, max_queue=100)
+        sink.emit(**_ev())
+        sink.emit(**_ev())
+        self.assertEqual(AuditEvent.objects.count(), 0)
+        sink.emit(**_ev())
+        self.assertEqual(AuditEvent.objects.count(), 3)
+        self.assertEqual(sink.stats()["written"], 3)
+
+    def test_bounded_queue_drops_and_close_flushes(self):
+        sink = AuditSink(mode="memory", batch_size=100, flush_interval=0, max_queue=2)
+        for _ in range(5):
+            sink.emit(**_ev("throttled"))
+        self.assertEqual(sink.stats()["dropped"], 3)
+        sink.close()
+        self.assertEqual(AuditEvent.objects.filter(outcome="throttled").count(), 2)
+        self.assertEqual(sink.stats()["queued"], 0)
+
+
+class IngestAuditTest(TestCase):
+    def test_unknown_device_is_audited(self):
+        u = User.objects.create_user("ivan", password="pass1234")
+        c = Client()
+        c.login(username="ivan", password="pass1234")
+        header = base64.urlsafe_b64encode(json.dumps({"alg": "EdDSA", "kid": "nope"}).encode()).decode().rstrip("=")
+        r = c.post("/api/v1/ingest/receipt", data={
+            "token": f"{header}.e30.sig", "dek_wrap_srv": "x", "year": 2025, "month": 1,
+            "category": "Food", "image": _tiny_png(),
+        })
+        self.assertEqual(r.status_code, 403, r.content)
+        self.assertTrue(AuditEvent.objects.filter(endpoint="ingest/receipt", outcome="unknown_device", user=u).exists())
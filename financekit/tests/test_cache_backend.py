@@ -0,0 +1,102 @@
+import json
+from unittest import mock
+from django.contrib.auth.models import User
+from django.test import Client, SimpleTestCase, TestCase
+from financekit.cache_backend import LocalLRU, TieredCache, _MISSING
+
+
+class LocalLRUTest(SimpleTestCase):
+    def test_lru_eviction_and_expiry(self):
+        lru = LocalLRU(2)
+        lru.set("a", {"v": 1}, 10)
+        lru.set("b", 2, 10)
+        self.assertEqual(lru.get("a"), {"v": 1})  # touch a -> b is oldest
+        lru.set("c", 3, 10)
+        self.assertIs(lru.get("b"), _MISSING)
+        with mock.patch("financekit.cache_backend.time.monotonic", return_value=10**9):
+            self.assertIs(lru.get("a"), _MISSING)
+
+    def test_values_are_copies(self):
+        lru = LocalLRU(4)
+        v = [1]
+        lru.set("k", v, 10)
+        v.append(2)
+        self.assertEqual(lru.get("k"), [1])
+
+
+class TieredInvalidationTest(SimpleTestCase):
+    def setUp(self):
+        # No Redis needed: only the L1/invalidation logic is exercised
+        self.c = TieredCache("redis://127.0.0.1:1/0", {"OPTIONS": {"L1_TTL": 5, "L1_MAX_ENTRIES": 10}})
+
+    def _msg(self, node, seq, keys):
+        self.c._on_message(json.dumps({"n": node, "s": seq, "k": keys}))
+
+    def test_key_eviction_gap_flush_and_clear(self):
+        for k in ("x", "y", "z"):
+            self.c._l1.set(k, k, 5)
+        self._msg("other", 1, ["x"])
+        self.assertIs(self.c._l1.get("x"), _MISSING)
+        self.assertEqual(self.c._l1.get("y"), "y")
+        self._msg("other", 3, ["nothing"])  # seq 2 was missed -> full flush
+        self.assertEqual(len(self.c._l1), 0)
+        self.c._l1.set("y", "y", 5)
+        self._msg("third", 7, ["*"])
+        self.assertEqual(len(self.c._l1), 0)
+        self.assertEqual(self.c.stats()["invalidations_received"], 3)
+
+    def test_l1_ttl_capped_by_key_timeout(self):
+        self.assertEqual(self.c._l1_ttl_for(2), 2.0)
+        self.assertEqual(self.c._l1_ttl_for(None), 5.0)
+
+
+class HealthCacheStatsTest(TestCase):
+    def test_cache_stats_are_staff_only(self):
+        self.assertNotIn("cache", Client().get("/api/v1/health").json())
+        User.objects.create_user("ops", password="pass1234", is_staff=True)
+        c = Client()
+        c.login(username="ops", password="pass1234")
+        self.assertIn("cache", c.get("/api/v1/health").json())
+
+
+class _SharedL2:
+    """Dict standing in for Redis behind two TieredCache workers; pub/sub is down, so no L1 eviction."""
+
+    def __init__(self):
+        self.d = {}
+
+    def get(self, key, default=None):
+        return self.d.get(key, default)
+
+    def add(self, key, value, timeout):
+        return self.d.setdefault(key, value) is value
+
+    def incr(self, key, delta=1):
+        if key not in self.d:
+            raise ValueError(key)
+        self.d[key] += delta
+        return self.d[key]
+
+    def get_client(self, *args, **kwargs):
+        raise ConnectionError("pub/sub unavailable")
+
+
+class DataVersionTieredTest(SimpleTestCase):
+    def _worker(self, l2):
+        c = TieredCache("redis://127.0.0.1:1/0", {"OPTIONS": {"L1_TTL": 60}})
+        c._cache, c._sub_thread, c._subscribed = l2, object(), True  # L1 active, no listener thread
+        return c
+
+    def test_bump_on_one_worker_is_read_on_another(self):
+        """A version bumped elsewhere is seen even while this worker's L1 still holds the old one."""
+        from financekit import response_cache
+        l2 = _SharedL2()
+        a, b = self._worker(l2), self._worker(l2)
+        with mock.patch.object(response_cache, "cache", a):
+            before = response_cache.data_version(7)
+        a._l1.set(a.make_key("dv:user:7"), before, 60)
+        with mock.patch.object(response_cache, "cache", b):
+            response_cache.bump_data_version(7)
+        self.assertEqual(a.get("dv:user:7"), before)  # L1 is stale: the invalidation was lost
+        with mock.patch.object(response_cache, "cache", a):
+            self.assertEqual(response_cache.data_version(7), before + 1)
@@ -0,0 +1,64 @@
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, Client, override_settings
+from financekit import db_router
+from financekit.models import Receipt
+
+
+@override_settings(DATABASE_REPLICAS=["replica1", "replica2"], REPLICA_MAX_LAG_SECONDS=5)
+class ReplicaRoutingTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.u = User.objects.create_user("rhea", password="pass1234")
+        cache.clear()  # drop the marker left by the signup itself, if any
+
+    def test_choose_skips_lagging_and_unreachable_replicas(self):
+        lags = {"replica1": 30.0, "replica2": 0.5}
+        with mock.patch.object(db_router, "replica_lag", side_effect=lags.get):
+            self.assertEqual(db_router.choose_read_db(self.u.pk), "replica2")
+        lags["replica2"] = None  # lag check failed
+        with mock.patch.object(db_router, "replica_lag", side_effect=lags.get):
+            self.assertEqual(db_router.choose_read_db(self.u.pk), "default")
+
+    def test_recent_write_pins_user_to_primary(self):
+        with mock.patch.object(db_router, "replica_lag", return_value=0.0):
+            self.assertIn(db_router.choose_read_db(self.u.pk), ("replica1", "replica2"))
+            Receipt.objects.create(user=self.u, year=2025, month=10, category="Food")
+            self.assertTrue(db_router.recently_wrote(self.u.pk))
+            self.assertEqual(db_router.choose_read_db(self.u.pk), "default")
+
+    def test_router_follows_request_context(self):
+        router = db_router.ReplicaRouter()
+        self.assertEqual(router.db_for_read(Receipt), "default")
+        token = db_router._read_alias.set("replica1")
+        try:
+            self.assertEqual(router.db_for_read(Receipt), "replica1")
+            self.assertEqual(router.db_for_write(Receipt), "default")
+        finally:
+            db_router._read_alias.reset(token)
+
+    def test_only_read_views_choose_a_replica(self):
+        c = Client()
+        c.login(username="rhea", password="pass1234")
+        # Route to "default" so the test DB still serves the query
+        with mock.patch.object(db_router, "choose_read_db", return_value="default") as choose:
+            self.assertEqual(c.get("/api/v1/receipts").status_code, 200)
+            choose.assert_called_once_with(self.u.pk)
+            c.get("/api/v1/recurring")
+            self.assertEqual(choose.call_count, 1)
+        self.assertIsNone(db_router._read_alias.get())
+
+    @override_settings(RESPONSE_CACHE_LOCAL=True)
+    def test_replica_results_are_not_cached(self):
+        from financekit import response_cache
+        c = Client()
+        c.login(username="rhea", password="pass1234")
+        with mock.patch.object(response_cache, "current_read_db", return_value="replica1"):
+            r = c.get("/api/v1/receipts")
+            self.assertEqual(r.status_code, 200)
+            self.assertNotIn("ETag", r)  # a lagging replica's payload must not be tagged with the current version
+        primary = c.get("/api/v1/receipts")
+        self.assertIn("ETag", primary)  # computed on the primary, so now stored
+        with mock.patch.object(response_cache, "current_read_db", return_value="replica1"):
+            self.assertEqual(c.get("/api/v1/receipts")["ETag"], primary["ETag"])
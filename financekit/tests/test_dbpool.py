@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connections
+from django.test import TestCase, Client
+from financekit import dbpool
+
+
+class DbPoolStatsTest(TestCase):
+    def test_connect_and_close_are_recorded(self):
+        before = dbpool.stats()
+        conn = connections.create_connection("default")
+        try:
+            conn.ensure_connection()
+            mid = dbpool.stats()
+            self.assertEqual(mid["connects"], before["connects"] + 1)
+            self.assertEqual(mid["open_connections"], before["open_connections"] + 1)
+            self.assertIsNotNone(mid["connect_ms_avg"])
+            self.assertGreaterEqual(mid["connection_age_s_max"], 0)
+            # sqlite ignores close() on the in-memory test DB, so close the raw handle
+            conn._close()
+            conn.connection = None
+        finally:
+            conn.close()
+        after = dbpool.stats()
+        self.assertEqual(after["closes"], before["closes"] + 1)
+        self.assertEqual(after["open_connections"], before["open_connections"])
+
+    def test_health_exposes_pool_stats_to_staff(self):
+        self.assertNotIn("db_pool", Client().get("/api/v1/health").json())
+        User.objects.create_user("ops", password="pass1234", is_staff=True)
+        c = Client()
+        c.login(username="ops", password="pass1234")
+        body = c.get("/api/v1/health").json()
+        self.assertIn("db_pool", body)
+        self.assertEqual(body["db_pool"]["mode"], settings.DB_POOL_MODE)
+        self.assertEqual(body["db_pool"]["server"], settings.SERVER_INTERFACE)
+        if settings.SERVER_INTERFACE == "asgi":
+            self.assertNotEqual(body["db_pool"]["mode"], "persistent")
@@ -0,0 +1,58 @@
+import csv, datetime, gzip, io, json
+from decimal import Decimal
+from django.test import TestCase, Client
+from django.core.cache import cache
+from django.contrib.auth.models import User
+from financekit.models import Receipt, ReceiptItem
+
+
+class ExportTest(TestCase):
+    def setUp(self):
+        cache.clear()  # throttle history
+        self.u = User.objects.create_user("gina", password="pass1234")
+        self.c = Client()
+        self.c.login(username="gina", password="pass1234")
+        r1 = Receipt.objects.create(
+            user=self.u, year=2025, month=1, category="Food", merchant="Cafe A",
+            date_str="2025-01-05", total=Decimal("7.85"), body_ct=b"secret",
+        )
+        ReceiptItem.objects.create(receipt=r1, desc="Latte", price=Decimal("4.50"))
+        ReceiptItem.objects.create(receipt=r1, desc="Muffin", price=Decimal("3.35"))
+        Receipt.objects.create(
+            user=self.u, year=2025, month=2, category="Grocery", merchant="Market B",
+            date_str="2025-02-01", total=Decimal("20.00"),
+        )
+
+    def _body(self, resp):
+        data = b"".join(resp.streaming_content)
+        if resp.get("Content-Encoding") == "gzip":
+            data = gzip.decompress(data)
+        return data.decode("utf-8")
+
+    def test_csv_rows_per_item(self):
+        r = self.c.get("/api/v1/receipts/export?fmt=csv")
+        self.assertEqual(r.status_code, 200)
+        rows = list(csv.DictReader(io.StringIO(self._body(r))))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual([x["item_desc"] for x in rows], ["Latte", "Muffin", ""])
+        self.assertNotIn("secret", self._body(self.c.get("/api/v1/receipts/export")))
+
+    def test_jsonl_gzip_with_filters(self):
+        r = self.c.get("/api/v1/receipts/export?fmt=jsonl&from=2025-01&to=2025-01", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r["Content-Encoding"], "gzip")
+        lines = [json.loads(x) for x in self._body(r).splitlines()]
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(lines[0]["merchant"], "Cafe A")
+        self.assertEqual(len(lines[0]["items"]), 2)
+
+    def test_category_filter_and_bad_fmt(self):
+        r = self.c.get("/api/v1/receipts/export?fmt=jsonl&category=grocery")
+        self.assertEqual([json.loads(x)["merchant"] for x in self._body(r).splitlines()], ["Market B"])
+        self.assertEqual(self.c.get("/api/v1/receipts/export?fmt=xml").status_code, 400)
+
+    def test_date_filter_tolerates_impossible_date_str(self):
+        bad = Receipt.objects.create(user=self.u, year=2025, month=2, merchant="Kiosk", date_str="2025-02-30", total=Decimal("1"))
+        Receipt.objects.filter(pk=bad.pk).update(created_at=datetime.datetime(2025, 2, 27, tzinfo=datetime.timezone.utc))
+        r = self.c.get("/api/v1/receipts/export?fmt=jsonl&from=2025-02&to=2025-02")
+        self.assertEqual([json.loads(x)["merchant"] for x in self._body(r).splitlines()], ["Market B", "Kiosk"])
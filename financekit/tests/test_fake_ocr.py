@@ -0,0 +1,16 @@
+import io
+from django.test import TestCase, override_settings
+from financekit.ocr_engine import run
+from PIL import Image
+
+
+class FakeOcrEngineTest(TestCase):
+    @override_settings(OCR_ENGINE="fake")
+    def test_fake_engine_runs_the_rest_of_the_pipeline(self):
+        buf = io.BytesIO()
+        Image.new("RGB", (32, 32), (255, 255, 255)).save(buf, format="PNG")
+        parsed = run(buf.getvalue())
+        self.assertNotEqual(parsed["merchant"], "Unknown")
+        self.assertTrue(parsed["items"])
+        self.assertAlmostEqual(parsed["total"], parsed["subtotal"] + parsed["tax_total"], places=2)
+        self.assertEqual(run(buf.getvalue()), parsed)  # deterministic per image
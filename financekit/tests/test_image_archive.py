@@ -0,0 +1,74 @@
+import io, json, os, tempfile, time, uuid
+from django.test import TestCase, override_settings
+from financekit.models import ReceiptImage
+from financekit.stream_aead import StreamError, decrypt_stream, encrypt_stream
+from financekit.tests import test_ingest
+from PIL import Image
+
+
+class StreamAEADTest(TestCase):
+    def _roundtrip(self, data: bytes, seg: int) -> bytes:
+        dek = os.urandom(32)
+        blob = b"".join(encrypt_stream(dek, [data[i:i + 7] for i in range(0, len(data), 7)], seg))
+        return b"".join(decrypt_stream(dek, io.BytesIO(blob)))
+
+    def test_roundtrip_at_segment_boundaries(self):
+        for n in (0, 1, 63, 64, 65, 640):
+            data = os.urandom(n)
+            self.assertEqual(self._roundtrip(data, 64), data, n)
+
+    def test_truncation_reorder_and_wrong_key_are_rejected(self):
+        dek = os.urandom(32)
+        parts = list(encrypt_stream(dek, [os.urandom(200)], 64))  # header + 4 segments
+        header, segs = parts[0], parts[1:]
+        bad = {
+            "truncated": header + b"".join(segs[:-1]),
+            "reordered": header + segs[1] + segs[0] + b"".join(segs[2:]),
+        }
+        for name, blob in bad.items():
+            with self.assertRaises(StreamError, msg=name):
+                b"".join(decrypt_stream(dek, io.BytesIO(blob)))
+        with self.assertRaises(StreamError):
+            b"".join(decrypt_stream(os.urandom(32), io.BytesIO(b"".join(parts))))
+
+
+class ImageArchiveFlowTest(TestCase):
+    # Reuse the ingest test's user/device setup without re-running its tests
+    setUp = test_ingest.IngestTest.setUp
+    _wrap_dek = test_ingest.IngestTest._wrap_dek
+
+    def _jwt(self, scope):
+        now = int(time.time())
+        H = test_ingest.b64url(json.dumps({"alg": "EdDSA", "typ": "JWT", "kid": "dev-1"}).encode())
+        P = test_ingest.b64url(json.dumps({"sub": str(self.u.id), "scope": [scope], "iat": now, "nbf": now - 5,
+                                           "exp": now + 120, "jti": str(uuid.uuid4())}).encode())
+        return f"{H}.{P}.{test_ingest.b64url(self.sk.sign((H + '.' + P).encode()).signature)}"
+
+    def test_ingest_archives_image_and_streams_it_back(self):
+        buf = io.BytesIO()
+        Image.new("RGB", (64, 64), (0, 128, 255)).save(buf, format="PNG")
+        png = buf.getvalue()
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        with tempfile.TemporaryDirectory() as root, override_settings(
+            BLOB_BACKEND="local", BLOB_LOCAL_ROOT=root, RECEIPT_IMAGE_ARCHIVE=True, IMAGE_SEGMENT_SIZE=100,
+        ):
+            _, wrap = self._wrap_dek()
+            r = self.c.post("/api/v1/ingest/receipt", data={
+                "token": self._jwt("receipt:ingest"), "dek_wrap_srv": wrap, "year": 2025, "month": 10,
+                "category": "Food", "image": SimpleUploadedFile("r.png", png, content_type="image/png"),
+            })
+            self.assertEqual(r.status_code, 200, r.content)
+            rid = r.json()["receipt_id"]
+            img = ReceiptImage.objects.get(receipt_id=rid)
+            self.assertEqual(img.size, len(png))
+
+            r = self.c.post(f"/api/v1/receipts/{rid}/image", data=json.dumps(
+                {"token": self._jwt("receipt:decrypt"), "dek_wrap_srv": wrap}), content_type="application/json")
+            self.assertEqual(r.status_code, 200)
+            self.assertEqual(r["Content-Type"], "image/png")
+            self.assertEqual(b"".join(r.streaming_content), png)
+
+            _, other = self._wrap_dek()
+            r = self.c.post(f"/api/v1/receipts/{rid}/image", data=json.dumps(
+                {"token": self._jwt("receipt:decrypt"), "dek_wrap_srv": other}), content_type="application/json")
+            self.assertEqual(r.status_code, 400)
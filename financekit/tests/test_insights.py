@@ -0,0 +1,62 @@
+import datetime
+from decimal import Decimal
+import numpy as np
+from django.test import TestCase, Client
+from django.core.cache import cache
+from django.contrib.auth.models import User
+from financekit.models import Receipt
+from financekit.insights import rolling_baseline
+
+
+class InsightsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.u = User.objects.create_user("erin", password="pass1234")
+        self.c = Client()
+        self.c.login(username="erin", password="pass1234")
+
+    def mk(self, date_str, cat, merch, amt):
+        return Receipt.objects.create(
+            user=self.u, year=int(date_str[:4]), month=int(date_str[5:7]),
+            category=cat, merchant=merch, date_str=date_str, total=Decimal(str(amt)),
+        )
+
+    def test_category_spike_and_duplicate(self):
+        for mo in range(1, 7):
+            self.mk(f"2025-{mo:02d}-10", "Food", "Cafe A", 100)
+        self.mk("2025-07-10", "Food", "Cafe A", 100)
+        self.mk("2025-07-12", "Food", "Steakhouse", 250)
+        a = self.mk("2025-07-20", "Food", "Cafe A", 12.34)
+        b = self.mk("2025-07-21", "Food", "Cafe A", 12.34)
+
+        r = self.c.get("/api/v1/analytics/insights")
+        self.assertEqual(r.status_code, 200, r.content)
+        data = r.json()
+        self.assertEqual(data["months"][-1], "2025-07")
+        spike = [x for x in data["anomalies"] if x["month"] == "2025-07" and x["category"] == "Food"]
+        self.assertEqual(len(spike), 1)
+        self.assertGreaterEqual(spike[0]["ratio"], 3.0)
+        self.assertEqual(data["month_over_month"]["previous"], 100.0)
+        self.assertEqual(data["duplicates"][0]["receipt_ids"], [a.id, b.id])
+
+    def test_empty(self):
+        r = self.c.get("/api/v1/analytics/insights")
+        self.assertEqual(r.status_code, 200, r.content)
+        self.assertEqual(r.json()["anomalies"], [])
+
+    def test_impossible_date_str_uses_created_at(self):
+        """date_str="2025-02-30" is not a date: no 500, the receipt is bucketed by created_at."""
+        self.mk("2025-01-10", "Food", "Cafe A", 10)
+        bad = self.mk("2025-02-30", "Food", "Cafe A", 20)
+        Receipt.objects.filter(pk=bad.pk).update(created_at=datetime.datetime(2025, 2, 27, tzinfo=datetime.timezone.utc))
+        r = self.c.get("/api/v1/analytics/insights")
+        self.assertEqual(r.status_code, 200, r.content)
+        self.assertEqual(r.json()["months"], ["2025-01", "2025-02"])
+        self.assertEqual(r.json()["monthly_total"], [10.0, 20.0])
+
+    def test_rolling_baseline_excludes_current_month(self):
+        spend = np.array([[10.0], [20.0], [30.0], [40.0]])
+        mean, std, hist = rolling_baseline(spend, window=2)
+        self.assertEqual(list(mean[:, 0]), [0.0, 10.0, 15.0, 25.0])
+        self.assertEqual(list(hist[:, 0]), [0.0, 1.0, 2.0, 2.0])
+        self.assertAlmostEqual(std[3, 0], 5.0)
@@ -0,0 +1,80 @@
+import os
+import tempfile
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from financekit import metrics
+from financekit.models import Receipt
+
+
+class MetricsRegistryTest(TestCase):
+    def setUp(self):
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+
+    def test_counter_and_histogram_exposition(self):
+        metrics.GRANT_OUTCOMES.inc(endpoint="decrypt/process", outcome="success")
+        metrics.GRANT_OUTCOMES.inc(2, endpoint="decrypt/process", outcome="success")
+        metrics.DECRYPT_STAGE.observe(0.003, stage="aes_decrypt")
+        metrics.DECRYPT_STAGE.observe(7.0, stage="aes_decrypt")
+        text = metrics.render()
+        self.assertIn('financekit_grant_outcomes_total{endpoint="decrypt/process",outcome="success"} 3', text)
+        self.assertIn('financekit_decrypt_stage_seconds_bucket{stage="aes_decrypt",le="0.0025"} 0', text)
+        self.assertIn('financekit_decrypt_stage_seconds_bucket{stage="aes_decrypt",le="0.005"} 1', text)
+        self.assertIn('financekit_decrypt_stage_seconds_bucket{stage="aes_decrypt",le="+Inf"} 2', text)
+        self.assertIn('financekit_decrypt_stage_seconds_count{stage="aes_decrypt"} 2', text)
+        with self.assertRaises(ValueError):
+            metrics.GRANT_OUTCOMES.inc(endpoint="x")
+
+    def test_worker_files_are_merged(self):
+        with tempfile.TemporaryDirectory() as d, override_settings(METRICS_DIR=d):
+            metrics.RESPONSE_CACHE.inc(namespace="receipts", result="hit")
+            # Another (possibly exited) worker's file in the same directory
+            other = metrics._FileValues(os.path.join(d, "fk_999999.db"))
+            other.add('financekit_response_cache_total\x00namespace="receipts",result="hit"', 4.0)
+            other.add('financekit_response_cache_total\x00namespace="receipts",result="miss"', 1.0)
+            other._m.close()
+            other._f.close()
+            text = metrics.render()
+            self.assertIn('financekit_response_cache_total{namespace="receipts",result="hit"} 5', text)
+            self.assertIn('financekit_response_cache_total{namespace="receipts",result="miss"} 1', text)
+            metrics.reset()
+
+
+class MetricsEndpointTest(TestCase):
+    def setUp(self):
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+        cache.clear()
+        self.u = User.objects.create_user("mona", password="pass1234")
+        Receipt.objects.create(user=self.u, year=2025, month=10, category="Food",
+                               merchant="Cafe", date_str="2025-10-01", total=Decimal("3.00"))
+        self.c = Client()
+        self.c.login(username="mona", password="pass1234")
+
+    @override_settings(RESPONSE_CACHE_LOCAL=True, METRICS_TOKEN="s3cret")
+    def test_cache_lookups_are_exposed(self):
+        self.c.get("/api/v1/receipts")
+        self.c.get("/api/v1/receipts")
+        r = Client().get("/metrics", HTTP_AUTHORIZATION="Bearer s3cret")
+        self.assertEqual(r.status_code, 200)
+        self.assertTrue(r["Content-Type"].startswith("text/plain; version=0.0.4"))
+        body = r.content.decode()
+        self.assertIn('financekit_response_cache_total{namespace="receipts",result="miss"} 1', body)
+        self.assertIn('financekit_response_cache_total{namespace="receipts",result="hit"} 1', body)
+
+    @override_settings(METRICS_TOKEN="s3cret")
+    def test_token_required_when_configured(self):
+        self.assertEqual(Client().get("/metrics").status_code, 401)
+        self.assertEqual(Client().get("/metrics", HTTP_AUTHORIZATION="Bearer s3cret").status_code, 200)
+
+    @override_settings(METRICS_TOKEN="")
+    def test_fails_closed_without_token(self):
+        """No token configured: anonymous and regular users are refused, staff may read."""
+        self.assertEqual(Client().get("/metrics").status_code, 403)
+        self.assertEqual(self.c.get("/metrics").status_code, 403)
+        User.objects.create_user("ops", password="pass1234", is_staff=True)
+        staff = Client()
+        staff.login(username="ops", password="pass1234")
+        self.assertEqual(staff.get("/metrics").status_code, 200)
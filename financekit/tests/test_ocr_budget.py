@@ -0,0 +1,67 @@
+import io
+import time
+from django.test import SimpleTestCase, TestCase, override_settings
+from financekit import metrics
+from financekit.ocr_engine import OcrDeferred, run
+from financekit.ocr_engine.reader import decode_scale
+from financekit.tests import test_ingest
+from PIL import Image
+
+
+def _png(size=(32, 32)) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", size, (255, 255, 255)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+@override_settings(OCR_ENGINE="fake", OCR_FAKE_DELAY_MS=300, OCR_TESSERACT_BUDGET_MS=20)
+class OcrBudgetTest(SimpleTestCase):
+    def setUp(self):
+        metrics.reset()
+
+    @override_settings(OCR_FALLBACK_BUDGET_MS=0)
+    def test_tesseract_overrun_is_cut_off_and_deferred(self):
+        t0 = time.monotonic()
+        with self.assertRaises(OcrDeferred) as cm:
+            run(_png())
+        self.assertLess(time.monotonic() - t0, 0.25)
+        self.assertEqual(cm.exception.stage, "tesseract")
+        self.assertIn('financekit_ocr_budget_exceeded_total{stage="tesseract",action="deferred"} 1', metrics.render())
+
+    @override_settings(OCR_FALLBACK_BUDGET_MS=1000)
+    def test_fallback_pass_gives_partial_result(self):
+        parsed = run(_png())
+        self.assertEqual(parsed["ocr_status"], "partial")
+        self.assertTrue(parsed["items"])
+        self.assertIn('financekit_ocr_budget_exceeded_total{stage="tesseract",action="fallback"} 1', metrics.render())
+
+    def test_oversized_images_are_decoded_reduced(self):
+        self.assertEqual(decode_scale(_png((400, 300)), 0), 1)
+        self.assertEqual(decode_scale(_png((400, 300)), 120_000), 1)
+        self.assertEqual(decode_scale(_png((400, 300)), 30_000), 2)
+        self.assertEqual(decode_scale(_png((400, 300)), 100), 8)
+
+
+class IngestDeferredTest(TestCase):
+    setUp = test_ingest.IngestTest.setUp
+    _jwt_ingest = test_ingest.IngestTest._jwt_ingest
+    _wrap_dek = test_ingest.IngestTest._wrap_dek
+
+    @override_settings(OCR_ENGINE="fake", OCR_FAKE_DELAY_MS=300, OCR_TESSERACT_BUDGET_MS=20,
+                       OCR_FALLBACK_BUDGET_MS=20, OCR_RETRY_AFTER=9)
+    def test_ingest_answers_ocr_deferred(self):
+        _, wrap = self._wrap_dek()
+        data = {"token": self._jwt_ingest(), "dek_wrap_srv": wrap, "year": 2025, "month": 10,
+                "category": "Food", "image": test_ingest._tiny_png()}
+        resp = self.c.post("/api/v1/ingest/receipt", data=data)
+        self.assertEqual(resp.status_code, 503, resp.content)
+        self.assertEqual(resp.json()["code"], "ocr_deferred")
+        self.assertEqual(resp.json()["stage"], "fallback")
+        self.assertEqual(resp["Retry-After"], "9")
+        self.assertEqual(self.c.get("/api/v1/receipts").json()["count"], 0)
+
+        data["image"].seek(0)
+        with override_settings(OCR_FAKE_DELAY_MS=0):  # the retry fits the budget and reuses the grant
+            resp = self.c.post("/api/v1/ingest/receipt", data=data)
+        self.assertEqual(resp.status_code, 200, resp.content)
+        self.assertEqual(self.c.get("/api/v1/receipts").json()["count"], 1)
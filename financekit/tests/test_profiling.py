@@ -0,0 +1,45 @@
+import tempfile
+from django.contrib.auth.models import User
+from django.test import Client, TestCase, override_settings
+
+
+class ProfilingTest(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.staff = User.objects.create_user("sam", password="pass1234", is_staff=True)
+        self.user = User.objects.create_user("uma", password="pass1234")
+
+    def _client(self, username):
+        c = Client()  # a new client builds the middleware chain under the current settings
+        c.login(username=username, password="pass1234")
+        return c
+
+    def test_off_by_default(self):
+        r = self._client("sam").get("/api/v1/receipts", HTTP_X_PROFILE="1")
+        self.assertNotIn("X-Profile-ID", r)
+
+    def test_staff_header_profiles_and_can_be_downloaded(self):
+        with override_settings(PROFILING_ENABLED=True, PROFILE_DIR=self.tmp.name, PROFILE_INTERVAL_MS=1):
+            c = self._client("sam")
+            r = c.get("/api/v1/receipts", HTTP_X_PROFILE="1", HTTP_X_REQUEST_ID="prof-1")
+            self.assertEqual(r["X-Profile-ID"], "prof-1")
+            listing = c.get("/api/v1/profiles").json()["results"]
+            self.assertEqual(listing[0]["id"], "prof-1")
+            self.assertEqual(listing[0]["mode"], "sampling")
+            r = c.get("/api/v1/profiles/prof-1")
+            self.assertEqual(r.status_code, 200)
+            for line in b"".join(r.streaming_content).decode().splitlines():
+                stack, n = line.rsplit(" ", 1)
+                self.assertTrue(int(n) > 0 and stack)
+
+            r = c.get("/api/v1/receipts", HTTP_X_PROFILE="cprofile", HTTP_X_REQUEST_ID="prof-2")
+            self.assertEqual(c.get("/api/v1/profiles/prof-2?fmt=txt").status_code, 200)
+            self.assertEqual(c.get("/api/v1/profiles/prof-2?fmt=folded").status_code, 404)
+
+    def test_header_ignored_for_non_staff(self):
+        with override_settings(PROFILING_ENABLED=True, PROFILE_DIR=self.tmp.name):
+            c = self._client("uma")
+            r = c.get("/api/v1/receipts", HTTP_X_PROFILE="1")
+            self.assertNotIn("X-Profile-ID", r)
+            self.assertEqual(c.get("/api/v1/profiles").status_code, 403)
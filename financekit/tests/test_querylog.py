@@ -0,0 +1,38 @@
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from financekit.models import Receipt, ReceiptItem
+from financekit.querylog import query_budget, shape
+
+
+class QueryBudgetTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.u = User.objects.create_user("quinn", password="pass1234")
+        for i in range(8):
+            r = Receipt.objects.create(user=self.u, year=2025, month=10, category="Food",
+                                       merchant=f"Shop {i}", date_str="2025-10-01", total=Decimal("2.00"))
+            ReceiptItem.objects.create(receipt=r, desc="Item", price=Decimal("2.00"))
+        self.c = Client()
+        self.c.login(username="quinn", password="pass1234")
+
+    def test_shape_collapses_in_lists(self):
+        self.assertEqual(shape("SELECT 1 FROM t WHERE id IN (%s, %s,  %s)"), shape("SELECT 1\nFROM t WHERE id IN (%s)"))
+
+    @override_settings(RESPONSE_CACHE_TTL=0)
+    def test_receipt_endpoints_stay_within_budget(self):
+        # session + user, count, page of receipts, prefetched items (+ cache/version bookkeeping is not SQL)
+        with query_budget(5):
+            r = self.c.get("/api/v1/receipts")
+        self.assertEqual(r.json()["count"], 8)
+        self.assertEqual(len(r.json()["results"][0]["items"]), 1)
+        rid = r.json()["results"][0]["id"]
+        with query_budget(4):
+            self.assertEqual(self.c.get(f"/api/v1/receipts/{rid}").status_code, 200)
+
+    def test_budget_reports_repeated_shapes(self):
+        with self.assertRaisesRegex(AssertionError, "shape repeated 8x"):
+            with query_budget(100):
+                for r in Receipt.objects.filter(user=self.u):
+                    list(r.items.all())
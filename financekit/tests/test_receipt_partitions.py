@@ -0,0 +1,71 @@
+from io import StringIO
+from unittest import skipIf, skipUnless
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from financekit.models import Receipt, ReceiptItem
+from financekit.receipt_partitions import drop_legacy, is_partitioned
+
+
+class ReceiptItemOwnerTest(TestCase):
+    def setUp(self):
+        self.u = User.objects.create_user("hana", password="pass1234")
+        self.r = Receipt.objects.create(user=self.u, year=2025, month=10, category="Food")
+
+    def test_item_save_copies_receipt_owner(self):
+        it = ReceiptItem.objects.create(receipt=self.r, desc="Tea", qty=1, price=2)
+        self.assertEqual(it.user_id, self.u.id)
+
+    @skipIf(connection.vendor == "postgresql", "Postgres converts the tables; see ReceiptConvertPostgresTest")
+    def test_command_backfills_owner_outside_postgres(self):
+        ids = [ReceiptItem.objects.create(receipt=self.r, desc=f"x{i}").id for i in range(3)]
+        ReceiptItem.objects.filter(id__in=ids).update(user=None)  # rows from before the column
+        out = StringIO()
+        call_command("receipt_partitions", "--batch-size", "2", stdout=out)
+        self.assertIn("backfilled user_id on 3 item(s)", out.getvalue())
+        self.assertFalse(ReceiptItem.objects.filter(user__isnull=True).exists())
+
+    @override_settings(RESPONSE_CACHE_TTL=0)
+    def test_items_without_owner_stay_visible(self):
+        it = ReceiptItem.objects.create(receipt=self.r, desc="Old", qty=1, price=2)
+        ReceiptItem.objects.filter(id=it.id).update(user=None)  # not yet backfilled
+        c = Client()
+        c.login(username="hana", password="pass1234")
+        self.assertEqual([i["desc"] for i in c.get(f"/api/v1/receipts/{self.r.id}").json()["items"]], ["Old"])
+        self.assertIn("Old", b"".join(c.get("/api/v1/receipts/export?fmt=jsonl").streaming_content).decode())
+
+
+@skipUnless(connection.vendor == "postgresql", "hash partitioning needs Postgres")
+class ReceiptConvertPostgresTest(TransactionTestCase):
+    def tearDown(self):
+        drop_legacy()
+
+    def test_command_converts_and_keeps_rows(self):
+        u = User.objects.create_user("ines", password="pass1234")
+        r = Receipt.objects.create(user=u, year=2025, month=10, category="Food")
+        it = ReceiptItem.objects.create(receipt=r, desc="Tea", qty=1, price=2)
+        ReceiptItem.objects.filter(id=it.id).update(user=None)
+        out = StringIO()
+        call_command("receipt_partitions", "--partitions", "4", "--batch-size", "2", stdout=out)
+        self.assertTrue(is_partitioned())
+        self.assertIn("swapped in 4 hash partitions", out.getvalue())
+        self.assertEqual(list(ReceiptItem.objects.filter(user=u).values_list("desc", flat=True)), ["Tea"])
+        r2 = Receipt.objects.create(user=u, year=2025, month=11, category="Food")  # writes work after the swap
+        ReceiptItem.objects.create(receipt=r2, desc="Jam", qty=1, price=3)
+        self.assertEqual(ReceiptItem.objects.filter(user=u).count(), 2)
+        for model in (Receipt, ReceiptItem):
+            with connection.cursor() as cur:
+                cur.execute("SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s", [model._meta.db_table])
+                defs = dict(cur.fetchall())
+            for index in model._meta.indexes:
+                self.assertIn(index.name, defs)
+        body_ref = self._indexdef("receipt_body_ref")  # blobstore.release() looks blobs up by it
+        self.assertIn(f".{Receipt._meta.db_table} USING", body_ref)
+        self.assertIn("WHERE", body_ref)
+
+    @staticmethod
+    def _indexdef(name):
+        with connection.cursor() as cur:
+            cur.execute("SELECT indexdef FROM pg_indexes WHERE indexname = %s", [name])
+            return cur.fetchone()[0]
@@ -0,0 +1,79 @@
+import datetime
+from io import StringIO
+from decimal import Decimal
+from unittest import mock
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, Client
+from django.contrib.auth.models import User
+from financekit.models import Receipt, RecurringCharge
+from financekit.recurring import detect, refresh_merchant
+
+
+class RecurringDetectTest(TestCase):
+    def test_monthly_with_jitter(self):
+        days = [datetime.date(2025, m, d) for m, d in ((1, 3), (2, 2), (3, 4), (4, 3), (5, 5))]
+        hits = detect((d, Decimal("15.99")) for d in days)
+        self.assertEqual(len(hits), 1)
+        self.assertEqual(hits[0]["period"], "monthly")
+        self.assertEqual(hits[0]["next_expected"], datetime.date(2025, 6, 4))
+
+    def test_irregular_is_ignored(self):
+        days = [datetime.date(2025, 1, 1), datetime.date(2025, 1, 9), datetime.date(2025, 3, 20)]
+        self.assertEqual(detect((d, Decimal("9.00")) for d in days), [])
+
+    def test_separate_amount_clusters(self):
+        weekly = [(datetime.date(2025, 1, 1) + datetime.timedelta(days=7 * i), Decimal("4.50")) for i in range(5)]
+        annual = [(datetime.date(2023, 6, 1), Decimal("99.00")), (datetime.date(2024, 6, 2), Decimal("99.00"))]
+        periods = sorted(h["period"] for h in detect(weekly + annual))
+        self.assertEqual(periods, ["annual", "weekly"])
+
+
+class RecurringApiTest(TestCase):
+    def setUp(self):
+        self.u = User.objects.create_user("frank", password="pass1234")
+        self.c = Client()
+        self.c.login(username="frank", password="pass1234")
+        for m in range(1, 5):
+            Receipt.objects.create(
+                user=self.u, year=2025, month=m, category="Bills", merchant="Streamflix",
+                date_str=f"2025-{m:02d}-12", total=Decimal("12.99"),
+            )
+
+    def test_refresh_and_list(self):
+        self.assertEqual(refresh_merchant(self.u.id, "Streamflix"), 1)
+        r = self.c.get("/api/v1/recurring")
+        self.assertEqual(r.status_code, 200, r.content)
+        rows = r.json()["results"]
+        self.assertEqual(rows[0]["merchant"], "Streamflix")
+        self.assertEqual(rows[0]["period"], "monthly")
+
+    def test_delete_triggers_incremental_refresh(self):
+        refresh_merchant(self.u.id, "Streamflix")
+        rid = Receipt.objects.filter(user=self.u).order_by("id").first().id
+        with self.captureOnCommitCallbacks(execute=True):
+            self.c.delete(f"/api/v1/receipts/{rid}")
+            self.c.delete(f"/api/v1/receipts/{rid + 1}")
+        self.assertFalse(RecurringCharge.objects.filter(user=self.u).exists())
+
+    def test_recompute_command_inline(self):
+        call_command("recompute_recurring", workers=1, stdout=StringIO())
+        self.assertEqual(RecurringCharge.objects.filter(user=self.u).count(), 1)
+
+    def test_recompute_survives_impossible_date_and_failing_user(self):
+        """An invalid date_str falls back to created_at; a user that errors is reported, not fatal."""
+        Receipt.objects.create(user=self.u, year=2025, month=2, merchant="Streamflix",
+                               date_str="2025-02-30", total=Decimal("12.99"))
+        other = User.objects.create_user("gail", password="pass1234")
+        Receipt.objects.create(user=other, year=2025, month=1, merchant="Gym", total=Decimal("30"))
+        from financekit import recurring
+        real = recurring.recompute_user
+        def flaky(uid):
+            if uid == other.id:
+                raise RuntimeError("boom")
+            return real(uid)
+        err = StringIO()
+        with mock.patch.object(recurring, "recompute_user", flaky), self.assertRaises(CommandError):
+            call_command("recompute_recurring", workers=1, stdout=StringIO(), stderr=err)
+        self.assertIn(f"user {other.id}: boom", err.getvalue())
+        self.assertEqual(RecurringCharge.objects.filter(user=self.u).count(), 1)
@@ -0,0 +1,65 @@
+from decimal import Decimal
+from django.test import TestCase, Client, override_settings
+from django.core.cache import cache
+from django.contrib.auth.models import User
+from financekit.models import Receipt, ReceiptItem
+from financekit.response_cache import data_version, get_or_compute
+
+
+@override_settings(RESPONSE_CACHE_LOCAL=True)  # the test runner is one process
+class ResponseCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.u = User.objects.create_user("carol", password="pass1234")
+        self.c = Client()
+        self.c.login(username="carol", password="pass1234")
+        Receipt.objects.create(
+            user=self.u, year=2025, month=10, category="Food",
+            merchant="Cafe A", date_str="2025-10-01", total=Decimal("12.50"),
+        )
+
+    def test_etag_304_until_write(self):
+        r1 = self.c.get("/api/v1/analytics/spend?month=2025-10")
+        self.assertEqual(r1.status_code, 200, r1.content)
+        etag = r1["ETag"]
+
+        r2 = self.c.get("/api/v1/analytics/spend?month=2025-10", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r2.status_code, 304)
+
+        Receipt.objects.create(
+            user=self.u, year=2025, month=10, category="Food",
+            merchant="Cafe B", date_str="2025-10-02", total=Decimal("1.00"),
+        )
+        r3 = self.c.get("/api/v1/analytics/spend?month=2025-10", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r3.status_code, 200)
+        self.assertNotEqual(r3["ETag"], etag)
+        self.assertEqual(Decimal(r3.json()["total"]), Decimal("13.50"))
+
+    def test_list_reflects_delete(self):
+        r1 = self.c.get("/api/v1/receipts")
+        self.assertEqual(r1.json()["count"], 1)
+        rid = r1.json()["results"][0]["id"]
+        self.assertEqual(self.c.delete(f"/api/v1/receipts/{rid}").status_code, 204)
+        r2 = self.c.get("/api/v1/receipts")
+        self.assertEqual(r2.json()["count"], 0)
+
+    def test_item_write_bumps_version(self):
+        rcp = Receipt.objects.filter(user=self.u).first()
+        v1 = data_version(self.u.id)
+        ReceiptItem.objects.create(receipt=rcp, desc="Latte", price=Decimal("4.50"))
+        self.assertGreater(data_version(self.u.id), v1)
+
+    def test_get_or_compute_computes_once(self):
+        calls = []
+        def compute():
+            calls.append(1)
+            return {"n": len(calls)}
+        self.assertEqual(get_or_compute("rc:test:k", compute, 60), {"n": 1})
+        self.assertEqual(get_or_compute("rc:test:k", compute, 60), {"n": 1})
+        self.assertEqual(len(calls), 1)
+
+    @override_settings(RESPONSE_CACHE_LOCAL=False)
+    def test_process_local_cache_is_bypassed(self):
+        r = self.c.get("/api/v1/analytics/spend?month=2025-10")
+        self.assertEqual(r.status_code, 200)
+        self.assertNotIn("ETag", r)
@@ -0,0 +1,72 @@
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import User
+from django.utils import timezone
+from financekit.models import Receipt, ReceiptChange, ReceiptItem
+from financekit.sync import make_cursor, record_change
+
+
+@override_settings(SYNC_SETTLE_SECONDS=0)
+class DeltaSyncTest(TestCase):
+    def setUp(self):
+        self.u = User.objects.create_user("hank", password="pass1234")
+        self.c = Client()
+        self.c.login(username="hank", password="pass1234")
+
+    def mk(self, merchant):
+        r = Receipt.objects.create(user=self.u, year=2025, month=1, merchant=merchant, total=Decimal("1.00"))
+        record_change(self.u.id, r.id, "upsert")
+        return r
+
+    def test_initial_reset_then_changes_and_tombstones(self):
+        self.mk("Old")
+        r0 = self.c.get("/api/v1/sync/receipts").json()
+        self.assertTrue(r0["reset"])
+        cursor = r0["cursor"]
+
+        a = self.mk("Cafe A")
+        b = self.mk("Cafe B")
+        self.assertEqual(self.c.delete(f"/api/v1/receipts/{b.id}").status_code, 204)
+
+        r1 = self.c.get(f"/api/v1/sync/receipts?since={cursor}").json()
+        self.assertFalse(r1["reset"])
+        self.assertEqual([x["id"] for x in r1["upserts"]], [a.id])
+        self.assertEqual(r1["deletes"], [b.id])
+
+        r2 = self.c.get(f"/api/v1/sync/receipts?since={r1['cursor']}").json()
+        self.assertEqual((r2["upserts"], r2["deletes"]), ([], []))
+
+    def test_upserts_prefetch_items_without_ciphertext(self):
+        cursor = make_cursor(0)
+        for i in range(4):
+            ReceiptItem.objects.create(receipt=self.mk(f"S{i}"), desc="Tea", price=Decimal("1.00"))
+        with CaptureQueriesContext(connection) as ql:
+            r = self.c.get(f"/api/v1/sync/receipts?since={cursor}")
+        self.assertEqual([len(x["items"]) for x in r.json()["upserts"]], [1, 1, 1, 1])
+        self.assertLessEqual(len(ql), 6)
+        self.assertFalse([q["sql"] for q in ql.captured_queries if "body_ct" in q["sql"]])
+
+    def test_paging(self):
+        cursor = make_cursor(0)
+        for i in range(3):
+            self.mk(f"S{i}")
+        r1 = self.c.get(f"/api/v1/sync/receipts?since={cursor}&limit=2").json()
+        self.assertTrue(r1["has_more"])
+        r2 = self.c.get(f"/api/v1/sync/receipts?since={r1['cursor']}&limit=2").json()
+        self.assertFalse(r2["has_more"])
+        self.assertEqual(len(r1["upserts"]) + len(r2["upserts"]), 3)
+
+    def test_expired_cursor_and_compaction(self):
+        self.mk("Old")
+        ReceiptChange.objects.update(created_at=timezone.now() - timedelta(days=90))
+        call_command("compact_sync_log", days=30, stdout=StringIO())
+        self.assertEqual(ReceiptChange.objects.count(), 0)
+        stale = f"0.{int(time.time()) - 60 * 86400}"
+        self.assertTrue(self.c.get(f"/api/v1/sync/receipts?since={stale}").json()["reset"])
+        self.assertEqual(self.c.get("/api/v1/sync/receipts?since=garbage").status_code, 400)
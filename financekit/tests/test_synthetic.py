@@ -0,0 +1,30 @@
+from collections import Counter
+from decimal import Decimal
+from io import StringIO
+from django.core.management import call_command
+from django.db.models import Sum
+from django.test import TestCase
+from financekit.models import Receipt, ReceiptItem
+
+
+class GenerateReceiptsTest(TestCase):
+    def test_generates_consistent_skewed_rows(self):
+        out = StringIO()
+        call_command("generate_receipts", users=2, per_user=300, batch_size=128, stdout=out)
+        self.assertIn("600 receipts", out.getvalue())
+        self.assertEqual(Receipt.objects.filter(user__username="synth_1").count(), 300)
+
+        r = Receipt.objects.order_by("id").first()
+        self.assertEqual(r.items.aggregate(s=Sum("price"))["s"], r.subtotal)
+        self.assertEqual(r.total, r.subtotal + r.tax_total + r.fees_total + r.tip_total - r.discount_total)
+        self.assertEqual(r.date_str, f"{r.year:04d}-{r.month:02d}-{r.created_at.day:02d}")
+        self.assertEqual(ReceiptItem.objects.filter(user__isnull=True).count(), 0)
+
+        merchants = Counter(Receipt.objects.values_list("merchant", flat=True))
+        top = merchants.most_common(10)
+        self.assertGreater(sum(n for _, n in top), 600 * 0.2)  # Zipf head: 10 of 2000 merchants
+        self.assertTrue(all(t > Decimal("0") for t in Receipt.objects.values_list("total", flat=True)[:50]))
+
+        # topping up is idempotent
+        call_command("generate_receipts", users=2, per_user=300, stdout=StringIO())
+        self.assertEqual(Receipt.objects.count(), 600)
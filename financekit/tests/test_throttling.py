@@ -0,0 +1,62 @@
+from unittest import mock
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, Client, override_settings
+from django.contrib.auth.models import User
+from financekit import throttling
+
+
+def _rates(**rates):
+    rf = dict(settings.REST_FRAMEWORK)
+    rf["DEFAULT_THROTTLE_RATES"] = rates
+    return override_settings(REST_FRAMEWORK=rf)
+
+
+class LocalBucketTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_burst_then_refill(self):
+        b = throttling.LocalBuckets()
+        spec = [("k", 3.0, 1.0)]  # burst 3, 1 token/s
+        with mock.patch("financekit.throttling.time.time", return_value=1000.0):
+            self.assertEqual([b.take(spec) for _ in range(3)], [0.0, 0.0, 0.0])
+            self.assertAlmostEqual(b.take(spec), 1.0)
+        with mock.patch("financekit.throttling.time.time", return_value=1001.5):
+            self.assertEqual(b.take(spec), 0.0)
+            self.assertGreater(b.take(spec), 0.0)
+
+    def test_all_buckets_or_none(self):
+        b = throttling.LocalBuckets()
+        with mock.patch("financekit.throttling.time.time", return_value=1000.0):
+            self.assertEqual(b.take([("a", 1.0, 0.1)]), 0.0)
+            self.assertGreater(b.take([("b", 5.0, 1.0), ("a", 1.0, 0.1)]), 0.0)
+            # "b" was not charged by the rejected check
+            self.assertEqual([b.take([("b", 5.0, 1.0)]) for _ in range(5)], [0.0] * 5)
+
+
+class ThrottleViewTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user("kim", password="pass1234")
+        self.c = Client()
+        self.c.login(username="kim", password="pass1234")
+
+    def test_each_request_counted_once(self):
+        with _rates(user="100/min", export="2/min"):
+            codes = [self.c.get("/api/v1/receipts/export").status_code for _ in range(3)]
+        self.assertEqual(codes, [200, 200, 429])
+
+    def test_ip_bucket_and_retry_after(self):
+        with _rates(user="100/min", export="100/min", **{"export:ip": "1/hour"}):
+            self.assertEqual(self.c.get("/api/v1/receipts/export").status_code, 200)
+            r = self.c.get("/api/v1/receipts/export")
+        self.assertEqual(r.status_code, 429)
+        self.assertEqual(r.json()["code"], "rate_limited")
+        self.assertGreater(int(r["Retry-After"]), 3000)
+
+    @override_settings(REDIS_URL="redis://127.0.0.1:1/0")
+    def test_falls_back_to_local_when_redis_down(self):
+        with _rates(user="100/min", export="1/min"):
+            self.assertEqual(self.c.get("/api/v1/receipts/export").status_code, 200)
+            self.assertEqual(self.c.get("/api/v1/receipts/export").status_code, 429)
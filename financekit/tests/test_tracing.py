@@ -0,0 +1,43 @@
+import json
+import os
+import tempfile
+from django.contrib.auth.models import User
+from django.test import Client, TestCase, override_settings
+from financekit.tracing import current_trace, span
+
+
+class TracingTest(TestCase):
+    def setUp(self):
+        self.u = User.objects.create_user("tess", password="pass1234")
+        self.c = Client()
+        self.c.login(username="tess", password="pass1234")
+
+    def test_server_timing_header(self):
+        r = self.c.get("/api/v1/receipts", HTTP_X_REQUEST_ID="req-1")
+        self.assertEqual(r["X-Request-ID"], "req-1")
+        names = [part.split(";")[0].strip() for part in r["Server-Timing"].split(",")]
+        self.assertIn("db", names)
+        self.assertIn("serialize", names)
+        self.assertEqual(names[-1], "app")
+
+    def test_span_is_noop_outside_requests(self):
+        with span("crypto"):
+            self.assertIsNone(current_trace())
+
+    @override_settings(SERVER_TIMING=False)
+    def test_otlp_json_log(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "traces.jsonl")
+            with override_settings(TRACE_LOG_FILE=path):
+                r = self.c.get("/api/v1/receipts", HTTP_TRACEPARENT="00-" + "ab" * 16 + "-" + "cd" * 8 + "-01")
+            self.assertNotIn("Server-Timing", r)
+            with open(path) as f:
+                line = json.loads(f.readline())
+        spans = line["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        root = spans[0]
+        self.assertEqual(root["traceId"], "ab" * 16)
+        self.assertEqual(root["parentSpanId"], "cd" * 8)
+        self.assertEqual(root["name"], "GET api/v1/receipts")
+        self.assertTrue(all(s["traceId"] == root["traceId"] for s in spans))
+        self.assertIn("db", {s["name"] for s in spans[1:]})
+        self.assertTrue(all(s.get("parentSpanId") for s in spans[1:]))
@@ -0,0 +1,233 @@
+"""
+Token-bucket throttling shared across workers.
+
+Each check is one Lua script call against Redis: every bucket that applies to
+the request (scope per user / device / IP, plus the global per-user rate) is
+refilled and tested, and tokens are taken only if all of them allow it. When
+Redis is not configured or unreachable, the same algorithm runs against the
+local Django cache (per-worker, best effort).
+
+Rates come from REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"]:
+  "<scope>"         per user (per IP for anonymous requests), like ScopedRateThrottle
+  "<scope>:user"    per user
+  "<scope>:device"  per device id (see TokenBucketThrottle.get_device_id)
+  "<scope>:ip"      per client IP
+  "user"            global per-user rate applied to every throttled view
+Burst capacity defaults to the rate's request count; override with
+THROTTLE_BURSTS = {"<rate key>": capacity}.
+"""
+from __future__ import annotations
+import math
+import threading
+import time
+
+from django.conf import settings
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from .tracing import span
+
+_DURATIONS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+LOCAL_MAX_KEYS = 50000  # bound for the in-memory store used when the cache is down
+REDIS_RETRY_SECONDS = 5.0
+
+# KEYS: bucket keys. ARGV: capacity_1, tokens_per_ms_1, capacity_2, ...
+# Returns {1, 0} when allowed (one token taken from every bucket) or {0, wait_ms}.
+_BUCKET_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local level = {}
+local wait = 0
+for i = 1, #KEYS do
+  local cap = tonumber(ARGV[2 * i - 1])
+  local rate = tonumber(ARGV[2 * i])
+  local b = redis.call('HMGET', KEYS[i], 'tokens', 'ts')
+  local tokens = tonumber(b[1]) or cap
+  local ts = tonumber(b[2]) or now
+  tokens = math.min(cap, tokens + math.max(0, now - ts) * rate)
+  level[i] = tokens
+  if tokens < 1 then
+    wait = math.max(wait, math.ceil((1 - tokens) / rate))
+  end
+end
+if wait > 0 then
+  return {0, wait}
+end
+for i = 1, #KEYS do
+  local cap = tonumber(ARGV[2 * i - 1])
+  local rate = tonumber(ARGV[2 * i])
+  redis.call('HSET', KEYS[i], 'tokens', tostring(level[i] - 1), 'ts', now)
+  redis.call('PEXPIRE', KEYS[i], math.ceil(cap / rate) + 1000)
+end
+return {1, 0}
+"""
+
+
+def parse_rate(rate: str | None) -> tuple[int, int] | None:
+    """'10/min' -> (10, 60); same format as DRF's SimpleRateThrottle."""
+    if not rate:
+        return None
+    num, period = rate.split("/")
+    return int(num), _DURATIONS[period.strip()[0].lower()]
+
+
+class LocalBuckets:
+    """
+    Fallback token buckets kept in Django's default cache (per-process LocMem
+    unless CACHES says otherwise), serialized by a process lock.
+    """
+
+    def __init__(self, prefix: str = "tb:"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._mem: dict[str, tuple[float, float]] = {}  # used if the cache itself is down
+
+    def _load(self, keys: list[str]) -> dict:
+        from django.core.cache import cache
+        try:
+            return cache.get_many(keys)
+        except Exception:
+            return {k: self._mem[k] for k in keys if k in self._mem}
+
+    def _store(self, values: dict, timeout: int) -> None:
+        from django.core.cache import cache
+        try:
+            cache.set_many(values, timeout=timeout)
+        except Exception:
+            if len(self._mem) > LOCAL_MAX_KEYS:
+                self._mem.clear()
+            self._mem.update(values)
+
+    def take(self, buckets: list[tuple[str, float, float]]) -> float:
+        """buckets: (key, capacity, tokens_per_sec). Returns 0 if allowed, else seconds to wait."""
+        keys = [self.prefix + k for k, _, _ in buckets]
+        with self._lock:
+            now = time.time()
+            state = self._load(keys)
+            levels, wait = [], 0.0
+            for k, (_, cap, rate) in zip(keys, buckets):
+                tokens, ts = state.get(k, (cap, now))
+                tokens = min(cap, tokens + max(0.0, now - ts) * rate)
+                levels.append(tokens)
+                if tokens < 1:
+                    wait = max(wait, (1 - tokens) / rate)
+            if wait:
+                return wait
+            ttl = max(math.ceil(cap / rate) for _, cap, rate in buckets) + 1
+            self._store({k: (tokens - 1, now) for k, tokens in zip(keys, levels)}, ttl)
+            return 0.0
+
+    def reset(self) -> None:
+        with self._lock:
+            self._mem.clear()
+
+
+_local = LocalBuckets()
+_redis_url = None
+_script = None
+_redis_down_until = 0.0
+_redis_lock = threading.Lock()
+
+
+def _get_script():
+    global _redis_url, _script
+    url = getattr(settings, "REDIS_URL", None)
+    if not url or time.monotonic() < _redis_down_until:
+        return None
+    if _script is None or _redis_url != url:
+        with _redis_lock:
+            if _script is None or _redis_url != url:
+                import redis as redislib
+                client = redislib.from_url(url, socket_timeout=0.2, socket_connect_timeout=0.2)
+                _script, _redis_url = client.register_script(_BUCKET_LUA), url
+    return _script
+
+
+def take(buckets: list[tuple[str, float, float]]) -> float:
+    """Atomically take one token from every bucket. Returns 0 if allowed, else seconds to wait."""
+    global _redis_down_until
+    if not buckets:
+        return 0.0
+    script = _get_script()
+    if script is not None:
+        args = []
+        for _, cap, rate in buckets:
+            args += [cap, repr(rate / 1000.0)]
+        try:
+            with span("redis", op="token_bucket"):
+                allowed, wait_ms = script(keys=[f"tb:{k}" for k, _, _ in buckets], args=args)
+            return 0.0 if allowed else int(wait_ms) / 1000.0
+        except Exception:
+            _redis_down_until = time.monotonic() + REDIS_RETRY_SECONDS
+    return _local.take(buckets)
+
+
+def bucket(key: str, rate: str | None, burst: int | None = None) -> tuple[str, float, float] | None:
+    parsed = parse_rate(rate)
+    if parsed is None:
+        return None
+    num, duration = parsed
+    return key, float(burst or num), num / duration
+
+
+def reset_local() -> None:
+    _local.reset()
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Drop-in replacement for ScopedRateThrottle + UserRateThrottle (see module docstring)."""
+
+    def get_rates(self) -> dict:
+        return api_settings.DEFAULT_THROTTLE_RATES or {}
+
+    def get_device_id(self, request, view) -> str | None:
+        hook = getattr(view, "get_throttle_device_id", None)
+        if hook is not None:
+            return hook(request)
+        return request.META.get("HTTP_X_DEVICE_ID") or None
+
+    def get_buckets(self, request, view) -> list[tuple[str, float, float]]:
+        rates = self.get_rates()
+        bursts = getattr(settings, "THROTTLE_BURSTS", {}) or {}
+        user = getattr(request, "user", None)
+        uid = user.pk if user is not None and user.is_authenticated else None
+        ip = self.get_ident(request)
+        scope = getattr(view, "throttle_scope", None)
+
+        idents = []
+        if scope:
+            idents.append((scope, f"user:{uid}" if uid is not None else f"ip:{ip}"))
+            if uid is not None:
+                idents.append((f"{scope}:user", f"user:{uid}"))
+            device = self.get_device_id(request, view)
+            if device:
+                idents.append((f"{scope}:device", f"device:{uid}:{device}"))
+            idents.append((f"{scope}:ip", f"ip:{ip}"))
+        if uid is not None:
+            idents.append(("user", f"user:{uid}"))
+
+        out = []
+        for rate_key, ident in idents:
+            b = bucket(f"{rate_key}:{ident}", rates.get(rate_key), bursts.get(rate_key))
+            if b is not None:
+                out.append(b)
+        return out
+
+    def allow_request(self, request, view):
+        # APIView.initial runs throttles; views that call check_throttles() earlier
+        # must not be charged twice for the same request.
+        if getattr(request, "_token_bucket_checked", False):
+            self._wait = getattr(request, "_token_bucket_wait", 0.0)
+            return not self._wait
+        self._wait = take(self.get_buckets(request, view))
+        request._token_bucket_checked = True
+        request._token_bucket_wait = self._wait
+        return not self._wait
+
+    def wait(self):
+        return math.ceil(self._wait) if self._wait else None
+
+
+def hit_limit(key: str, limit: int, period: int) -> bool:
+    """Shared fixed-budget limiter for ad-hoc checks: True once `limit` hits in `period` seconds is exceeded."""
+    return take([(key, float(limit), limit / period)]) > 0
@@ -0,0 +1,270 @@
+"""
+Lightweight per-request tracing on top of RequestIDMiddleware.
+
+    from financekit.tracing import span
+    with span("crypto", op="dek_unwrap"):
+        ...
+
+Spans nest through a ContextVar (so they follow sync_to_async and run_cpu
+hops) and are no-ops outside a traced request. When the request finishes the
+middleware adds a `Server-Timing` header (time summed per span name, plus
+`app` for the whole request) and, with TRACE_LOG_FILE set, appends the trace
+as one OTLP/JSON line (`{"resourceSpans": [...]}`), the format read by the
+OpenTelemetry collector's otlpjsonfile receiver. The trace id is taken from an
+incoming W3C `traceparent`, else from X-Request-ID when it is a UUID, so
+client and server records join on either.
+
+Database queries get a `db` span each, via a connection.execute_wrapper that
+is added once per thread and records only while a trace is active.
+RequestIDMiddleware runs natively in both sync and async handler chains
+(atraced() for the latter).
+"""
+from __future__ import annotations
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from rest_framework.renderers import JSONRenderer
+
+_trace: ContextVar["Trace | None"] = ContextVar("fk_trace", default=None)
+_parent: ContextVar[str] = ContextVar("fk_span_parent", default="")
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+_SERVER_TIMING_NAME = re.compile(r"[^A-Za-z0-9_.-]")
+MAX_SPANS = 500  # per request; further spans still time but are not recorded
+
+
+def _span_id() -> str:
+    return os.urandom(8).hex()
+
+
+class Trace:
+    __slots__ = ("trace_id", "parent_id", "root_id", "start_ns", "spans", "dropped", "_lock")
+
+    def __init__(self, trace_id: str, parent_id: str = ""):
+        self.trace_id = trace_id
+        self.parent_id = parent_id  # remote parent (traceparent), if any
+        self.root_id = _span_id()
+        self.start_ns = time.time_ns()
+        self.spans: list[dict] = []
+        self.dropped = 0
+        self._lock = threading.Lock()  # spans may close on run_cpu threads
+
+    def add(self, record: dict) -> None:
+        with self._lock:
+            if len(self.spans) < MAX_SPANS:
+                self.spans.append(record)
+            else:
+                self.dropped += 1
+
+
+def current_trace() -> Trace | None:
+    return _trace.get()
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Time a block as a child of the current span; attrs become span attributes."""
+    trace = _trace.get()
+    if trace is None:
+        yield
+        return
+    sid = _span_id()
+    parent = _parent.get() or trace.root_id
+    token = _parent.set(sid)
+    start = time.time_ns()
+    t0 = time.perf_counter_ns()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        _parent.reset(token)
+        trace.add({"name": name, "id": sid, "parent": parent, "start": start,
+                   "dur": time.perf_counter_ns() - t0, "attrs": attrs, "error": error})
+
+
+# ----- Request lifecycle (called by RequestIDMiddleware) ----------------------
+
+def _trace_ids(request) -> tuple[str, str]:
+    m = _TRACEPARENT.match(request.headers.get("traceparent", "").strip().lower())
+    if m and m.group(1) != "0" * 32:
+        return m.group(1), m.group(2)
+    try:
+        return uuid.UUID(request.request_id).hex, ""
+    except (ValueError, AttributeError, TypeError):
+        return uuid.uuid4().hex, ""
+
+
+def _db_wrapper(execute, sql, params, many, context):
+    if _trace.get() is None:
+        return execute(sql, params, many, context)
+    with span("db", **{"db.operation": (sql.split(None, 1) or ["?"])[0].upper()[:16],
+                       "db.alias": context["connection"].alias}):
+        return execute(sql, params, many, context)
+
+
+def _install_db_wrapper() -> None:
+    """Add _db_wrapper once to this thread's connections; it records only inside a trace."""
+    from django.db import connections
+    for conn in connections.all():
+        if _db_wrapper not in conn.execute_wrappers:
+            conn.execute_wrappers.append(_db_wrapper)
+
+
+def enabled() -> bool:
+    return bool(getattr(settings, "SERVER_TIMING", True) or getattr(settings, "TRACE_LOG_FILE", ""))
+
+
+def _begin(request) -> Trace:
+    trace_id, parent_id = _trace_ids(request)
+    request.trace_id = trace_id
+    return Trace(trace_id, parent_id)
+
+
+def traced(request, get_response):
+    """Run get_response(request) inside a trace and decorate the response."""
+    trace = _begin(request)
+    token = _trace.set(trace)
+    t0 = time.perf_counter_ns()
+    try:
+        _install_db_wrapper()
+        response = get_response(request)
+    finally:
+        _trace.reset(token)
+    return _finish(trace, request, response, time.perf_counter_ns() - t0)
+
+
+async def atraced(request, get_response):
+    """traced() for an async get_response. ORM queries run on sync_to_async's thread, so the
+    db wrapper is installed there."""
+    trace = _begin(request)
+    token = _trace.set(trace)
+    t0 = time.perf_counter_ns()
+    try:
+        await sync_to_async(_install_db_wrapper)()
+        response = await get_response(request)
+    finally:
+        _trace.reset(token)
+    return _finish(trace, request, response, time.perf_counter_ns() - t0)
+
+
+def _finish(trace: Trace, request, response, total_ns: int):
+    if getattr(settings, "SERVER_TIMING", True):
+        try:
+            response["Server-Timing"] = server_timing(trace, total_ns)
+        except Exception:
+            pass
+    if getattr(settings, "TRACE_LOG_FILE", "") and random.random() < getattr(settings, "TRACE_SAMPLE_RATE", 1.0):
+        try:
+            _write(trace, request, response, total_ns)
+        except Exception:
+            logging.getLogger(__name__).warning("trace export failed", exc_info=True)
+    return response
+
+
+def server_timing(trace: Trace, total_ns: int) -> str:
+    totals: dict[str, list] = {}
+    with trace._lock:
+        spans = list(trace.spans)
+    for s in spans:
+        t = totals.setdefault(_SERVER_TIMING_NAME.sub("_", s["name"]), [0, 0])
+        t[0] += s["dur"]
+        t[1] += 1
+    parts = [f'{name};dur={ns / 1e6:.2f};desc="{n}x"' if n > 1 else f"{name};dur={ns / 1e6:.2f}"
+             for name, (ns, n) in totals.items()]
+    parts.append(f"app;dur={total_ns / 1e6:.2f}")
+    return ", ".join(parts)
+
+
+# ----- OTLP/JSON export ------------------------------------------------------
+
+def _attr(key: str, value) -> dict:
+    if isinstance(value, bool):
+        v = {"boolValue": value}
+    elif isinstance(value, int):
+        v = {"intValue": str(value)}
+    elif isinstance(value, float):
+        v = {"doubleValue": value}
+    else:
+        v = {"stringValue": str(value)}
+    return {"key": key, "value": v}
+
+
+def _otlp_span(trace_id, span_id, parent_id, name, kind, start_ns, dur_ns, attrs, error) -> dict:
+    out = {
+        "traceId": trace_id, "spanId": span_id, "name": name, "kind": kind,
+        "startTimeUnixNano": str(start_ns), "endTimeUnixNano": str(start_ns + dur_ns),
+        "attributes": [_attr(k, v) for k, v in attrs.items() if v is not None],
+        "status": {"code": 2, "message": error} if error else {},
+    }
+    if parent_id:
+        out["parentSpanId"] = parent_id
+    return out
+
+
+_file_logger: logging.Logger | None = None
+_file_lock = threading.Lock()
+
+
+def _logger() -> logging.Logger:
+    global _file_logger
+    path = settings.TRACE_LOG_FILE
+    with _file_lock:
+        if _file_logger is None or _file_logger.handlers[0].baseFilename != os.path.abspath(path):
+            lg = logging.getLogger("financekit.traces")
+            lg.propagate = False
+            lg.setLevel(logging.INFO)
+            for h in list(lg.handlers):
+                lg.removeHandler(h)
+                h.close()
+            handler = logging.FileHandler(path, encoding="utf-8", delay=True)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            lg.addHandler(handler)
+            _file_logger = lg
+    return _file_logger
+
+
+def _write(trace: Trace, request, response, total_ns: int) -> None:
+    match = getattr(request, "resolver_match", None)
+    route = getattr(match, "route", None) or request.path
+    root_attrs = {
+        "http.request.method": request.method,
+        "http.route": route,
+        "url.path": request.path,
+        "http.response.status_code": response.status_code,
+        "financekit.request_id": request.request_id,
+        "enduser.id": getattr(getattr(request, "user", None), "pk", None),
+        "financekit.dropped_spans": trace.dropped or None,
+    }
+    with trace._lock:
+        spans = list(trace.spans)
+    otlp = [_otlp_span(trace.trace_id, trace.root_id, trace.parent_id, f"{request.method} {route}", 2,
+                       trace.start_ns, total_ns, root_attrs, "HTTP 5xx" if response.status_code >= 500 else None)]
+    otlp += [_otlp_span(trace.trace_id, s["id"], s["parent"], s["name"], 1, s["start"], s["dur"], s["attrs"], s["error"])
+             for s in spans]
+    line = {"resourceSpans": [{
+        "resource": {"attributes": [_attr("service.name", getattr(settings, "TRACE_SERVICE_NAME", "financekit")),
+                                    _attr("process.pid", os.getpid())]},
+        "scopeSpans": [{"scope": {"name": "financekit.tracing"}, "spans": otlp}],
+    }]}
+    _logger().info(json.dumps(line, separators=(",", ":")))
+
+
+class TracedJSONRenderer(JSONRenderer):
+    """JSONRenderer that records response serialization as a `serialize` span."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with span("serialize"):
+            return super().render(data, accepted_media_type, renderer_context)
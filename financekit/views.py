@@ -5,31 +5,40 @@ from rest_framework import permissions, status, generics
 from rest_framework.permissions import AllowAny
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.throttling import UserRateThrottle, ScopedRateThrottle
 from rest_framework.exceptions import ParseError, PermissionDenied, AuthenticationFailed, NotFound, Throttled
 from django.core.cache import cache
-from django.db.models import Sum, Value
-from django.db.models.functions import Coalesce
+from django.db.models import Prefetch
 from django.db import transaction
 from django.conf import settings
 import redis as redislib
 from cryptography.hazmat.primitives import serialization, hashes
 from cryptography.hazmat.primitives.asymmetric import padding as asy_padding
 
-from .models import DeviceKey, GrantJTI, Receipt, ReceiptItem
-from .serializers import DeviceRegisterSerializer, ProcessGrantSerializer, DevCreateReceiptSerializer
+from .models import DeviceKey, GrantJTI, Receipt, ReceiptImage, ReceiptItem, RecurringCharge
+from .serializers import DeviceRegisterSerializer, ProcessGrantSerializer, DevCreateReceiptSerializer, ImageGrantSerializer
 from .crypto_utils import (
     load_server_rsa_pub_pem, jwt_verify_eddsa, unwrap_dek_rsa_oaep, aesgcm_decrypt
 )
 
-from .serializers import IngestReceiptSerializer, ReceiptSerializer
+from .serializers import IngestReceiptSerializer, ReceiptSerializer, RecurringChargeSerializer, AuditEventSerializer
 from .serializers import RegisterSerializer
 from rest_framework import serializers
 from rest_framework_simplejwt.tokens import RefreshToken
 from .ocr_adapter import parse_image_to_json
+from .ocr_engine import OcrDeferred
 from .crypto_utils import aesgcm_encrypt
+from .response_cache import cached_response
+from .audit import audit
+from .exceptions import Overloaded
+from .metrics import DECRYPT_STAGE, INGEST_STAGE
+from .tracing import span
+from .throttling import TokenBucketThrottle, hit_limit
+from .dbpool import stats as dbpool_stats
+from .db_router import ReplicaReadMixin, current_read_db
+from .receipt_partitions import owned_items
 from django.http import JsonResponse
 import traceback
+from contextlib import nullcontext
 
 import datetime
 import secrets
@@ -68,49 +77,38 @@ class DeviceRegisterView(APIView):
 
 class ProcessDecryptView(APIView):
     permission_classes = [permissions.IsAuthenticated]
-    throttle_classes = [ScopedRateThrottle, UserRateThrottle]
+    throttle_classes = [TokenBucketThrottle]
     throttle_scope = "decrypt"
 
+    def get_throttle_device_id(self, request):
+        # Device buckets key on the grant's kid (unverified here; only used for rate limiting)
+        try:
+            token = request.data.get("token") or ""
+            header = json.loads(base64.urlsafe_b64decode(token.split(".")[0] + "=="))
+            kid = header.get("kid")
+            return str(kid)[:128] if kid else None
+        except Exception:
+            return None
+
     def post(self, request):
-        # Enforce throttle early to ensure 429 takes precedence over validation errors
-        # DRF throttles (best-effort; may run again in APIView.initial)
-        self.check_throttles(request)
+        # Throttles already ran in APIView.initial (before validation), so 429 takes precedence
 
-        # Local audit helper
-        from .models import AuditEvent
+        # Local audit helper (queued; see financekit.audit)
         def _audit(outcome: str, extra: dict | None = None, device_id: str | None = None, jti: str | None = None):
             try:
-                AuditEvent.objects.create(
-                    user=request.user if request.user.is_authenticated else None,
-                    device_id=device_id or "",
-                    jti=jti or "",
-                    endpoint="decrypt/process",
-                    outcome=outcome,
-                    targets=list(request.data.get("targets") or []),
-                    ip=request.META.get("REMOTE_ADDR"),
-                    request_id=getattr(request, "request_id", ""),
-                    extra=extra or {},
-                )
+                targets = list(request.data.get("targets") or [])
             except Exception:
-                # Never break request due to audit failures
-                pass
+                targets = []
+            audit(request, "decrypt/process", outcome, device_id=device_id, jti=jti, targets=targets, extra=extra)
 
-        # Helper: manual lightweight per-user limiter (used only on invalid grant paths)
+        # Helper: manual lightweight per-IP limiter (used only on invalid grant paths)
         def manual_limit_or_increment():
             # Always key by client IP to ensure consistency in tests and environments
             ident = request.META.get("REMOTE_ADDR") or "anon"
-            rl_key = f"rl:decrypt:ip:{ident}"
-            try:
-                hits = cache.get(rl_key) or 0
-            except Exception:
-                return None
-            if hits >= 1:
+            # One atomic check shared by all workers (Redis token bucket, local fallback)
+            if hit_limit(f"rl:decrypt:ip:{ident}", limit=1, period=60):
                 _audit("throttled")
                 raise Throttled(detail="Request was throttled.")
-            try:
-                cache.set(rl_key, hits + 1, timeout=60)
-            except Exception:
-                pass
             return None
         s = ProcessGrantSerializer(data=request.data)
         s.is_valid(raise_exception=True)
@@ -118,94 +116,35 @@ class ProcessDecryptView(APIView):
         dek_wrap_srv = s.validated_data["dek_wrap_srv"]
         targets = s.validated_data["targets"]
 
-        # Parse header to get kid (device_id). If invalid, continue so throttling can still apply.
-        try:
-            header_b64 = token.split(".")[0]
-            header = json.loads(base64.urlsafe_b64decode(header_b64 + "=="))
-            kid = header.get("kid")
-        except Exception:
-            # Invalid header: apply manual limiter and raise a structured error
-            resp = manual_limit_or_increment()
-            if resp:
-                return resp
-            _audit("invalid_header")
-            raise ParseError("Invalid token header")
-
-        # Lookup device public key
-        try:
-            dev = DeviceKey.objects.get(user=request.user, device_id=kid, is_active=True)
-        except DeviceKey.DoesNotExist:
-            resp = manual_limit_or_increment()
-            if resp:
-                return resp
-            _audit("unknown_device", device_id=kid)
-            raise PermissionDenied("Unknown device")
-
-        # Verify JWT
-        try:
-            payload = jwt_verify_eddsa(token, dev.public_key_b64)
-        except Exception as e:
-            resp = manual_limit_or_increment()
-            if resp:
-                return resp
-            _audit("auth_failed", device_id=kid)
-            raise AuthenticationFailed(f"JWT verify failed: {e}")
-
-        # Single-use JTI check
-        jti = payload.get("jti")
-        if not jti:
-            resp = manual_limit_or_increment()
-            if resp:
-                return resp
-            _audit("missing_jti", device_id=kid)
-            raise ParseError("Missing jti")
-
-        r = redis_client()
-        if r:
-            # atomic set-if-not-exists with TTL ~180s
-            ok = r.set(name=f"grant:jti:{jti}", value="1", nx=True, ex=180)
-            if not ok:
-                from .exceptions import ReplayDetected
-                _audit("replay", device_id=kid, jti=jti)
-                raise ReplayDetected()
-        else:
-            if GrantJTI.objects.filter(jti=jti).exists():
-                from .exceptions import ReplayDetected
-                _audit("replay", device_id=kid, jti=jti)
-                raise ReplayDetected()
-            GrantJTI.objects.create(jti=jti, user=request.user, device_id=dev.device_id)
-
-        # At this point, grant is valid and not a replay; do not apply manual limiter to avoid throttling valid flows.
-
-        scope = set(payload.get("scope") or [])
-        if "receipt:decrypt" not in scope:
-            _audit("scope_denied", device_id=kid, jti=jti)
-            raise PermissionDenied("Scope denied")
-
-        # Optional: enforce targets from payload if included
-        # payload_targets = payload.get("targets"); if payload_targets and set(map(str,payload_targets)) != set(map(str,targets)): deny
+        # Grant: device key, signature, single-use jti, scope. Rejected grants count against the
+        # per-IP limiter; a valid grant is not limited so legitimate flows are not throttled.
+        kid, jti = verify_grant(request, token, "receipt:decrypt", "decrypt/process", stage=DECRYPT_STAGE,
+                                on_invalid=manual_limit_or_increment, targets=targets)
 
         # Unwrap DEK (memory only)
         try:
-            dek = unwrap_dek_rsa_oaep(dek_wrap_srv)
+            with DECRYPT_STAGE.time(stage="dek_unwrap"), span("crypto", op="dek_unwrap"):
+                dek = unwrap_dek_rsa_oaep(dek_wrap_srv)
         except Exception:
             _audit("unwrap_failed", device_id=kid, jti=jti)
             raise ParseError("DEK unwrap failed")
 
         # Decrypt & process
-        receipts = list(Receipt.objects.filter(user=request.user, id__in=targets))
+        with DECRYPT_STAGE.time(stage="db_fetch"):
+            receipts = list(Receipt.objects.filter(user=request.user, id__in=targets))
         results = []
         try:
-            for rcp in receipts:
-                pt = aesgcm_decrypt(
-                    key=dek,
-                    nonce=bytes(rcp.body_nonce),
-                    ct=bytes(rcp.body_ct),
-                    tag=bytes(rcp.body_tag),
-                    aad=b"receipt_v1"
-                )
-                # Here you’d run server-side processing (e.g., categorize)
-                results.append({"id": rcp.id, "plaintext_json": pt.decode("utf-8")})
+            with DECRYPT_STAGE.time(stage="aes_decrypt"), span("crypto", op="aes_decrypt"):
+                for rcp in receipts:
+                    pt = aesgcm_decrypt(
+                        key=dek,
+                        nonce=bytes(rcp.body_nonce),
+                        ct=rcp.ciphertext(),
+                        tag=bytes(rcp.body_tag),
+                        aad=b"receipt_v1"
+                    )
+                    # Here you’d run server-side processing (e.g., categorize)
+                    results.append({"id": rcp.id, "plaintext_json": pt.decode("utf-8")})
         finally:
             # Best-effort zeroize
             ba = bytearray(dek)
@@ -225,27 +164,176 @@ class DevCreateEncryptedReceiptView(APIView):
         s = DevCreateReceiptSerializer(data=request.data)
         s.is_valid(raise_exception=True)
         user = User.objects.get(id=s.validated_data["user_id"])
+        from .blobstore import externalize
+        body_ct, body_ref = externalize(base64.b64decode(s.validated_data["body_ct_b64"]))
         r = Receipt.objects.create(
             user=user,
             year=s.validated_data["year"],
             month=s.validated_data["month"],
             category=s.validated_data["category"],
             body_nonce=base64.b64decode(s.validated_data["body_nonce_b64"]),
-            body_ct=base64.b64decode(s.validated_data["body_ct_b64"]),
+            body_ct=body_ct,
+            body_ref=body_ref,
             body_tag=base64.b64decode(s.validated_data["body_tag_b64"]),
         )
         return Response({"receipt_id": r.id})
 
 
+class IngestStepFailed(Exception):
+    """A failed ingest step: carries the error Response and the audit outcome (if any)."""
+
+    def __init__(self, response, outcome: str | None = None):
+        super().__init__(outcome or "ingest failed")
+        self.response = response
+        self.outcome = outcome
+
+
+def ocr_and_seal(img_bytes: bytes, dek_wrap_srv: str):
+    """OCR the image, unwrap the DEK and AES-GCM seal the parsed JSON (CPU-bound).
+    Returns (parsed_obj, nonce, ct, tag); raises IngestStepFailed."""
+    # OCR
+    try:
+        with INGEST_STAGE.time(stage="ocr"), span("ocr"):
+            parsed = parse_image_to_json(img_bytes)
+    except OcrDeferred as e:
+        # Over budget: answer now instead of holding the worker; nothing is stored
+        raise IngestStepFailed(Response(
+            {"code": "ocr_deferred", "detail": f"{e}; retry later or upload a smaller image", "stage": e.stage},
+            status=503, headers={"Retry-After": str(getattr(settings, "OCR_RETRY_AFTER", 5))},
+        ), "ocr_deferred")
+    except Exception as e:
+        raise IngestStepFailed(Response({"detail": f"parse_image_to_json failed: {e}", "trace": traceback.format_exc()}, status=500))
+    if not isinstance(parsed, dict):
+        raise IngestStepFailed(Response({"detail": f"parse_image_to_json returned {type(parsed).__name__}, wanted dict"}, status=500))
+    try:
+        pt = json.dumps(parsed, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    except Exception as e:
+        raise IngestStepFailed(Response({"detail": f"json.dumps failed: {e}"}, status=500))
+
+    dek = None
+    try:
+        # Unwrap DEK (RSA-OAEP-SHA256)
+        try:
+            with INGEST_STAGE.time(stage="dek_unwrap"), span("crypto", op="dek_unwrap"):
+                dek = unwrap_dek_rsa_oaep(dek_wrap_srv)
+        except Exception as e:
+            raise IngestStepFailed(
+                Response({"detail": f"DEK unwrap failed: {e}", "trace": traceback.format_exc()}, status=400),
+                "unwrap_failed",
+            )
+        if not isinstance(dek, (bytes, bytearray)) or len(dek) not in (16, 24, 32):
+            raise IngestStepFailed(Response({"detail": f"unwrapped DEK has invalid length={len(dek) if isinstance(dek,(bytes,bytearray)) else 'n/a'}"}, status=400))
+
+        # Encrypt (AES-GCM)
+        try:
+            with INGEST_STAGE.time(stage="aes_encrypt"), span("crypto", op="aes_encrypt"):
+                nonce, ct, tag = aesgcm_encrypt(dek, pt, aad=b"receipt_v1")
+        except Exception as e:
+            raise IngestStepFailed(Response({"detail": f"aesgcm_encrypt failed: {e}", "trace": traceback.format_exc()}, status=500))
+    finally:
+        # best-effort zeroize
+        try:
+            if isinstance(dek, (bytes, bytearray)):
+                ba = bytearray(dek)
+                for i in range(len(ba)): ba[i] = 0
+        except Exception:
+            pass
+    return json.loads(pt.decode("utf-8")), nonce, ct, tag
+
+
+def persist_receipt(user, year, month, category, parsed_obj: dict, nonce, ct, tag, image: dict | None = None) -> Receipt:
+    """Store ciphertext + derived columns (items, archived image), then log the change and refresh recurring charges."""
+    from decimal import Decimal, ROUND_HALF_UP
+    merchant = (parsed_obj.get("merchant") or "").strip()
+    currency = (parsed_obj.get("currency") or "USD").strip() or "USD"
+    # prefer date_str if present else "date"
+    date_str = (parsed_obj.get("date_str") or parsed_obj.get("date") or "")
+    def _to_cents(v):
+        try:
+            return Decimal(str(v)).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+        except Exception:
+            return Decimal("0.00")
+
+    # Large ciphertexts go to the blob store; the row keeps a reference
+    from .blobstore import externalize
+    ct, body_ref = externalize(ct)
+
+    # Force default DB to avoid any routing ambiguity
+    rec = Receipt.objects.using("default").create(
+        user=user,
+        year=year, month=month, category=category,
+        merchant=merchant[:255],
+        date_str=str(date_str)[:32],
+        currency=currency[:8] or "USD",
+        total=_to_cents(parsed_obj.get("total", 0)),
+        subtotal=_to_cents(parsed_obj.get("subtotal", 0)),
+        tax_total=_to_cents(parsed_obj.get("tax_total", 0)),
+        discount_total=_to_cents(parsed_obj.get("discount_total", 0)),
+        fees_total=_to_cents(parsed_obj.get("fees_total", 0)),
+        tip_total=_to_cents(parsed_obj.get("tip_total", 0)),
+        body_nonce=nonce, body_ct=ct, body_ref=body_ref, body_tag=tag,
+    )
+
+    # optional: create items
+    try:
+        for it in parsed_obj.get("items") or []:
+            desc = str(it.get("desc") or "").strip()
+            if not desc:
+                continue
+            qty = it.get("qty", 1)
+            price = it.get("price", 0)
+            try:
+                qd = Decimal(str(qty))
+            except Exception:
+                qd = Decimal("1")
+            try:
+                pd = Decimal(str(price)).quantize(Decimal("0.01"))
+            except Exception:
+                pd = Decimal("0.00")
+            ReceiptItem.objects.create(
+                receipt=rec, user=user, desc=desc[:512], qty=qd, price=pd
+            )
+    except Exception:
+        pass  # do not fail ingest if items fail
+
+    if image:
+        ReceiptImage.objects.create(receipt=rec, user=user, **image)
+
+    # Delta-sync change log (upsert)
+    from .sync import record_change
+    record_change(user.id, rec.id, "upsert")
+
+    # Incrementally refresh recurring-charge detection for this merchant
+    from .recurring import schedule_refresh
+    schedule_refresh(user.id, rec.merchant)
+    return rec
+
+
+def ingest_result(rec: Receipt, parsed_obj: dict) -> dict:
+    derived = {
+        "merchant": rec.merchant,
+        "currency": rec.currency,
+        "date_str": rec.date_str,
+        "total": str(rec.total),
+        "subtotal": str(rec.subtotal),
+        "tax_total": str(rec.tax_total),
+        "discount_total": str(rec.discount_total),
+        "fees_total": str(rec.fees_total),
+        "tip_total": str(rec.tip_total),
+        "receipt_id": rec.id,
+        "created_at": rec.created_at.isoformat(),
+    }
+    return {"receipt_id": rec.id, "data": parsed_obj, "derived": derived}
+
+
 class IngestReceiptView(APIView):
     """Receipt ingest endpoint (OCR + encrypt + store). Debug prints removed."""
     permission_classes = [permissions.IsAuthenticated]
-    throttle_classes = [ScopedRateThrottle, UserRateThrottle]
+    throttle_classes = [TokenBucketThrottle]
     throttle_scope = "ingest"
 
     def post(self, request):
-        # Enforce throttle early to ensure 429 takes precedence
-        self.check_throttles(request)
+        # Throttles already ran in APIView.initial, so 429 takes precedence over validation
         s = IngestReceiptSerializer(data=request.data)
         s.is_valid(raise_exception=True)
         token = s.validated_data["token"]
@@ -255,173 +343,67 @@ class IngestReceiptView(APIView):
         category = s.validated_data["category"]
         image = s.validated_data["image"]
 
-        # Parse header.kid. If invalid, raise structured error
-        try:
-            header_b64 = token.split(".")[0]
-            header = json.loads(base64.urlsafe_b64decode(header_b64 + "=="))
-            kid = header.get("kid")
-        except Exception:
-            raise ParseError("Invalid token header")
+        kid, jti = verify_grant(request, token, "receipt:ingest", "ingest/receipt", stage=INGEST_STAGE)
 
-        # Verify device
-        try:
-            dev = DeviceKey.objects.get(user=request.user, device_id=kid, is_active=True)
-        except DeviceKey.DoesNotExist:
-            raise PermissionDenied("Unknown device")
+        # 1) Read image
+        with INGEST_STAGE.time(stage="read_image"):
+            img_bytes = image.read()
+        if not img_bytes:
+            return Response({"detail": "empty image upload"}, status=400)
 
-        # Verify JWT
+        # 2-4) OCR, unwrap DEK, encrypt (admission-controlled: sheds with 503 when OCR is saturated)
+        from .admission import OCR
         try:
-            payload = jwt_verify_eddsa(token, dev.public_key_b64)
-        except Exception as e:
-            raise AuthenticationFailed(f"JWT verify failed: {e}")
-
-        # Single-use JTI
-        jti = payload.get("jti")
-        if not jti:
-            raise ParseError("Missing jti")
-        r = redis_client()
-        if r:
-            ok = r.set(name=f"grant:jti:{jti}", value="1", nx=True, ex=180)
-            if not ok:
-                from .exceptions import ReplayDetected
-                raise ReplayDetected()
-        else:
-            if GrantJTI.objects.filter(jti=jti).exists():
-                from .exceptions import ReplayDetected
-                raise ReplayDetected()
-            GrantJTI.objects.create(jti=jti, user=request.user, device_id=dev.device_id)
-
-        # Scope check
-        scope = set(payload.get("scope") or [])
-        if "receipt:ingest" not in scope:
-            raise PermissionDenied("Scope denied")
-
+            with OCR.admit():
+                parsed_obj, nonce, ct, tag = ocr_and_seal(img_bytes, dek_wrap_srv)
+        except Overloaded:
+            release_grant(jti)  # nothing was done: the Retry-After retry may reuse the grant
+            audit(request, "ingest/receipt", "overloaded", device_id=kid, jti=jti)
+            raise
+        except IngestStepFailed as f:
+            if f.outcome == "ocr_deferred":
+                release_grant(jti)  # nothing was stored: the retry may reuse the grant
+            if f.outcome:
+                audit(request, "ingest/receipt", f.outcome, device_id=kid, jti=jti)
+            return f.response
+
+        # Optional: keep the original image, stream-encrypted under the same DEK
+        from .image_archive import archive_upload
+        with INGEST_STAGE.time(stage="image_archive"), span("archive"):
+            image_info = archive_upload(image, dek_wrap_srv)
+
+        # 5) Persist (ciphertext + derived columns)
         try:
-            # 1) Read image
-            img_bytes = image.read()
-            if not img_bytes:
-                return Response({"detail": "empty image upload"}, status=400)
-
-            # 2) OCR
-            try:
-                parsed = parse_image_to_json(img_bytes)
-            except Exception as e:
-                return Response({"detail": f"parse_image_to_json failed: {e}", "trace": traceback.format_exc()}, status=500)
-            if not isinstance(parsed, dict):
-                return Response({"detail": f"parse_image_to_json returned {type(parsed).__name__}, wanted dict"}, status=500)
-            try:
-                pt = json.dumps(parsed, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
-            except Exception as e:
-                return Response({"detail": f"json.dumps failed: {e}"}, status=500)
+            with INGEST_STAGE.time(stage="db_persist"):
+                rec = persist_receipt(request.user, year, month, category, parsed_obj, nonce, ct, tag, image=image_info)
+        except Exception as e:
+            audit(request, "ingest/receipt", "db_failed", device_id=kid, jti=jti)
+            return Response({"detail": f"DB insert failed: {e}", "trace": traceback.format_exc()}, status=500)
 
-            # 3) Unwrap DEK (RSA-OAEP-SHA256)
-            try:
-                dek = unwrap_dek_rsa_oaep(dek_wrap_srv)
-            except Exception as e:
-                return Response({"detail": f"DEK unwrap failed: {e}", "trace": traceback.format_exc()}, status=400)
-            if not isinstance(dek, (bytes, bytearray)) or len(dek) not in (16, 24, 32):
-                return Response({"detail": f"unwrapped DEK has invalid length={len(dek) if isinstance(dek,(bytes,bytearray)) else 'n/a'}"}, status=400)
+        audit(request, "ingest/receipt", "success", device_id=kid, jti=jti, targets=[rec.id])
 
-            # 4) Encrypt (AES-GCM)
-            try:
-                nonce, ct, tag = aesgcm_encrypt(dek, pt, aad=b"receipt_v1")
-            except Exception as e:
-                return Response({"detail": f"aesgcm_encrypt failed: {e}", "trace": traceback.format_exc()}, status=500)
-
-            # 5) Persist (ciphertext + derived columns)
-            try:
-                # parse derived fields (best effort)
-                parsed_obj = json.loads(pt.decode("utf-8")) if isinstance(pt, (bytes, bytearray)) else {}
-                merchant = (parsed_obj.get("merchant") or "").strip()
-                currency = (parsed_obj.get("currency") or "USD").strip() or "USD"
-                # prefer date_str if present else "date"
-                date_str = (parsed_obj.get("date_str") or parsed_obj.get("date") or "")
-                from decimal import Decimal, ROUND_HALF_UP
-                def _to_cents(v):
-                    try:
-                        return Decimal(str(v)).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-                    except Exception:
-                        return Decimal("0.00")
-                total_val = _to_cents(parsed_obj.get("total", 0))
-
-                # Force default DB to avoid any routing ambiguity
-                rec = Receipt.objects.using("default").create(
-                    user=request.user,
-                    year=year, month=month, category=category,
-                    merchant=merchant[:255],
-                    date_str=str(date_str)[:32],
-                    currency=currency[:8] or "USD",
-                    total=total_val,
-                    subtotal=_to_cents(parsed_obj.get("subtotal", 0)),
-                    tax_total=_to_cents(parsed_obj.get("tax_total", 0)),
-                    discount_total=_to_cents(parsed_obj.get("discount_total", 0)),
-                    fees_total=_to_cents(parsed_obj.get("fees_total", 0)),
-                    tip_total=_to_cents(parsed_obj.get("tip_total", 0)),
-                    body_nonce=nonce, body_ct=ct, body_tag=tag,
-                )
-                # (Removed debug prints)
-
-                # optional: create items
-                try:
-                    items = parsed_obj.get("items") or []
-                    from .models import ReceiptItem
-                    from decimal import Decimal
-                    for it in items:
-                        desc = str(it.get("desc") or "").strip()
-                        if not desc:
-                            continue
-                        qty = it.get("qty", 1)
-                        price = it.get("price", 0)
-                        try:
-                            qd = Decimal(str(qty))
-                        except Exception:
-                            qd = Decimal("1")
-                        try:
-                            pd = Decimal(str(price)).quantize(Decimal("0.01"))
-                        except Exception:
-                            pd = Decimal("0.00")
-                        ReceiptItem.objects.create(
-                            receipt=rec, desc=desc[:512], qty=qd, price=pd
-                        )
-                except Exception:
-                    pass  # do not fail ingest if items fail
-            except Exception as e:
-                return Response({"detail": f"DB insert failed: {e}", "trace": traceback.format_exc()}, status=500)
+        # Return both the new receipt id and the parsed plaintext data (so the client can use it immediately)
+        return Response(ingest_result(rec, parsed_obj), status=200)
 
-        finally:
-            # best-effort zeroize
-            try:
-                if isinstance(dek, (bytes, bytearray)):
-                    ba = bytearray(dek)
-                    for i in range(len(ba)): ba[i] = 0
-            except Exception:
-                pass
 
-        # Return both the new receipt id and the parsed plaintext data (so the client can use it immediately)
-        derived = {
-            "merchant": rec.merchant,
-            "currency": rec.currency,
-            "date_str": rec.date_str,
-            "total": str(rec.total),
-            "subtotal": str(rec.subtotal),
-            "tax_total": str(rec.tax_total),
-            "discount_total": str(rec.discount_total),
-            "fees_total": str(rec.fees_total),
-            "tip_total": str(rec.tip_total),
-            "receipt_id": rec.id,
-            "created_at": rec.created_at.isoformat(),
-        }
-        return Response({"receipt_id": rec.id, "data": parsed_obj, "derived": derived}, status=200)
-        # --- end TEMP block ---
 
+def _with_items(qs, user):
+    """Prefetch items for ReceiptSerializer in one query per page (not one per receipt)."""
+    return qs.prefetch_related(Prefetch("items", queryset=owned_items(user)))
 
 
-class ReceiptListView(generics.ListAPIView):
+class ReceiptListView(ReplicaReadMixin, generics.ListAPIView):
     serializer_class = ReceiptSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def list(self, request, *args, **kwargs):
+        # Served from the per-user versioned cache (ETag/304 when unchanged)
+        return cached_response(
+            request, "receipts", lambda: dict(super(ReceiptListView, self).list(request, *args, **kwargs).data)
+        )
+
     def get_queryset(self):
-        qs = Receipt.objects.filter(user=self.request.user)
+        qs = _with_items(Receipt.objects.filter(user=self.request.user).defer(*Receipt.CIPHERTEXT_FIELDS), self.request.user)
         # Filters: month=YYYY-MM, category, merchant (icontains)
         month = self.request.query_params.get("month")
         if month:
@@ -442,22 +424,40 @@ class ReceiptListView(generics.ListAPIView):
         # Debug logging removed.
         return qs.order_by("-created_at")
 
-class ReceiptDetailView(generics.RetrieveDestroyAPIView):
+class ReceiptDetailView(ReplicaReadMixin, generics.RetrieveDestroyAPIView):
     serializer_class = ReceiptSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Receipt.objects.filter(user=self.request.user)
+        return _with_items(Receipt.objects.filter(user=self.request.user).defer(*Receipt.CIPHERTEXT_FIELDS), self.request.user)
 
     def perform_destroy(self, instance: Receipt):
         # Cascade delete of items handled by FK; add any audit/event hooks here if needed.
-        instance.delete()
+        from .recurring import schedule_refresh
+        from .sync import record_change
+        rid = instance.id
+        with transaction.atomic():
+            instance.delete()
+            record_change(instance.user_id, rid, "delete")  # tombstone for other devices
+        schedule_refresh(instance.user_id, instance.merchant)
 
 
-class AnalyticsSpendView(APIView):
+class AnalyticsSpendView(ReplicaReadMixin, APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
+        return cached_response(request, "analytics:spend", lambda: self._compute(request))
+
+    def _compute(self, request) -> dict:
+        from .analytics import spend_summary
+        qs, year_val, month_val, category = self._filtered(request)
+        # Aggregates: total, per-category and top-5 merchants in one statement
+        summary = spend_summary(qs, top=5)
+        rows = qs.only("date_str", "created_at", "total")
+        return self._payload(summary, rows, year_val, month_val, category)
+
+    @staticmethod
+    def _filtered(request):
         qs = Receipt.objects.filter(user=request.user)
         month = request.query_params.get("month")
         category = request.query_params.get("category")
@@ -473,25 +473,15 @@ class AnalyticsSpendView(APIView):
                 pass
         if category:
             qs = qs.filter(category__iexact=category)
+        return qs, year_val, month_val, category
 
-        # Aggregates
-        agg = qs.aggregate(total=Sum("total"))
-        total_sum = agg.get("total") or 0
-
-        by_category = (
-            qs.values("category")
-              .annotate(total=Sum("total"))
-              .order_by("-total")
-        )
-        top_merchants = list(
-            qs.values("merchant")
-              .annotate(total=Sum("total"))
-              .order_by("-total")[:5]
-        )
+    @staticmethod
+    def _payload(summary: dict, rows, year_val, month_val, category) -> dict:
+        total_sum = summary["total"]
 
         # Daily series (based on date_str if present, else created_at date)
         daily_map = {}
-        for r in qs.only("date_str", "created_at", "total"):
+        for r in rows:
             d = (r.date_str or "").strip()
             if not d:
                 d = r.created_at.date().isoformat()
@@ -511,20 +501,317 @@ class AnalyticsSpendView(APIView):
             for k, v in sorted(daily_map.items())
         ]
 
-        return Response({
+        return {
             "month": f"{year_val:04d}-{month_val:02d}" if (year_val and month_val) else None,
             "category": category or None,
             "total": str(total_sum),
             "by_category": [
-                {"category": (row.get("category") or ""), "total": str(row.get("total") or 0)}
-                for row in by_category
+                {"category": (cat or ""), "total": str(amt or 0)}
+                for cat, amt in summary["by_category"]
             ],
             "top_merchants": [
-                {"merchant": (row.get("merchant") or ""), "total": str(row.get("total") or 0)}
-                for row in top_merchants
+                {"merchant": (merch or ""), "total": str(amt or 0)}
+                for merch, amt in summary["top_merchants"]
             ],
             "daily": daily,
-        })
+        }
+
+
+def _parse_range_date(value: str, end: bool = False) -> datetime.date:
+    """Parse YYYY-MM-DD or YYYY-MM (first/last day of month when end=True)."""
+    parts = value.replace("/", "-").split("-")
+    y, m = int(parts[0]), int(parts[1])
+    if len(parts) >= 3:
+        return datetime.date(y, m, int(parts[2]))
+    if end:
+        nxt = datetime.date(y + m // 12, m % 12 + 1, 1)
+        return nxt - datetime.timedelta(days=1)
+    return datetime.date(y, m, 1)
+
+
+class AnalyticsSeriesView(APIView):
+    """Multi-bucket spend series: ?from=&to=&granularity=day|week|month|year&group_by=category|merchant"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        from .analytics import GRANULARITIES, GROUP_BY_FIELDS, spend_series
+        qp = request.query_params
+        try:
+            start = _parse_range_date(qp.get("from") or "")
+            end = _parse_range_date(qp.get("to") or "", end=True)
+        except (ValueError, IndexError):
+            raise ParseError("from/to must be YYYY-MM-DD or YYYY-MM")
+        if start > end:
+            raise ParseError("from must not be after to")
+        granularity = (qp.get("granularity") or "month").lower()
+        if granularity not in GRANULARITIES:
+            raise ParseError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+        group_by = (qp.get("group_by") or "").lower() or None
+        if group_by and group_by not in GROUP_BY_FIELDS:
+            raise ParseError(f"group_by must be one of {', '.join(GROUP_BY_FIELDS)}")
+        try:
+            top = max(1, min(50, int(qp.get("top") or 10)))
+        except ValueError:
+            raise ParseError("top must be an integer")
+        category = qp.get("category") or None
+
+        def compute():
+            try:
+                return spend_series(request.user, start, end, granularity, group_by, category, top)
+            except ValueError as e:
+                raise ParseError(str(e))
+
+        return cached_response(request, "analytics:series", compute)
+
+
+class AnalyticsInsightsView(APIView):
+    """Spending anomalies, month-over-month deltas and duplicate charges (cached per user until next write)."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        from .insights import compute_insights
+        try:
+            recent = max(1, min(12, int(request.query_params.get("months") or 3)))
+        except ValueError:
+            raise ParseError("months must be an integer")
+        return cached_response(request, "analytics:insights", lambda: compute_insights(request.user, recent))
+
+
+class RecurringChargeListView(generics.ListAPIView):
+    """Detected recurring charges (materialized; refreshed after each ingest)."""
+    serializer_class = RecurringChargeSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        qs = RecurringCharge.objects.filter(user=self.request.user)
+        period = self.request.query_params.get("period")
+        if period:
+            qs = qs.filter(period=period.lower())
+        return qs.order_by("next_expected", "merchant")
+
+
+class ReceiptExportView(APIView):
+    """Stream all derived receipt/item columns: ?fmt=csv|jsonl&from=&to=&category= (gzip if accepted)."""
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = "export"
+
+    def get(self, request):
+        from django.http import StreamingHttpResponse
+        from .export import encode, export_queryset, iter_csv, iter_jsonl
+        qp = request.query_params
+        fmt = (qp.get("fmt") or "csv").lower()
+        if fmt not in ("csv", "jsonl"):
+            raise ParseError("fmt must be csv or jsonl")
+        try:
+            start = _parse_range_date(qp["from"]) if qp.get("from") else None
+            end = _parse_range_date(qp["to"], end=True) if qp.get("to") else None
+        except (ValueError, IndexError):
+            raise ParseError("from/to must be YYYY-MM-DD or YYYY-MM")
+
+        qs = export_queryset(request.user, start, end, qp.get("category") or None)
+        use_gzip = "gzip" in request.META.get("HTTP_ACCEPT_ENCODING", "") and qp.get("gzip") != "0"
+        chunks = iter_csv(qs) if fmt == "csv" else iter_jsonl(qs)
+        resp = StreamingHttpResponse(
+            encode(chunks, gzip=use_gzip),
+            content_type="text/csv; charset=utf-8" if fmt == "csv" else "application/x-ndjson; charset=utf-8",
+        )
+        resp["Content-Disposition"] = f'attachment; filename="receipts-{timezone.now():%Y%m%d}.{fmt}"'
+        resp["Vary"] = "Accept-Encoding"
+        if use_gzip:
+            resp["Content-Encoding"] = "gzip"
+        return resp
+
+
+def verify_grant(request, token: str, scope: str, endpoint: str, *, stage=None, on_invalid=None, **audit_kw):
+    """Device grant check shared by grant-gated endpoints: header kid -> active device key,
+    EdDSA signature, single-use jti, scope. Audits each failure under endpoint (with audit_kw);
+    returns (kid, jti). stage times the signature check; on_invalid() runs before a grant that
+    never reached the jti check is rejected (decrypt's per-IP limiter)."""
+    from .exceptions import ReplayDetected
+
+    def reject(outcome, exc, **kw):
+        if on_invalid is not None:
+            on_invalid()
+        audit(request, endpoint, outcome, **kw, **audit_kw)
+        raise exc
+
+    try:
+        kid = json.loads(base64.urlsafe_b64decode(token.split(".")[0] + "==")).get("kid")
+    except Exception:
+        reject("invalid_header", ParseError("Invalid token header"))
+    try:
+        dev = DeviceKey.objects.get(user=request.user, device_id=kid, is_active=True)
+    except DeviceKey.DoesNotExist:
+        reject("unknown_device", PermissionDenied("Unknown device"), device_id=kid)
+    try:
+        with (stage.time(stage="jwt_verify") if stage else nullcontext()), span("crypto", op="jwt_verify"):
+            payload = jwt_verify_eddsa(token, dev.public_key_b64)
+    except Exception as e:
+        reject("auth_failed", AuthenticationFailed(f"JWT verify failed: {e}"), device_id=kid)
+    jti = payload.get("jti")
+    if not jti:
+        reject("missing_jti", ParseError("Missing jti"), device_id=kid)
+    r = redis_client()
+    if r:
+        # atomic set-if-not-exists with TTL ~180s
+        with span("redis", op="jti"):
+            fresh = r.set(name=f"grant:jti:{jti}", value="1", nx=True, ex=180)
+    else:
+        fresh = not GrantJTI.objects.filter(jti=jti).exists()
+        if fresh:
+            GrantJTI.objects.create(jti=jti, user=request.user, device_id=dev.device_id)
+    if not fresh:
+        audit(request, endpoint, "replay", device_id=kid, jti=jti, **audit_kw)
+        raise ReplayDetected()
+    if scope not in set(payload.get("scope") or []):
+        audit(request, endpoint, "scope_denied", device_id=kid, jti=jti, **audit_kw)
+        raise PermissionDenied("Scope denied")
+    return kid, jti
+
+
+def release_grant(jti: str) -> None:
+    """Undo verify_grant's single-use mark for a request turned away before doing any work,
+    so the client can retry with the same grant instead of hitting ReplayDetected."""
+    r = redis_client()
+    if r:
+        with span("redis", op="jti"):
+            r.delete(f"grant:jti:{jti}")
+    else:
+        GrantJTI.objects.filter(jti=jti).delete()
+
+
+class ReceiptImageView(APIView):
+    """Stream the archived original image, decrypted segment by segment (body: token, dek_wrap_srv).
+    The grant needs scope receipt:decrypt. Tampering detected after the first segment aborts the
+    stream, so clients should check the length against Content-Length."""
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = "decrypt"
+    get_throttle_device_id = ProcessDecryptView.get_throttle_device_id
+
+    def post(self, request, pk: int):
+        from django.http import StreamingHttpResponse
+        from .image_archive import open_plaintext
+        from .stream_aead import StreamError
+        endpoint = "receipts/image"
+        s = ImageGrantSerializer(data=request.data)
+        s.is_valid(raise_exception=True)
+        kid, jti = verify_grant(request, s.validated_data["token"], "receipt:decrypt", endpoint)
+        try:
+            img = ReceiptImage.objects.get(receipt_id=pk, user=request.user)
+        except ReceiptImage.DoesNotExist:
+            raise NotFound("No archived image for this receipt")
+        try:
+            dek = unwrap_dek_rsa_oaep(s.validated_data["dek_wrap_srv"])
+        except Exception:
+            audit(request, endpoint, "unwrap_failed", device_id=kid, jti=jti, targets=[pk])
+            raise ParseError("DEK unwrap failed")
+        try:
+            body = open_plaintext(img, dek)
+        except StreamError:
+            audit(request, endpoint, "decrypt_failed", device_id=kid, jti=jti, targets=[pk])
+            raise ParseError("Image does not decrypt with this DEK")
+        audit(request, endpoint, "success", device_id=kid, jti=jti, targets=[pk])
+        resp = StreamingHttpResponse(body, content_type=img.content_type or "application/octet-stream")
+        resp["Content-Length"] = str(img.size)
+        resp["Cache-Control"] = "no-store"
+        return resp
+
+
+class SyncReceiptsView(APIView):
+    """Delta sync: ?since=<cursor>&limit= returns changed receipts plus delete tombstones."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        from .sync import InvalidCursor, changes_since
+        try:
+            limit = max(1, min(1000, int(request.query_params.get("limit") or 500)))
+        except ValueError:
+            raise ParseError("limit must be an integer")
+        try:
+            out = changes_since(request.user, request.query_params.get("since") or None, limit)
+        except InvalidCursor as e:
+            raise ParseError(str(e))
+        out["upserts"] = ReceiptSerializer(out["upserts"], many=True).data
+        return Response(out)
+
+
+def _parse_audit_time(value: str, end: bool = False):
+    """ISO datetime, or YYYY-MM-DD (a bare end date includes that whole day)."""
+    from django.utils.dateparse import parse_date, parse_datetime
+    dt = parse_datetime(value)
+    if dt is None:
+        d = parse_date(value)
+        if d is None:
+            raise ValueError(value)
+        if end:
+            d += datetime.timedelta(days=1)
+        dt = datetime.datetime(d.year, d.month, d.day)
+    if timezone.is_naive(dt):
+        dt = timezone.make_aware(dt, datetime.timezone.utc)
+    return dt
+
+
+class AuditEventListView(APIView):
+    """Staff audit search: ?user=&endpoint=&outcome=&from=&to=&cursor=&limit= (newest first, keyset paged)."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        from .audit_partitions import query_events
+        qp = request.query_params
+        try:
+            user_id = int(qp["user"]) if qp.get("user") else None
+            limit = max(1, min(500, int(qp.get("limit") or 100)))
+        except ValueError:
+            raise ParseError("user and limit must be integers")
+        try:
+            start = _parse_audit_time(qp["from"]) if qp.get("from") else None
+            end = _parse_audit_time(qp["to"], end=True) if qp.get("to") else None
+        except ValueError:
+            raise ParseError("from/to must be ISO datetimes or YYYY-MM-DD")
+        try:
+            events, next_cursor = query_events(
+                user_id=user_id,
+                endpoint=qp.get("endpoint") or None,
+                outcome=qp.get("outcome") or None,
+                start=start,
+                end=end,
+                cursor=qp.get("cursor") or None,
+                limit=limit,
+            )
+        except ValueError as e:
+            raise ParseError(str(e))
+        return Response({"results": AuditEventSerializer(events, many=True).data, "next_cursor": next_cursor})
+
+
+class ProfileListView(APIView):
+    """Staff: stored request profiles, newest first (?limit=)."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        from .profiling import list_profiles
+        try:
+            limit = max(1, min(500, int(request.query_params.get("limit") or 100)))
+        except ValueError:
+            raise ParseError("limit must be an integer")
+        return Response({"results": list_profiles(limit)})
+
+
+class ProfileDownloadView(APIView):
+    """Staff: download one profile, ?fmt=folded|prof|txt|json (default: folded, else prof)."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, key: str):
+        from django.http import FileResponse
+        from .profiling import FORMATS, profile_path
+        fmt = request.query_params.get("fmt")
+        path = profile_path(key, fmt) if fmt else (profile_path(key, "folded") or profile_path(key, "prof"))
+        if path is None:
+            raise NotFound()
+        fmt = path.rsplit(".", 1)[1]
+        return FileResponse(open(path, "rb"), as_attachment=fmt != "json", filename=f"{key}.{fmt}",
+                            content_type=FORMATS[fmt])
 
 
 class RegisterView(APIView):
@@ -661,7 +948,7 @@ class DevWrapDekView(APIView):
         })
 
 
-class HealthView(APIView):
+class HealthView(ReplicaReadMixin, APIView):
     """Lightweight health/info endpoint: returns DB engine and simple counts.
     Useful to detect mismatched DB backends (e.g., Postgres vs SQLite) and empty data scenarios in deployments.
     """
@@ -688,7 +975,7 @@ class HealthView(APIView):
         except Exception:
             tesseract_path = None
             tesseract_version = None
-        return Response({
+        body = {
             'engine': engine,
             'env': getattr(dj_settings, 'ENV_NAME', None),
             'is_prod': getattr(dj_settings, 'IS_PROD', None),
@@ -697,4 +984,36 @@ class HealthView(APIView):
             'tesseract_path': tesseract_path,
             'tesseract_version': tesseract_version,
             'ocr_ready': bool(tesseract_path and tesseract_version and tesseract_version != 'error'),
-        })
+            'read_db': current_read_db(),  # replica serving this request (or "default")
+        }
+        # Backend internals (pids, connection ages, pool state) are for operators only
+        if request.user and request.user.is_staff:
+            body['cache'] = cache.stats() if hasattr(cache, 'stats') else {'backend': type(cache).__name__}
+            body['db_pool'] = dbpool_stats()
+        return Response(body)
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint (plain Django view: no auth classes, throttles or audit on the hot path).
+    Requires `Authorization: Bearer <METRICS_TOKEN>`; with no token configured it fails
+    closed to staff sessions only."""
+    from django.conf import settings as dj_settings
+    from django.http import HttpResponse
+    from .metrics import render
+    expected = getattr(dj_settings, "METRICS_TOKEN", "")
+    if expected:
+        if not secrets.compare_digest(request.META.get("HTTP_AUTHORIZATION", ""), f"Bearer {expected}"):
+            return HttpResponse(status=401)
+    elif not getattr(request.user, "is_staff", False):
+        return HttpResponse(status=403)
+    # Point-in-time gauges of the worker that answered, labelled by pid
+    pool = dbpool_stats()
+    pid = f'pid="{pool["pid"]}"'
+    extra = {"financekit_db_open_connections": {
+        "help": "Open DB connections in this worker.", "samples": {pid: pool["open_connections"]}}}
+    if hasattr(cache, "stats"):
+        cs = cache.stats()
+        extra["financekit_cache_lookups"] = {
+            "help": "Tiered cache lookups in this worker since start.", "type": "counter",
+            "samples": {f'{pid},tier="{k}"': cs.get(k, 0) for k in ("l1_hits", "l2_hits", "misses")}}
+    return HttpResponse(render(extra), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,10 @@
+# Picked up automatically by gunicorn (./gunicorn.conf.py); CLI flags still override.
+
+
+def worker_exit(server, worker):
+    # Flush queued audit events before the worker goes away
+    try:
+        from financekit.audit import shutdown
+        shutdown()
+    except Exception:
+        pass